@@ -0,0 +1,62 @@
+# benchmarks.compare
+
+import argparse as ap
+import json
+import sys
+
+
+def compare_reports(baseline: dict, candidate: dict, tolerance: float) -> list:
+    """
+    Compare two benchmark reports and return the benchmarks that regressed.
+    """
+    regressions = []
+    print(
+        f"{'benchmark':<32}{'baseline (s)':>14}{'candidate (s)':>15}{'ratio':>8}"
+        f"{'peak ratio':>12}"
+    )
+    for name, result in candidate["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:<32}{'-':>14}{result['median_s']:>15.4f}{'-':>8}{'-':>12}")
+            continue
+        base = baseline["results"][name]
+        ratio = result["median_s"] / max(base["median_s"], 1e-9)
+        peak_ratio = result["peak_mb"] / max(base["peak_mb"], 1e-9)
+        flag = ""
+        if ratio > tolerance or peak_ratio > tolerance:
+            regressions.append(name)
+            flag = "  <- regression"
+        print(
+            f"{name:<32}{base['median_s']:>14.4f}{result['median_s']:>15.4f}"
+            f"{ratio:>8.2f}{peak_ratio:>12.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = ap.ArgumentParser(description="Compare two screenviz benchmark reports")
+    parser.add_argument("baseline", help="Benchmark JSON of the reference version")
+    parser.add_argument("candidate", help="Benchmark JSON of the version to check")
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        help="Maximum allowed time/memory ratio before flagging (default = 1.2)",
+        default=1.2,
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    if baseline["scale"] != candidate["scale"]:
+        print("Warning: reports were run at different scales", file=sys.stderr)
+
+    regressions = compare_reports(baseline, candidate, args.tolerance)
+    if regressions:
+        sys.exit(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
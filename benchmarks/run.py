@@ -0,0 +1,428 @@
+# benchmarks.run
+
+import argparse as ap
+import contextvars
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+from typing import Callable, Dict, List, Optional
+
+from plotly.io.json import to_json_plotly
+
+from .synthetic import AMALGAM_TOKEN, NTC_TOKEN, write_screen
+
+SCALES = {
+    "small": {"n_guides": 10_000, "n_samples": 4},
+    "medium": {"n_guides": 200_000, "n_samples": 24},
+    "large": {"n_guides": 2_000_000, "n_samples": 500},
+}
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """
+    Register a benchmark.
+
+    The decorated function receives the synthetic screen files and a scratch
+    directory, performs any untimed setup and returns the zero-argument
+    callable that is timed.
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def get_callback(app, output: str) -> Callable:
+    """
+    Pull the undecorated function of a registered dash callback by its output id.
+    """
+    for key, value in app.callback_map.items():
+        if output in key:
+            return value["callback"].__wrapped__
+    raise KeyError(f"No callback registered for output: {output}")
+
+
+def initial_call(func: Callable) -> Callable:
+    """
+    Run a callback reading `dash.ctx` as on page load (no triggering input).
+    """
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    @functools.wraps(func)
+    def run(*args):
+        context = contextvars.copy_context()
+        context.run(context_value.set, AttributeDict(triggered_inputs=[]))
+        return context.run(func, *args)
+
+    return run
+
+
+def serialized(func: Callable, *args) -> Callable:
+    """
+    Wrap a callback so that its output is serialized as dash would send it.
+    """
+
+    def run():
+        return to_json_plotly(func(*args))
+
+    return run
+
+
+# --- load paths -------------------------------------------------------------
+
+
+@benchmark("load.qc_count_matrix")
+def bench_load_qc(files, workdir):
+    from screenviz.qc.utils import load_data
+
+    return lambda: load_data(files["counts"], "Guide", "Gene")
+
+
+@benchmark("load.results_sgrna")
+def bench_load_results_sgrna(files, workdir):
+    from screenviz.results._utils import load_sgrna_dataframe
+
+    return lambda: load_sgrna_dataframe(files["sgrna"])
+
+
+@benchmark("load.results_gene")
+def bench_load_results_gene(files, workdir):
+    from screenviz.results._utils import load_gene_dataframe
+
+    return lambda: load_gene_dataframe(files["gene"])
+
+
+@benchmark("load.visualize_genes")
+def bench_load_visualize_genes(files, workdir):
+    from screenviz.gene import VisualizeGenes
+
+    return lambda: VisualizeGenes(files["gene"], fc_column="log2fc")
+
+
+@benchmark("load.visualize_sgrnas")
+def bench_load_visualize_sgrnas(files, workdir):
+    from screenviz.sgrna import VisualizeSGRNAs
+
+    return lambda: VisualizeSGRNAs(
+        files["sgrna"], fc_column="log2fc", pval_column="pvalue_twosided"
+    )
+
+
+@benchmark("load.compare_screens")
+def bench_load_compare_screens(files, workdir):
+    from screenviz.compare import CompareScreens
+
+    return lambda: CompareScreens(files["gene"], files["gene_b"])
+
+
+# --- static plots -----------------------------------------------------------
+
+
+@benchmark("plot.gene_volcano")
+def bench_plot_gene_volcano(files, workdir):
+    from screenviz.gene import VisualizeGenes
+
+    vg = VisualizeGenes(files["gene"], fc_column="log2fc", ntc_token=AMALGAM_TOKEN)
+    output = os.path.join(workdir, "gene_volcano.html")
+    return lambda: vg.plot_volcano(output=output)
+
+
+@benchmark("plot.sgrna_volcano")
+def bench_plot_sgrna_volcano(files, workdir):
+    from screenviz.sgrna import VisualizeSGRNAs
+
+    sg = VisualizeSGRNAs(
+        files["sgrna"], fc_column="log2fc", pval_column="pvalue_twosided"
+    )
+    output = os.path.join(workdir, "sgrna_volcano.html")
+    return lambda: sg.plot_volcano(output=output)
+
+
+@benchmark("plot.compare_screens")
+def bench_plot_compare_screens(files, workdir):
+    from screenviz.compare import CompareScreens
+
+    cs = CompareScreens(files["gene"], files["gene_b"])
+    output = os.path.join(workdir, "comparison.html")
+    return lambda: cs.plot_volcano(output=output)
+
+
+# --- quality control dashboard ----------------------------------------------
+
+
+def _qc_app(files):
+    from screenviz.qc.app import CRISPRQCDashApp
+
+    # Loaded in the constructor: the benchmarks never start the server
+    return CRISPRQCDashApp(files["counts"], "Guide", "Gene", background=False)
+
+
+@benchmark("qc.app_init")
+def bench_qc_app_init(files, workdir):
+    return lambda: _qc_app(files)
+
+
+@benchmark("qc.scatter_figure")
+def bench_qc_scatter_figure(files, workdir):
+    app = _qc_app(files)
+    x_col, y_col = app.state.sample_columns[0], app.state.sample_columns[-1]
+    selection = {"range": {"x": [2.0, 3.0], "y": [2.0, 3.0]}}
+    return serialized(
+        get_callback(app.app, "scatter-plot.figure"),
+        selection,
+        x_col,
+        y_col,
+        NTC_TOKEN,
+        ["log"],
+        "raw",
+        None,
+    )
+
+
+@benchmark("qc.scatter_table")
+def bench_qc_scatter_table(files, workdir):
+    app = _qc_app(files)
+    x_col, y_col = app.state.sample_columns[0], app.state.sample_columns[-1]
+    selection = {"range": {"x": [2.0, 3.0], "y": [2.0, 3.0]}}
+    return serialized(
+        get_callback(app.app, "data-table.data"),
+        selection,
+        x_col,
+        y_col,
+        ["log"],
+        "raw",
+    )
+
+
+@benchmark("qc.kde_histogram")
+def bench_qc_kde_histogram(files, workdir):
+    app = _qc_app(files)
+    rows = [{"sample": col, "include": "Yes"} for col in app.state.sample_columns]
+    return serialized(
+        get_callback(app.app, "kde-histogram-plot.figure"), rows, None, "raw", "kde"
+    )
+
+
+@benchmark("qc.membership_histogram")
+def bench_qc_membership_histogram(files, workdir):
+    app = _qc_app(files)
+    return serialized(get_callback(app.app, "histogram-plot.figure"), "All Samples")
+
+
+@benchmark("qc.membership_table")
+def bench_qc_membership_table(files, workdir):
+    app = _qc_app(files)
+    return serialized(
+        get_callback(app.app, "gene-membership-table.data"), app.state.sample_columns[0]
+    )
+
+
+@benchmark("qc.correlation_heatmap")
+def bench_qc_correlation_heatmap(files, workdir):
+    app = _qc_app(files)
+    return lambda: to_json_plotly(
+        app.correlation_matrix_card.create_correlation_heatmap()
+    )
+
+
+# --- results dashboard ------------------------------------------------------
+
+
+def _results_app(files):
+    from screenviz.results.app import ResultsDashApp
+
+    # Loaded in the constructor: the benchmarks never start the server
+    return ResultsDashApp(files["sgrna"], files["gene"], background=False)
+
+
+@benchmark("results.app_init")
+def bench_results_app_init(files, workdir):
+    return lambda: _results_app(files)
+
+
+def _sgrna_plots(files, render: str) -> Callable:
+    app = _results_app(files)
+    # The figure and the visible ranges are outputs of one callback
+    update_plots = get_callback(
+        app.app, "..sgrna-plots.figure...sgrna-plot-ranges.data.."
+    )
+    return serialized(initial_call(update_plots), 0.1, 30, True, render, None, {})
+
+
+@benchmark("results.sgrna_plots")
+def bench_results_sgrna_plots(files, workdir):
+    return _sgrna_plots(files, "points")
+
+
+@benchmark("results.sgrna_plots_density")
+def bench_results_sgrna_plots_density(files, workdir):
+    return _sgrna_plots(files, "density")
+
+
+@benchmark("results.sgrna_table")
+def bench_results_sgrna_table(files, workdir):
+    app = _results_app(files)
+    return serialized(get_callback(app.app, "sgrna-data-table.data"), 0.1)
+
+
+@benchmark("results.gene_volcano")
+def bench_results_gene_volcano(files, workdir):
+    app = _results_app(files)
+    return serialized(
+        get_callback(app.app, "gene-volcano-plot.figure"), 0.1, 0.1, 30, True
+    )
+
+
+@benchmark("results.gene_table")
+def bench_results_gene_table(files, workdir):
+    app = _results_app(files)
+    return serialized(get_callback(app.app, "gene-data-table.data"), 0.1)
+
+
+# --- runner -----------------------------------------------------------------
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    """
+    Time a callable over several repeats, then measure its peak traced memory once.
+    """
+    times = []
+    payload_bytes = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        times.append(time.perf_counter() - start)
+        if isinstance(output, (str, bytes)):
+            payload_bytes = len(output)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_mb": peak / 1e6,
+        "payload_bytes": payload_bytes,
+    }
+
+
+def _version() -> str:
+    try:
+        return metadata.version("screenviz")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def run_benchmarks(
+    n_guides: int,
+    n_samples: int,
+    repeat: int = 3,
+    only: Optional[List[str]] = None,
+    workdir: Optional[str] = None,
+    seed: int = 0,
+) -> dict:
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        files = write_screen(
+            tmpdir, "screen_a", n_guides=n_guides, n_samples=n_samples, seed=seed
+        )
+        files["gene_b"] = write_screen(
+            tmpdir, "screen_b", n_guides=n_guides, n_samples=2, seed=seed + 1
+        )["gene"]
+
+        results = {}
+        for name, setup in BENCHMARKS.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            print(f"Running benchmark: {name}", file=sys.stderr)
+            results[name] = measure(setup(files, tmpdir), repeat)
+            print(
+                f"  median = {results[name]['median_s']:.4f}s, "
+                f"peak = {results[name]['peak_mb']:.1f}MB",
+                file=sys.stderr,
+            )
+
+    return {
+        "screenviz_version": _version(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "scale": {"n_guides": n_guides, "n_samples": n_samples, "repeat": repeat},
+        "results": results,
+    }
+
+
+def get_args() -> ap.Namespace:
+    parser = ap.ArgumentParser(
+        description="Run the screenviz benchmark suite on synthetic screens"
+    )
+    parser.add_argument(
+        "--scale",
+        help="Preset scale of the synthetic screen (default = 'small')",
+        choices=list(SCALES),
+        default="small",
+    )
+    parser.add_argument(
+        "--guides", type=int, help="Number of guides (overrides the preset scale)"
+    )
+    parser.add_argument(
+        "--samples", type=int, help="Number of samples (overrides the preset scale)"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        help="Number of timed repeats per benchmark (default = 3)",
+        default=3,
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        help="Only run benchmarks whose name starts with one of these prefixes",
+    )
+    parser.add_argument(
+        "--workdir", help="Directory to write the synthetic screen into (default = tmp)"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Output JSON file (default = 'benchmarks.<version>.<scale>.json')",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    scale = dict(SCALES[args.scale])
+    if args.guides is not None:
+        scale["n_guides"] = args.guides
+    if args.samples is not None:
+        scale["n_samples"] = args.samples
+
+    report = run_benchmarks(
+        repeat=args.repeat, only=args.only, workdir=args.workdir, **scale
+    )
+    output = (
+        args.output or f"benchmarks.{report['screenviz_version']}.{args.scale}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saving benchmark results to: {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# benchmarks.synthetic
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+NTC_TOKEN = "non-targeting"
+AMALGAM_TOKEN = "amalgam"
+
+
+def _gene_names(n_genes: int) -> np.ndarray:
+    return np.char.add("GENE", np.arange(n_genes).astype(str))
+
+
+def _guide_layout(
+    n_guides: int, guides_per_gene: int, ntc_fraction: float
+) -> pd.DataFrame:
+    """
+    Assign guides to genes, with a fraction of the library as non-targeting controls.
+    """
+    n_ntc = int(round(n_guides * ntc_fraction))
+    n_targeting = n_guides - n_ntc
+    n_genes = int(np.ceil(n_targeting / guides_per_gene))
+
+    genes = np.repeat(_gene_names(n_genes), guides_per_gene)[:n_targeting]
+    guides = np.char.add(
+        np.char.add(genes, "_"),
+        np.tile(np.arange(guides_per_gene), n_genes)[:n_targeting].astype(str),
+    )
+    ntc_guides = np.char.add(f"{NTC_TOKEN}_", np.arange(n_ntc).astype(str))
+    return pd.DataFrame(
+        {
+            "sgrna": np.concatenate([guides, ntc_guides]),
+            "gene": np.concatenate([genes, np.full(n_ntc, NTC_TOKEN)]),
+        }
+    )
+
+
+def generate_counts(
+    n_guides: int = 10_000,
+    n_samples: int = 4,
+    guides_per_gene: int = 4,
+    ntc_fraction: float = 0.05,
+    dropout_fraction: float = 0.01,
+    seed: Optional[int] = 0,
+    guide_column: str = "Guide",
+    gene_column: str = "Gene",
+) -> pd.DataFrame:
+    """
+    Generate an sgcount-style count matrix [Guide, Gene, sample1, sample2, ...].
+
+    Guide abundances are log-normal, sample depths vary by up to 4x and counts
+    are drawn from a negative binomial with a small fraction of dropout guides.
+    """
+    rng = np.random.default_rng(seed)
+    layout = _guide_layout(n_guides, guides_per_gene, ntc_fraction)
+
+    abundance = rng.lognormal(mean=6.0, sigma=1.0, size=n_guides)
+    depth = rng.uniform(0.5, 2.0, size=n_samples)
+    dispersion = 10.0
+
+    frame = pd.DataFrame(
+        {guide_column: layout["sgrna"].values, gene_column: layout["gene"].values}
+    )
+    for i in range(n_samples):
+        mean = abundance * depth[i]
+        counts = rng.negative_binomial(dispersion, dispersion / (dispersion + mean))
+        counts[rng.random(n_guides) < dropout_fraction] = 0
+        frame[f"sample_{i}"] = counts.astype(np.int64)
+    return frame
+
+
+def generate_sgrna_results(
+    n_guides: int = 10_000,
+    guides_per_gene: int = 4,
+    ntc_fraction: float = 0.05,
+    hit_fraction: float = 0.02,
+    seed: Optional[int] = 0,
+) -> pd.DataFrame:
+    """
+    Generate a `crispr_screen`-style sgRNA results table.
+    """
+    rng = np.random.default_rng(seed)
+    frame = _guide_layout(n_guides, guides_per_gene, ntc_fraction)
+
+    control = rng.lognormal(mean=6.0, sigma=1.0, size=n_guides)
+    log2fc = rng.normal(0.0, 0.3, size=n_guides)
+    is_hit = (rng.random(n_guides) < hit_fraction) & (frame["gene"] != NTC_TOKEN)
+    log2fc[is_hit] += rng.choice([-3.0, 3.0], size=is_hit.sum())
+    treatment = control * np.exp2(log2fc)
+
+    zscore = log2fc / 0.3
+    pvalue_low = stats.norm.cdf(zscore)
+    pvalue_high = stats.norm.sf(zscore)
+    pvalue_twosided = np.minimum(1.0, 2 * np.minimum(pvalue_low, pvalue_high))
+
+    frame["control"] = control
+    frame["treatment"] = treatment
+    frame["base"] = (control + treatment) / 2
+    frame["log2fc"] = log2fc
+    frame["pvalue_low"] = pvalue_low
+    frame["pvalue_high"] = pvalue_high
+    frame["pvalue_twosided"] = pvalue_twosided
+    frame["fdr"] = stats.false_discovery_control(pvalue_twosided)
+    return frame
+
+
+def generate_gene_results(
+    n_genes: int = 2_500,
+    amalgam_fraction: float = 0.01,
+    hit_fraction: float = 0.02,
+    seed: Optional[int] = 0,
+) -> pd.DataFrame:
+    """
+    Generate a `crispr_screen`-style gene results table, including amalgam pseudogenes.
+    """
+    rng = np.random.default_rng(seed)
+    n_amalgam = int(round(n_genes * amalgam_fraction))
+    genes = np.concatenate(
+        [
+            _gene_names(n_genes),
+            np.char.add(f"{AMALGAM_TOKEN}_", np.arange(n_amalgam).astype(str)),
+        ]
+    )
+    n_total = genes.size
+
+    log2fc = rng.normal(0.0, 0.2, size=n_total)
+    is_hit = rng.random(n_total) < hit_fraction
+    is_hit[n_genes:] = False
+    log2fc[is_hit] += rng.choice([-2.0, 2.0], size=is_hit.sum())
+
+    zscore = log2fc / 0.2
+    pvalue_low = stats.norm.cdf(zscore)
+    pvalue_high = stats.norm.sf(zscore)
+    pvalue = np.minimum(pvalue_low, pvalue_high)
+    fdr_low = stats.false_discovery_control(pvalue_low)
+    fdr_high = stats.false_discovery_control(pvalue_high)
+
+    return pd.DataFrame(
+        {
+            "gene": genes,
+            "fold_change": np.exp2(log2fc),
+            "log2fc": log2fc,
+            "score_low": pvalue_low,
+            "pvalue_low": pvalue_low,
+            "fdr_low": fdr_low,
+            "score_high": pvalue_high,
+            "pvalue_high": pvalue_high,
+            "fdr_high": fdr_high,
+            "pvalue": pvalue,
+            "fdr": np.minimum(fdr_low, fdr_high),
+            "phenotype_score": log2fc * -np.log10(pvalue),
+        }
+    )
+
+
+def write_screen(
+    directory: str,
+    prefix: str = "synthetic",
+    n_guides: int = 10_000,
+    n_samples: int = 4,
+    guides_per_gene: int = 4,
+    ntc_fraction: float = 0.05,
+    amalgam_fraction: float = 0.01,
+    seed: Optional[int] = 0,
+) -> Dict[str, str]:
+    """
+    Write a full synthetic screen (count matrix, sgRNA and gene results) to a directory.
+
+    Returns the paths of the written files keyed by `counts`, `sgrna` and `gene`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        "counts": os.path.join(directory, f"{prefix}.counts.tsv"),
+        "sgrna": os.path.join(directory, f"{prefix}.sgrna_results.tsv"),
+        "gene": os.path.join(directory, f"{prefix}.gene_results.tsv"),
+    }
+    n_genes = int(np.ceil(n_guides * (1 - ntc_fraction) / guides_per_gene))
+
+    generate_counts(
+        n_guides, n_samples, guides_per_gene, ntc_fraction, seed=seed
+    ).to_csv(paths["counts"], sep="\t", index=False)
+    generate_sgrna_results(n_guides, guides_per_gene, ntc_fraction, seed=seed).to_csv(
+        paths["sgrna"], sep="\t", index=False
+    )
+    generate_gene_results(n_genes, amalgam_fraction, seed=seed).to_csv(
+        paths["gene"], sep="\t", index=False
+    )
+    return paths
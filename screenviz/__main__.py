@@ -1,16 +1,22 @@
 # screenviz.__main__
 
+import sys
 
+from screenviz._launch import list_dashboards
+from screenviz.calibrate import CalibrateThresholds
 from screenviz.cli import get_args
 from screenviz.compare import CompareScreens
+from screenviz.enrichment import CACHE_DIR
 from screenviz.gene import VisualizeGenes
 from screenviz.idea import RunIDEA
 from screenviz.qc import quality_control_app_entry
-from screenviz.results import results_app_entry
+from screenviz.qc.metrics import RunMetrics
+from screenviz.report import RunReport
+from screenviz.results import results_app_entry, results_browser_entry
+from screenviz.results.gene_index import RunGeneLookup, build_gene_index
+from screenviz.results.screens import result_files
 from screenviz.sgrna import VisualizeSGRNAs
 
-from ._utils import find_free_port
-
 
 def main_cli():
     args = get_args()
@@ -23,8 +29,16 @@ def main_cli():
             pval_column=args.pval_column,
             threshold_column=args.threshold_column,
             threshold=args.threshold,
+            full_precision=args.full_precision,
+            format=args.input_format,
+        )
+        vg.plot_volcano(
+            output=args.output,
+            plotlyjs=args.plotlyjs,
+            precision=args.precision,
+            format=args.format,
+            rasterize=not args.no_rasterize,
         )
-        vg.plot_volcano(output=args.output)
     elif args.subcommand == "sgrna":
         sg = VisualizeSGRNAs(
             filename=args.input,
@@ -34,8 +48,16 @@ def main_cli():
             pval_column=args.pval_column,
             threshold_column=args.threshold_column,
             threshold=args.threshold,
+            full_precision=args.full_precision,
+            format=args.input_format,
+        )
+        sg.plot_volcano(
+            output=args.output,
+            plotlyjs=args.plotlyjs,
+            precision=args.precision,
+            format=args.format,
+            rasterize=not args.no_rasterize,
         )
-        sg.plot_volcano(output=args.output)
     elif args.subcommand == "compare":
         cs = CompareScreens(
             filename_a=args.screen_a,
@@ -49,10 +71,19 @@ def main_cli():
             merge_column_b=args.merge_column_b,
             log_transform_a=~args.no_log_transform_a,
             log_transform_b=~args.no_log_transform_b,
+            full_precision=args.full_precision,
+            format_a=args.input_format_a,
+            format_b=args.input_format_b,
+        )
+        cs.plot_volcano(
+            output=args.output,
+            plotlyjs=args.plotlyjs,
+            precision=args.precision,
+            format=args.format,
+            rasterize=not args.no_rasterize,
         )
-        cs.plot_volcano()
     elif args.subcommand == "idea":
-        RunIDEA(
+        summary = RunIDEA(
             filename=args.input,
             geneset=args.geneset,
             output=args.output,
@@ -68,19 +99,78 @@ def main_cli():
             up_color=args.up_color,
             down_color=args.down_color,
             term_threshold=args.term_threshold,
+            cache_dir=args.cache_dir or CACHE_DIR,
+            threads=args.threads,
+            format=args.input_format,
+        )
+        if summary is None:
+            sys.exit(1)
+    elif args.subcommand == "calibrate":
+        ct = CalibrateThresholds(
+            sgrna_filename=args.sgrna_input,
+            gene_filename=args.gene_input,
+            method=args.method,
+            ntc_token=args.ntc_token,
+            pseudogene_token=args.pseudogene_token,
+            sgrna_gene_column=args.gene_column,
+            sgrna_fc_column=args.sgrna_fc_column,
+            gene_column=args.gene_column,
+            fc_column=args.fc_column,
+            pval_column=args.pval_column,
+            score_column=args.score_column,
+            format=args.input_format,
+        )
+        ct.write_config(
+            output=args.output,
+            fdr=args.fdr,
+            n_pseudogenes=args.n_pseudogenes,
+            seed=args.seed,
+            n_jobs=args.threads,
         )
     elif args.subcommand == "qc":
-        port = find_free_port(args.port)
         quality_control_app_entry(
             filename=args.input,
-            port=port,
+            port=args.port,
+            guide_column=args.guide_column,
+            gene_column=args.gene_column,
+            profile=args.profile,
+            profile_dir=args.profile_dir,
+            profile_backend=args.profile_backend,
+            full_precision=args.full_precision,
+            watch=args.watch,
+            store=args.store,
+            store_dir=args.store_dir,
+            reuse=not args.no_reuse,
+        )
+    elif args.subcommand == "metrics":
+        RunMetrics(
+            filenames=args.input,
+            output=args.output,
             guide_column=args.guide_column,
             gene_column=args.gene_column,
+            chunksize=args.chunksize,
+            threads=args.threads,
+            histograms=args.histograms,
+        )
+    elif args.subcommand == "results" and args.dir is not None:
+        assert not args.watch, "--watch is not supported with --dir"
+        assert args.counts is None, "--counts is not supported with --dir"
+        results_browser_entry(
+            directory=args.dir,
+            port=args.port,
+            ntc_token=args.ntc_token,
+            amalgam_token=args.amalgam_token,
+            profile=args.profile,
+            profile_dir=args.profile_dir,
+            profile_backend=args.profile_backend,
+            full_precision=args.full_precision,
+            memory_budget_mb=args.memory_budget,
+            gene_index=args.gene_index,
+            reuse=not args.no_reuse,
         )
     elif args.subcommand == "results":
         if args.prefix is not None:
-            sgrna_file = f"{args.prefix}.sgrna_results.tsv"
-            gene_file = f"{args.prefix}.gene_results.tsv"
+            sgrna_file, gene_file = result_files(args.prefix)
         else:
             if args.sgrna_file is None or args.gene_file is None:
                 base_error = "Must provide either a prefix (-n) or both sgrna (-s) and gene (-g) files"
@@ -90,14 +180,35 @@ def main_cli():
                     raise ValueError(base_error + " (gene file missing)")
             sgrna_file = args.sgrna_file
             gene_file = args.gene_file
-        port = find_free_port(args.port)
         results_app_entry(
             sgrna_file=sgrna_file,
             gene_file=gene_file,
-            port=port,
+            port=args.port,
             ntc_token=args.ntc_token,
             amalgam_token=args.amalgam_token,
+            profile=args.profile,
+            profile_dir=args.profile_dir,
+            profile_backend=args.profile_backend,
+            full_precision=args.full_precision,
+            watch=args.watch,
+            gene_index=args.gene_index,
+            count_file=args.counts,
+            guide_column=args.guide_column,
+            reuse=not args.no_reuse,
+        )
+    elif args.subcommand == "index":
+        build_gene_index(
+            directory=args.directory,
+            output=args.output,
+            sgrna_threshold=args.sgrna_threshold,
+            threads=args.threads,
         )
+    elif args.subcommand == "lookup":
+        RunGeneLookup(index=args.index, genes=args.genes, output=args.output)
+    elif args.subcommand == "report":
+        RunReport(config=args.config, threads=args.threads)
+    elif args.subcommand == "dashboards":
+        list_dashboards()
 
 
 if __name__ == "__main__":
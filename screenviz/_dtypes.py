@@ -0,0 +1,129 @@
+# screenviz._dtypes
+
+import re
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+FLOAT32 = np.finfo(np.float32)
+INT32 = np.iinfo(np.int32)
+
+# Statistics compared against thresholds (p-values, FDRs, scores), which stay float64:
+# a float32 round trip can move a value across the threshold
+PRECISE_COLUMN = re.compile(
+    r"p[-_.]?val|^p\.|fdr|q[-_.]?val|padj|score|^bf$", re.IGNORECASE
+)
+
+
+def string_dtype() -> Optional[str]:
+    """
+    Pyarrow-backed string dtype if pyarrow is available (otherwise keep object strings).
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    return "string[pyarrow]"
+
+
+def plan_dtypes(
+    columns: Iterable[str],
+    categorical_columns: Iterable[str] = (),
+    string_columns: Iterable[str] = (),
+) -> Dict[str, str]:
+    """
+    Build the `dtype` mapping passed to the parser for the known text columns.
+
+    Heavily repeated labels (e.g. genes) become categoricals and unique
+    identifiers (e.g. guides) become pyarrow-backed strings.
+    """
+    columns = set(columns)
+    dtype = {col: "category" for col in categorical_columns if col in columns}
+    string = string_dtype()
+    if string is not None:
+        dtype.update(
+            {
+                col: string
+                for col in string_columns
+                if col in columns and col not in dtype
+            }
+        )
+    return dtype
+
+
+def can_downcast_float(values: np.ndarray) -> bool:
+    """
+    Check that float values survive a float32 round trip without overflow or underflow.
+
+    Values smaller than the smallest normal float32 (e.g. tiny p-values) would
+    lose their precision or collapse to zero, so those columns stay float64.
+    """
+    magnitude = np.abs(values[np.isfinite(values)])
+    magnitude = magnitude[magnitude > 0]
+    if magnitude.size == 0:
+        return True
+    return magnitude.min() >= FLOAT32.tiny and magnitude.max() <= FLOAT32.max
+
+
+def can_downcast_int(values: np.ndarray) -> bool:
+    """
+    Check that integer values fit in int32.
+    """
+    if values.size == 0:
+        return True
+    return values.min() >= INT32.min and values.max() <= INT32.max
+
+
+def is_precise(column, precise_columns: Iterable[str] = ()) -> bool:
+    """
+    Whether a column is a statistic kept in float64, listed or named like one.
+    """
+    return column in precise_columns or bool(PRECISE_COLUMN.search(str(column)))
+
+
+def downcast_numeric(
+    df: pd.DataFrame, precise_columns: Iterable[str] = ()
+) -> pd.DataFrame:
+    """
+    Downcast float64 columns to float32 and int64 columns to int32 where validated safe.
+
+    The float columns of statistics (see `is_precise`) are kept in float64.
+    """
+    precise_columns = set(precise_columns)
+    for col in df.columns:
+        dtype = df[col].dtype
+        if (
+            dtype == np.float64
+            and not is_precise(col, precise_columns)
+            and can_downcast_float(df[col].to_numpy())
+        ):
+            df[col] = df[col].astype(np.float32)
+        elif dtype == np.int64 and can_downcast_int(df[col].to_numpy()):
+            df[col] = df[col].astype(np.int32)
+    return df
+
+
+def read_table(
+    filename: str,
+    categorical_columns: Iterable[str] = (),
+    string_columns: Iterable[str] = (),
+    full_precision: bool = False,
+    precise_columns: Iterable[str] = (),
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Read a tab-separated table with compact dtypes.
+
+    Text columns are typed at parse time and numeric columns are downcast
+    after validation, except the statistics and the `precise_columns`
+    (e.g. a threshold column). Pass `full_precision=True` to keep the
+    parser defaults.
+    """
+    if full_precision:
+        return pd.read_csv(filename, sep="\t", **kwargs)
+
+    columns = pd.read_csv(filename, sep="\t", nrows=0, **kwargs).columns
+    dtype = plan_dtypes(columns, categorical_columns, string_columns)
+    df = pd.read_csv(filename, sep="\t", dtype=dtype, **kwargs)
+    return downcast_numeric(df, precise_columns)
@@ -0,0 +1,229 @@
+# screenviz._launch
+
+import errno
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from werkzeug.serving import make_server
+
+from ._watch import file_signature
+
+DEFAULT_HOST = "127.0.0.1"
+PORT_SCAN = 100
+REGISTRY_DIR = os.environ.get(
+    "SCREENVIZ_REGISTRY_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "screenviz", "dashboards"),
+)
+
+
+def bind_port(
+    port: int = 8050, host: str = DEFAULT_HOST, scan: int = PORT_SCAN
+) -> socket.socket:
+    """
+    Bind a listening socket on the first free port from `port` (0 lets the OS pick one).
+
+    Binding is what claims the port, so two launches can never end up on the
+    same one (unlike probing with a connect and binding later). When the
+    `scan` ports from `port` are all taken the OS assigns one.
+    """
+    candidates = [0] if port == 0 else list(range(port, port + scan)) + [0]
+    for candidate in candidates:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Same as werkzeug: ports left in TIME_WAIT by a stopped dashboard are reusable
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, candidate))
+        except OSError as e:
+            sock.close()
+            if e.errno in (errno.EADDRINUSE, errno.EACCES):
+                continue
+            raise
+        sock.listen(socket.SOMAXCONN)
+        return sock
+    raise RuntimeError(f"Could not bind a port on {host}")
+
+
+def serve(app, sock: socket.socket, debug: bool = True):
+    """
+    Serve a dash app on an already bound socket (without the code reloader).
+    """
+    host, port = sock.getsockname()[:2]
+    app.enable_dev_tools(debug)
+    app.server.debug = debug
+    server = make_server(host, port, app.server, threaded=True, fd=sock.fileno())
+    print(f"Dash is running on http://{host}:{port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def port_open(host: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(0.5)
+        return s.connect_ex((host, port)) == 0
+
+
+class DashboardRegistry:
+    """
+    Running dashboards of the current user, one json record per process.
+
+    A record holds the dashboard kind, its inputs (with their signatures at
+    launch), the options that change what is loaded, and where it is served.
+    Records of dead processes are dropped whenever the registry is read.
+    """
+
+    def __init__(self, directory: str = REGISTRY_DIR):
+        self.directory = directory
+
+    def record_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def records(self) -> List[Dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        records = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not pid_alive(record["pid"]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            records.append(record)
+        return records
+
+    def find(self, kind: str, inputs: List[str], options: Dict) -> Optional[Dict]:
+        """
+        A running dashboard serving the same inputs (unchanged since it loaded them) with the same options.
+        """
+        inputs = [os.path.abspath(path) for path in inputs]
+        signatures = [list(file_signature(path) or []) for path in inputs]
+        for record in self.records():
+            if (
+                record["kind"] != kind
+                or record["inputs"] != inputs
+                or record["options"] != options
+            ):
+                continue
+            # Watched dashboards reload changed inputs by themselves
+            if not record["watch"] and record["signatures"] != signatures:
+                continue
+            if port_open(record["host"], record["port"]):
+                return record
+        return None
+
+    @contextmanager
+    def register(
+        self,
+        kind: str,
+        inputs: List[str],
+        options: Dict,
+        sock: socket.socket,
+        watch: bool = False,
+    ) -> Iterator[Dict]:
+        """
+        Record the current process as serving a dashboard until the block exits.
+        """
+        host, port = sock.getsockname()[:2]
+        inputs = [os.path.abspath(path) for path in inputs]
+        record = {
+            "kind": kind,
+            "inputs": inputs,
+            "signatures": [list(file_signature(path) or []) for path in inputs],
+            "options": options,
+            "watch": watch,
+            "host": host,
+            "port": port,
+            "pid": os.getpid(),
+            "started": time.time(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.record_path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+        try:
+            yield record
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def dashboard_url(record: Dict) -> str:
+    return f"http://{record['host']}:{record['port']}/"
+
+
+def launch_dashboard(
+    kind: str,
+    inputs: List[str],
+    options: Dict,
+    create_app,
+    port: int = 8050,
+    reuse: bool = True,
+    watch: bool = False,
+    debug: bool = True,
+    registry: Optional[DashboardRegistry] = None,
+):
+    """
+    Serve a dashboard, or point to the one already running for the same inputs.
+
+    The port is bound before the app is created and registered right away, so
+    concurrent launches for the same inputs find each other while it loads.
+    """
+    registry = registry or DashboardRegistry()
+    if reuse:
+        record = registry.find(kind, inputs, options)
+        if record is not None:
+            print(
+                f"A {kind} dashboard for these inputs is already running on {dashboard_url(record)} (pid {record['pid']})",
+                file=sys.stderr,
+            )
+            return record
+
+    sock = bind_port(port)
+    # Exit through the registry cleanup when terminated
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with registry.register(kind, inputs, options, sock, watch=watch):
+        app = create_app()
+        app.run(debug=debug, sock=sock)
+    return None
+
+
+def list_dashboards(registry: Optional[DashboardRegistry] = None):
+    """
+    Print the running dashboards as a table.
+    """
+    registry = registry or DashboardRegistry()
+    print("pid\tkind\turl\tinputs")
+    for record in registry.records():
+        print(
+            f"{record['pid']}\t{record['kind']}\t{dashboard_url(record)}\t{','.join(record['inputs'])}"
+        )
@@ -0,0 +1,238 @@
+# screenviz._output
+
+import atexit
+import gzip
+import os
+from typing import List, Optional
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+
+PLOTLYJS_MODES = ["embed", "cdn", "directory"]
+PLOTLYJS_BUNDLE = "plotly.min.js"
+FORMATS = ["html", "png", "svg", "pdf"]
+VECTOR_FORMATS = ["svg", "pdf"]
+
+# Scatter traces with more points than this are rasterized in vector formats
+RASTERIZE_MIN_POINTS = 2_000
+
+# Trace attributes holding point data
+DATA_ATTRIBUTES = ["x", "y", "z", "customdata"]
+
+
+def round_significant(values: np.ndarray, digits: int) -> np.ndarray:
+    """
+    Round values to a number of significant digits (small p-values keep their magnitude).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values) & (values != 0)
+    magnitude = np.zeros_like(values)
+    magnitude[finite] = np.floor(np.log10(np.abs(values[finite])))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    return np.where(finite, np.round(values * scale) / scale, values)
+
+
+def _compact_array(values, precision: Optional[int]):
+    """
+    Convert point data to a numeric array so it is written as a binary typed array.
+
+    With a `precision` the values are rounded to that many significant digits
+    and stored as float32. Non-numeric data (e.g. text in `customdata`) is left untouched.
+    """
+    if values is None or isinstance(values, str):
+        return values
+    array = np.asarray(values)
+    if array.dtype.kind == "O" and array.ndim == 2 and precision is not None:
+        # Mixed hover data (e.g. gene names and scores) stays as text,
+        # only its numeric columns are rounded
+        array = array.copy()
+        for i in range(array.shape[1]):
+            try:
+                column = array[:, i].astype(np.float64)
+            except (TypeError, ValueError):
+                continue
+            array[:, i] = round_significant(column, precision)
+        return array
+    if array.dtype.kind not in "iuf":
+        return values
+    if precision is not None and array.dtype.kind == "f":
+        array = round_significant(array, precision).astype(np.float32)
+    return array
+
+
+def compact_figure(fig: go.Figure, precision: Optional[int] = None) -> go.Figure:
+    """
+    Store the point data of every trace as (optionally rounded) typed arrays in place.
+    """
+    for trace in fig.data:
+        for attr in DATA_ATTRIBUTES:
+            if attr in trace:
+                trace[attr] = _compact_array(trace[attr], precision)
+    return fig
+
+
+def write_plotlyjs_bundle(directory: str):
+    """
+    Write the shared plotly.js bundle next to the figures once.
+    """
+    bundle = os.path.join(directory, PLOTLYJS_BUNDLE)
+    if os.path.exists(bundle):
+        return
+    tmp = f"{bundle}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(get_plotlyjs())
+    os.replace(tmp, bundle)
+
+
+def rasterize_dense_traces(
+    fig: go.Figure, min_points: Optional[int] = RASTERIZE_MIN_POINTS
+) -> go.Figure:
+    """
+    Render dense scatter traces with WebGL so vector exports embed them as a bitmap.
+
+    Sparse traces (e.g. significant genes and threshold lines) are drawn as
+    vector paths, including those plotly express already switched to WebGL.
+    With `min_points=None` every trace is drawn as vector paths.
+    """
+    traces = []
+    for trace in fig.data:
+        if trace.type in ["scatter", "scattergl"] and trace.x is not None:
+            dense = min_points is not None and len(trace.x) > min_points
+            kind = "scattergl" if dense else "scatter"
+            if trace.type != kind:
+                spec = trace.to_plotly_json()
+                spec.pop("type")
+                trace = (go.Scattergl if dense else go.Scatter)(spec, skip_invalid=True)
+        traces.append(trace)
+    fig.data = []
+    fig.add_traces(traces)
+    return fig
+
+
+_renderer_started = False
+
+
+def start_renderer():
+    """
+    Start the persistent kaleido renderer shared by every image written by this process.
+
+    Starting the headless browser dominates the cost of a single export, so
+    the server is opened once and reused until the interpreter exits.
+    """
+    global _renderer_started
+    if _renderer_started:
+        return
+    try:
+        import kaleido
+    except ImportError as e:
+        raise ImportError(
+            "Static image export requires `kaleido` to be installed"
+        ) from e
+
+    # kaleido<1 already keeps its own subprocess alive between exports
+    if hasattr(kaleido, "start_sync_server"):
+        from kaleido.errors import ChromeNotFoundError
+
+        # The server thread dies silently without a browser, so locate it up front
+        try:
+            kaleido.Kaleido()
+        except ChromeNotFoundError as e:
+            raise RuntimeError(
+                "Static image export requires Chrome, install it with `plotly_get_chrome`"
+            ) from e
+        kaleido.start_sync_server(silence_warnings=True)
+        atexit.register(kaleido.stop_sync_server, silence_warnings=True)
+    _renderer_started = True
+
+
+def output_path(output: str, format: str) -> str:
+    """
+    Swap an html extension of the output for the image format (`volcano.html` -> `volcano.png`).
+    """
+    if format == "html":
+        return output
+    for ext in [".html.gz", ".html"]:
+        if output.endswith(ext):
+            return f"{output[: -len(ext)]}.{format}"
+    return output
+
+
+def write_figure(
+    fig: go.Figure,
+    output: str,
+    plotlyjs: str = "embed",
+    precision: Optional[int] = None,
+    format: str = "html",
+    rasterize: bool = True,
+) -> str:
+    """
+    Write a figure as a standalone html file or a static image.
+
+    `plotlyjs` controls where plotly.js comes from in html outputs:
+
+    - embed: inlined in every file (~3.5 MB each)
+    - cdn: loaded from the plotly CDN
+    - directory: a single `plotly.min.js` shared by all files in the output directory
+
+    Html outputs ending in `.gz` are gzip-compressed. Images (png, svg, pdf) are
+    rendered by a persistent kaleido process and dense traces are rasterized in
+    the vector formats unless `rasterize=False`. Returns the path written.
+    """
+    assert plotlyjs in PLOTLYJS_MODES, f"plotlyjs must be one of {PLOTLYJS_MODES}"
+    assert format in FORMATS, f"format must be one of {FORMATS}"
+    compact_figure(fig, precision)
+    output = output_path(output, format)
+
+    if format != "html":
+        if format in VECTOR_FORMATS:
+            rasterize_dense_traces(fig, RASTERIZE_MIN_POINTS if rasterize else None)
+        start_renderer()
+        fig.write_image(output, format=format)
+        return output
+
+    include_plotlyjs = True if plotlyjs == "embed" else plotlyjs
+    html = fig.to_html(include_plotlyjs=include_plotlyjs, full_html=True)
+    if plotlyjs == "directory":
+        write_plotlyjs_bundle(os.path.dirname(os.path.abspath(output)))
+    _write_html(html, output)
+    return output
+
+
+def write_figures_page(
+    figs: List[go.Figure],
+    output: str,
+    title: str,
+    plotlyjs: str = "embed",
+    precision: Optional[int] = None,
+) -> str:
+    """
+    Write several figures into a single standalone html page (plotly.js is included once).
+    """
+    assert plotlyjs in PLOTLYJS_MODES, f"plotlyjs must be one of {PLOTLYJS_MODES}"
+    divs = []
+    for i, fig in enumerate(figs):
+        compact_figure(fig, precision)
+        include_plotlyjs = (
+            (True if plotlyjs == "embed" else plotlyjs) if i == 0 else False
+        )
+        divs.append(fig.to_html(include_plotlyjs=include_plotlyjs, full_html=False))
+    if plotlyjs == "directory":
+        write_plotlyjs_bundle(os.path.dirname(os.path.abspath(output)))
+
+    html = (
+        '<html>\n<head><meta charset="utf-8" />'
+        f"<title>{title}</title></head>\n"
+        f"<body>\n<h1>{title}</h1>\n" + "\n".join(divs) + "\n</body>\n</html>\n"
+    )
+    _write_html(html, output)
+    return output
+
+
+def _write_html(html: str, output: str):
+    if output.endswith(".gz"):
+        with gzip.open(output, "wt", encoding="utf-8") as f:
+            f.write(html)
+    else:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(html)
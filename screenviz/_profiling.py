@@ -0,0 +1,254 @@
+# screenviz._profiling
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Iterable, Optional
+
+import flask
+
+METRICS_ROUTE = "/_screenviz/metrics"
+PROFILE_BACKENDS = ["cprofile", "pyinstrument"]
+PHASES = ["compute", "figure", "serialize"]
+
+# Card methods matching these prefixes are timed as the figure-build phase
+FIGURE_BUILDER_PREFIXES = ("create_", "get_figure")
+FIGURE_BUILDER_EXCLUDE = ("create_card", "create_layout")
+
+
+class CallbackProfiler:
+    """
+    Opt-in instrumentation of the dash callbacks registered by the dashboard cards.
+
+    Every callback call is split into phases:
+
+    - compute: time in the callback outside of the card's figure builders
+    - figure: time in the card's figure builders (`create_*`, `get_figure`)
+    - serialize: time from the callback return to the response (the JSON encoding by dash)
+    - payload bytes: size of the response sent by dash
+
+    The serialize phase and payload are measured on the response dash
+    builds, so the output is only encoded once. Aggregates are served in
+    Prometheus text format on `METRICS_ROUTE`. Optionally a cProfile or
+    pyinstrument report is dumped for every call: only one profiler can be
+    active at a time, so profiled callbacks then run one at a time.
+    """
+
+    def __init__(self, report_dir: Optional[str] = None, backend: str = "cprofile"):
+        assert backend in PROFILE_BACKENDS, (
+            f"Profile backend must be one of {PROFILE_BACKENDS}"
+        )
+        self.report_dir = report_dir
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.profile_lock = threading.Lock()
+        self.local = threading.local()
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.payload_bytes = defaultdict(int)
+        self.reports = defaultdict(int)
+
+        if self.report_dir is not None:
+            os.makedirs(self.report_dir, exist_ok=True)
+            if self.backend == "pyinstrument":
+                try:
+                    import pyinstrument  # noqa: F401
+                except ImportError as e:
+                    raise ImportError(
+                        "The pyinstrument profile backend requires `pyinstrument` to be installed"
+                    ) from e
+
+    def instrument(self, app, cards: Iterable):
+        """
+        Instrument a dash app and its cards.
+
+        Must be called before the cards register their callbacks.
+        """
+        for card in cards:
+            self.wrap_figure_builders(card)
+
+        register = app.callback
+
+        @functools.wraps(register)
+        def callback(*args, **kwargs):
+            decorator = register(*args, **kwargs)
+            return lambda func: decorator(self.wrap_callback(func))
+
+        app.callback = callback
+        app.server.after_request(self.observe_response)
+        app.server.add_url_rule(
+            METRICS_ROUTE,
+            endpoint="screenviz_metrics",
+            view_func=lambda: flask.Response(
+                self.to_prometheus(), mimetype="text/plain; version=0.0.4"
+            ),
+        )
+
+    def wrap_figure_builders(self, card):
+        for name in dir(type(card)):
+            if not name.startswith(FIGURE_BUILDER_PREFIXES):
+                continue
+            if name in FIGURE_BUILDER_EXCLUDE:
+                continue
+            method = getattr(card, name)
+            if callable(method):
+                setattr(card, name, self._time_figure(method))
+
+    def _time_figure(self, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            record = getattr(self.local, "record", None)
+            # Only time the outermost builder of an active callback
+            if record is None or record["depth"] > 0:
+                return method(*args, **kwargs)
+            record["depth"] += 1
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record["figure"] += time.perf_counter() - start
+                record["depth"] -= 1
+
+        return wrapper
+
+    def wrap_callback(self, func):
+        label = f"{func.__qualname__.split('.')[0]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = {"figure": 0.0, "depth": 0, "label": label}
+            self.local.pending = None
+            profiling = self.report_dir is not None
+            with self.profile_lock if profiling else nullcontext():
+                self.local.record = record
+                profile = self._start_profile()
+                start = time.perf_counter()
+                try:
+                    output = func(*args, **kwargs)
+                finally:
+                    record["elapsed"] = time.perf_counter() - start
+                    self.local.record = None
+                    self._stop_profile(profile, label)
+
+            # Observed with the response once dash has serialized the output
+            record["returned"] = time.perf_counter()
+            self.local.pending = record
+            return output
+
+        return wrapper
+
+    def observe_response(self, response):
+        record = getattr(self.local, "pending", None)
+        if record is None:
+            return response
+        self.local.pending = None
+        serialize = time.perf_counter() - record["returned"]
+        self.observe(
+            record["label"],
+            compute=record["elapsed"] - record["figure"],
+            figure=record["figure"],
+            serialize=serialize,
+            payload_bytes=response.calculate_content_length() or 0,
+        )
+        return response
+
+    def _start_profile(self):
+        if self.report_dir is None:
+            return None
+        if self.backend == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profile = Profiler()
+            profile.start()
+        else:
+            import cProfile
+
+            profile = cProfile.Profile()
+            profile.enable()
+        return profile
+
+    def _stop_profile(self, profile, label: str):
+        if profile is None:
+            return
+        with self.lock:
+            index = self.reports[label]
+            self.reports[label] += 1
+        basename = os.path.join(self.report_dir, f"{label}.{index:05d}")
+        if self.backend == "pyinstrument":
+            profile.stop()
+            with open(f"{basename}.html", "w") as f:
+                f.write(profile.output_html())
+        else:
+            profile.disable()
+            profile.dump_stats(f"{basename}.prof")
+
+    def observe(
+        self,
+        label: str,
+        compute: float,
+        figure: float,
+        serialize: float,
+        payload_bytes: int,
+    ):
+        with self.lock:
+            self.calls[label] += 1
+            self.seconds[(label, "compute")] += compute
+            self.seconds[(label, "figure")] += figure
+            self.seconds[(label, "serialize")] += serialize
+            self.payload_bytes[label] += payload_bytes
+
+    def to_prometheus(self) -> str:
+        """
+        Render the aggregated callback metrics in Prometheus text format.
+        """
+        lines = [
+            "# HELP screenviz_callback_phase_seconds Time spent in each callback phase.",
+            "# TYPE screenviz_callback_phase_seconds summary",
+        ]
+        with self.lock:
+            calls = dict(self.calls)
+            seconds = dict(self.seconds)
+            payload_bytes = dict(self.payload_bytes)
+
+        for label, count in sorted(calls.items()):
+            for phase in PHASES:
+                tags = f'callback="{label}",phase="{phase}"'
+                lines.append(
+                    f"screenviz_callback_phase_seconds_sum{{{tags}}} "
+                    f"{seconds[(label, phase)]:.6f}"
+                )
+                lines.append(
+                    f"screenviz_callback_phase_seconds_count{{{tags}}} {count}"
+                )
+
+        lines += [
+            "# HELP screenviz_callback_payload_bytes Size of the serialized callback output.",
+            "# TYPE screenviz_callback_payload_bytes summary",
+        ]
+        for label, count in sorted(calls.items()):
+            tags = f'callback="{label}"'
+            lines.append(
+                f"screenviz_callback_payload_bytes_sum{{{tags}}} {payload_bytes[label]}"
+            )
+            lines.append(f"screenviz_callback_payload_bytes_count{{{tags}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def build_profiler(
+    profile: bool, report_dir: Optional[str] = None, backend: str = "cprofile"
+) -> Optional[CallbackProfiler]:
+    """
+    Build a callback profiler if profiling was requested.
+    """
+    if not profile:
+        return None
+    profiler = CallbackProfiler(report_dir=report_dir, backend=backend)
+    print(
+        f"Profiling enabled, serving callback metrics on {METRICS_ROUTE}",
+        file=sys.stderr,
+    )
+    return profiler
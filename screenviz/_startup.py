@@ -0,0 +1,260 @@
+# screenviz._startup
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import flask
+from dash import dcc, html, no_update
+from dash.dependencies import Input, Output, State
+
+STARTUP_INTERVAL_MS = 500
+READY_ROUTE = "/_screenviz/ready"
+
+
+class Section:
+    """
+    A part of the page rendered once the loading steps it requires are done.
+    """
+
+    def __init__(
+        self,
+        section_id: str,
+        title: str,
+        render: Callable[[], object],
+        requires: Sequence[str],
+    ):
+        self.section_id = section_id
+        self.title = title
+        self.render = render
+        self.requires = list(requires)
+
+
+class StartupLoader:
+    """
+    Run the loading steps of a dashboard in a thread pool while it is already serving.
+
+    A step starts as soon as every step it requires is done, so independent
+    steps run concurrently. Sections of the page are shown as skeletons until
+    the steps they require are done and are then swapped in by a polling
+    callback. The status of every step is shown on the page and served as json
+    on `READY_ROUTE` (503 until everything is loaded).
+    """
+
+    def __init__(
+        self,
+        card_style: Optional[Dict] = None,
+        threads: Optional[int] = None,
+        interval_ms: int = STARTUP_INTERVAL_MS,
+    ):
+        self.card_style = card_style
+        self.threads = threads
+        self.interval_ms = interval_ms
+        self.steps: Dict[str, Callable[[], None]] = {}
+        self.requires: Dict[str, List[str]] = {}
+        self.status: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+        self.sections: List[Section] = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.pool = None
+        self.start_time = None
+        self.elapsed = None
+
+    def add_step(
+        self, name: str, func: Callable[[], None], requires: Sequence[str] = ()
+    ):
+        assert name not in self.steps, f"Duplicate loading step: {name}"
+        for required in requires:
+            assert required in self.steps, (
+                f"Step {name} requires {required}, which must be added first"
+            )
+        self.steps[name] = func
+        self.requires[name] = list(requires)
+        self.status[name] = "pending"
+
+    def add_section(
+        self,
+        section_id: str,
+        title: str,
+        render: Callable[[], object],
+        requires: Sequence[str],
+    ):
+        for required in requires:
+            assert required in self.steps, f"Unknown loading step: {required}"
+        self.sections.append(Section(section_id, title, render, requires))
+
+    def start(self):
+        if self.pool is not None:
+            return
+        self.start_time = time.perf_counter()
+        workers = max(1, min(len(self.steps), self.threads or os.cpu_count()))
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="screenviz-load"
+        )
+        with self.lock:
+            runnable = self.runnable()
+        for name in runnable:
+            self.pool.submit(self.run_step, name)
+        self.check_done()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every step finished (or failed), returns whether all of them succeeded.
+        """
+        self.done.wait(timeout)
+        return self.is_ready(self.steps)
+
+    def runnable(self) -> List[str]:
+        """
+        Pending steps whose requirements are done, marked as loading (holding the lock).
+        """
+        names = [
+            name
+            for name, status in self.status.items()
+            if status == "pending"
+            and all(self.status[r] == "ready" for r in self.requires[name])
+        ]
+        for name in names:
+            self.status[name] = "loading"
+        return names
+
+    def run_step(self, name: str):
+        start = time.perf_counter()
+        try:
+            self.steps[name]()
+        except Exception as e:
+            print(f"Failed to load {name}: {e}", file=sys.stderr)
+            with self.lock:
+                self.status[name] = "failed"
+                self.errors[name] = str(e)
+                self.fail_dependents()
+            runnable = []
+        else:
+            print(
+                f"Loaded {name} in {time.perf_counter() - start:.2f}s",
+                file=sys.stderr,
+            )
+            with self.lock:
+                self.status[name] = "ready"
+                runnable = self.runnable()
+        for next_name in runnable:
+            self.pool.submit(self.run_step, next_name)
+        self.check_done()
+
+    def fail_dependents(self):
+        changed = True
+        while changed:
+            changed = False
+            for name, status in self.status.items():
+                failed = [r for r in self.requires[name] if self.status[r] == "failed"]
+                if status == "pending" and failed:
+                    self.status[name] = "failed"
+                    self.errors[name] = f"requires {failed[0]}, which failed"
+                    changed = True
+
+    def check_done(self):
+        with self.lock:
+            finished = all(s in ("ready", "failed") for s in self.status.values())
+            if not finished or self.done.is_set():
+                return
+            self.elapsed = time.perf_counter() - self.start_time
+            self.done.set()
+        self.pool.shutdown(wait=False)
+        print(f"Finished loading in {self.elapsed:.2f}s", file=sys.stderr)
+
+    def is_ready(self, requires: Sequence[str]) -> bool:
+        return all(self.status[r] == "ready" for r in requires)
+
+    def section_error(self, section: Section) -> Optional[str]:
+        for required in section.requires:
+            if self.status[required] == "failed":
+                return self.errors[required]
+        return None
+
+    def skeleton(self, title: str, message: str = "Loading...") -> html.Div:
+        return html.Div(
+            [html.H3(title), html.P(message, style={"color": "#6c757d"})],
+            className="card",
+            style=self.card_style,
+        )
+
+    def status_text(self) -> str:
+        if self.done.is_set():
+            if self.is_ready(self.steps):
+                return f"All data loaded in {self.elapsed:.1f}s"
+            return f"Failed to load: {', '.join(n for n, s in self.status.items() if s == 'failed')}"
+        ready = sum(s == "ready" for s in self.status.values())
+        loading = [n for n, s in self.status.items() if s == "loading"]
+        return (
+            f"Loading data ({ready}/{len(self.steps)} steps done): {', '.join(loading)}"
+        )
+
+    def create_layout(self):
+        """
+        The status line and the polling components (must be rendered on every page load).
+        """
+        return html.Div(
+            [
+                html.Div(
+                    self.status_text(),
+                    id="startup-status",
+                    style={"color": "#6c757d", "fontSize": "small"},
+                ),
+                dcc.Store(id="startup-rendered", data=[]),
+                dcc.Interval(id="startup-interval", interval=self.interval_ms),
+            ]
+        )
+
+    def create_section(self, section_id: str) -> html.Div:
+        """
+        The container of a section, holding its skeleton until it is loaded.
+        """
+        section = next(s for s in self.sections if s.section_id == section_id)
+        return html.Div(id=section_id, children=[self.skeleton(section.title)])
+
+    def register_callbacks(self, app):
+        @app.callback(
+            [Output(s.section_id, "children") for s in self.sections]
+            + [
+                Output("startup-status", "children"),
+                Output("startup-rendered", "data"),
+                Output("startup-interval", "disabled"),
+            ],
+            Input("startup-interval", "n_intervals"),
+            State("startup-rendered", "data"),
+        )
+        def update_sections(_n_intervals, rendered):
+            rendered = list(rendered or [])
+            children = []
+            for section in self.sections:
+                error = self.section_error(section)
+                if section.section_id in rendered:
+                    children.append(no_update)
+                elif self.is_ready(section.requires):
+                    children.append([section.render()])
+                    rendered.append(section.section_id)
+                elif error is not None:
+                    children.append(
+                        [self.skeleton(section.title, f"Failed to load: {error}")]
+                    )
+                    rendered.append(section.section_id)
+                else:
+                    children.append(no_update)
+            finished = self.done.is_set() and len(rendered) == len(self.sections)
+            return children + [self.status_text(), rendered, finished]
+
+        @app.server.route(READY_ROUTE)
+        def startup_status():
+            response = flask.jsonify(
+                {
+                    "ready": self.done.is_set() and self.is_ready(self.steps),
+                    "steps": dict(self.status),
+                    "errors": dict(self.errors),
+                }
+            )
+            response.status_code = 200 if self.is_ready(self.steps) else 503
+            return response
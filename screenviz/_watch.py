@@ -0,0 +1,123 @@
+# screenviz._watch
+
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from dash import dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+
+WATCH_INTERVAL = 1.0
+REFRESH_INTERVAL_MS = 2_000
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    (mtime, size) of a file, or None while it is missing (e.g. mid-rewrite).
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Watcher:
+    """
+    Poll files for changes and reload them in the background.
+
+    Each watched file has a reload function which rebuilds everything derived
+    from it off the request threads and swaps it in. A change is only acted on
+    once the file's (mtime, size) is stable across two polls, so files being
+    written are not read half-way. Every successful reload bumps a version that
+    connected clients poll for and reload the page on.
+    """
+
+    def __init__(
+        self,
+        reloaders: Dict[str, Callable[[], None]],
+        interval: float = WATCH_INTERVAL,
+        refresh_interval_ms: int = REFRESH_INTERVAL_MS,
+    ):
+        self.reloaders = reloaders
+        self.interval = interval
+        self.refresh_interval_ms = refresh_interval_ms
+        self.version = 0
+        self.loaded = {path: file_signature(path) for path in reloaders}
+        self.pending = dict(self.loaded)
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(
+            target=self.run, name="screenviz-watch", daemon=True
+        )
+        self.thread.start()
+        print(
+            f"Watching {len(self.reloaders)} file(s) for changes",
+            file=sys.stderr,
+        )
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.poll()
+
+    def poll(self):
+        """
+        Reload every file whose signature changed and has been stable for one poll.
+        """
+        for path, reload in self.reloaders.items():
+            signature = file_signature(path)
+            stable = signature is not None and signature == self.pending[path]
+            self.pending[path] = signature
+            if not stable or signature == self.loaded[path]:
+                continue
+
+            start = time.perf_counter()
+            try:
+                reload()
+            except Exception as e:
+                # Keep serving the previous data, retry on the next change
+                print(f"Failed to reload {path}: {e}", file=sys.stderr)
+            else:
+                self.version += 1
+                print(
+                    f"Reloaded {path} in {time.perf_counter() - start:.2f}s",
+                    file=sys.stderr,
+                )
+            self.loaded[path] = signature
+
+    def create_layout(self):
+        """
+        Components polling the data version (must be rendered on every page load).
+        """
+        return html.Div(
+            [
+                dcc.Location(id="watch-location", refresh=True),
+                dcc.Store(id="watch-loaded-version", data=self.version),
+                dcc.Interval(id="watch-interval", interval=self.refresh_interval_ms),
+            ]
+        )
+
+    def register_callbacks(self, app):
+        @app.callback(
+            Output("watch-location", "search"),
+            Input("watch-interval", "n_intervals"),
+            State("watch-loaded-version", "data"),
+        )
+        def refresh_on_reload(_n_intervals, loaded_version):
+            if loaded_version == self.version:
+                raise PreventUpdate
+            return f"?version={self.version}"
+
+
+def should_start_watcher(debug: bool) -> bool:
+    """
+    Only watch from the serving process, not from the parent of the debug reloader.
+    """
+    return not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
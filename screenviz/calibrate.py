@@ -0,0 +1,296 @@
+# screenviz.calibrate
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+from scipy import stats
+
+from ._dtypes import read_table
+from .formats import read_results, resolve_format, screenviz_column
+
+# Pseudo-genes are simulated in fixed-size chunks, each with its own RNG stream,
+# so the null distribution depends only on the seed and not on the number of jobs.
+CHUNK_SIZE = 10_000
+
+
+def simulate_null_chunk(
+    ntc_log2fc: np.ndarray,
+    gene_sizes: np.ndarray,
+    n_pseudogenes: int,
+    seed: np.random.SeedSequence,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Simulate pseudo-genes by resampling non-targeting guides.
+
+    Each pseudo-gene draws its number of guides from the observed guides-per-gene
+    distribution and its guides (with replacement) from the non-targeting pool.
+    Its fold change is the mean of its guide fold changes and its p-value the
+    smaller one-sided Mann-Whitney U p-value (normal approximation) of its guides
+    against the full non-targeting pool.
+
+    Returns the (log2fc, pvalue) of every pseudo-gene.
+    """
+    rng = np.random.default_rng(seed)
+    pool = np.sort(ntc_log2fc)
+    n_pool = pool.size
+
+    # U statistic contribution of each pool guide against the pool (ties count half)
+    pool_rank = (
+        np.searchsorted(pool, ntc_log2fc, side="left")
+        + np.searchsorted(pool, ntc_log2fc, side="right")
+    ) / 2
+
+    sizes = rng.choice(gene_sizes, size=n_pseudogenes)
+    log2fc = np.empty(n_pseudogenes)
+    pvalue = np.empty(n_pseudogenes)
+    for size in np.unique(sizes):
+        mask = sizes == size
+        draws = rng.integers(0, n_pool, size=(mask.sum(), size))
+        u = pool_rank[draws].sum(axis=1)
+        mean = size * n_pool / 2
+        sd = np.sqrt(size * n_pool * (size + n_pool + 1) / 12)
+        z = (u - mean) / sd
+        log2fc[mask] = ntc_log2fc[draws].mean(axis=1)
+        pvalue[mask] = np.minimum(stats.norm.cdf(z), stats.norm.sf(z))
+    return log2fc, pvalue
+
+
+def fdr_threshold(
+    real: np.ndarray, null: np.ndarray, n_real: int, fdr: float
+) -> Optional[float]:
+    """
+    Least extreme threshold whose empirical FDR is at most `fdr`.
+
+    Both arrays hold an extremity score (larger = more significant) where `real`
+    only holds the genes on one side of the volcano and `null` holds every
+    pseudo-gene (those on the other side as -inf). The expected number of false discoveries
+    at a threshold is the fraction of all null pseudo-genes beyond it scaled to
+    the `n_real` tested genes. Returns `None` if no threshold reaches the target.
+    """
+    if real.size == 0:
+        return None
+    candidates = np.sort(real)[::-1]
+    discoveries = np.arange(1, candidates.size + 1)
+    null_sorted = np.sort(null)
+    null_beyond = null_sorted.size - np.searchsorted(null_sorted, candidates, "left")
+    false_discoveries = null_beyond / null.size * n_real
+    qvalues = np.minimum.accumulate((false_discoveries / discoveries)[::-1])[::-1]
+    passing = np.flatnonzero(qvalues <= fdr)
+    if passing.size == 0:
+        return None
+    return candidates[passing[-1]]
+
+
+class CalibrateThresholds:
+    def __init__(
+        self,
+        sgrna_filename: str,
+        gene_filename: str,
+        method: str = "inc-product",
+        ntc_token: str = "non-targeting",
+        pseudogene_token: str = "amalgam",
+        sgrna_gene_column: str = "gene",
+        sgrna_fc_column: str = "log2fc",
+        gene_column: str = "gene",
+        fc_column: str = "log2fc",
+        pval_column: str = "pvalue",
+        score_column: str = "phenotype_score",
+        format: Optional[str] = None,
+    ):
+        assert method in [
+            "inc-product",
+            "inc-pvalue",
+        ], "The method must be one of 'inc-pvalue' or 'inc-product'"
+        self.method = method
+        self.ntc_token = ntc_token
+        self.pseudogene_token = pseudogene_token
+        self.format = format
+
+        sgrnas = self.load_sgrnas(sgrna_filename, sgrna_gene_column, sgrna_fc_column)
+        is_ntc = sgrnas["gene"].astype(str).str.contains(ntc_token)
+        assert is_ntc.any(), f"No non-targeting guides found with token: {ntc_token}"
+        self.ntc_log2fc = sgrnas.loc[is_ntc, "log2fc"].to_numpy(np.float64)
+        sizes = sgrnas.loc[~is_ntc, "gene"].value_counts()
+        self.gene_sizes = sizes[sizes > 0].to_numpy()
+
+        genes = self.load_genes(
+            gene_filename, gene_column, fc_column, pval_column, score_column
+        )
+        is_pseudo = genes[self.gene_column].astype(str).str.contains(pseudogene_token)
+        self.genes = genes[~is_pseudo]
+
+    def load_sgrnas(
+        self, filename: str, gene_column: str, fc_column: str
+    ) -> pd.DataFrame:
+        """
+        The gene and fold change of every guide, as the `gene` and `log2fc` columns.
+        """
+        columns = [gene_column, fc_column]
+        result_format = resolve_format(filename, "sgrna", columns, self.format)
+        if result_format is not None:
+            return read_results(
+                filename, "sgrna", format=result_format.name, columns=["gene", "log2fc"]
+            )
+        sgrnas = read_table(
+            filename, categorical_columns=[gene_column], usecols=columns
+        )
+        return sgrnas.rename(columns={gene_column: "gene", fc_column: "log2fc"})
+
+    def load_genes(
+        self,
+        filename: str,
+        gene_column: str,
+        fc_column: str,
+        pval_column: str,
+        score_column: str,
+    ) -> pd.DataFrame:
+        """
+        The gene results, read through their format unless they have the given columns.
+
+        With a format the columns are switched to the screenviz ones and the
+        phenotype score of the inc-product method, which no tool but
+        crispr_screen reports, is derived as the statistic of the null.
+        """
+        columns = [gene_column, fc_column, pval_column]
+        if self.method == "inc-product":
+            columns.append(score_column)
+        result_format = resolve_format(filename, "gene", columns, self.format)
+        if result_format is None:
+            genes = read_table(
+                filename,
+                categorical_columns=[gene_column],
+                precise_columns=[pval_column, score_column],
+            )
+        else:
+            genes = read_results(filename, "gene", format=result_format.name)
+            gene_column, fc_column = "gene", "log2fc"
+            pval_column = screenviz_column(pval_column, "gene", "pvalue")
+            result_format.check_reported([pval_column])
+            if self.method == "inc-product" and score_column not in genes.columns:
+                genes[score_column] = self._statistic(
+                    genes[fc_column].to_numpy(np.float64),
+                    genes[pval_column].to_numpy(np.float64),
+                )
+        self.gene_column = gene_column
+        self.fc_column = fc_column
+        self.pval_column = pval_column
+        self.score_column = score_column
+        required = [gene_column, fc_column, pval_column]
+        if self.method == "inc-product":
+            required.append(score_column)
+        for col in required:
+            assert col in genes.columns, f"The gene file must have a column named {col}"
+        return genes
+
+    def simulate_null(
+        self, n_pseudogenes: int = 10_000, seed: int = 0, n_jobs: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Simulate the null (log2fc, pvalue) of `n_pseudogenes` NTC pseudo-genes.
+        """
+        n_chunks = int(np.ceil(n_pseudogenes / CHUNK_SIZE))
+        seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+        chunk_sizes = [
+            min(CHUNK_SIZE, n_pseudogenes - i * CHUNK_SIZE) for i in range(n_chunks)
+        ]
+        args = [
+            (self.ntc_log2fc, self.gene_sizes, size, chunk_seed)
+            for size, chunk_seed in zip(chunk_sizes, seeds)
+        ]
+        if n_jobs == 1:
+            chunks = [simulate_null_chunk(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                chunks = list(pool.map(simulate_null_chunk, *zip(*args)))
+        log2fc = np.concatenate([c[0] for c in chunks])
+        pvalue = np.concatenate([c[1] for c in chunks])
+        return log2fc, pvalue
+
+    def _statistic(self, log2fc: np.ndarray, pvalue: np.ndarray) -> np.ndarray:
+        if self.method == "inc-product":
+            return log2fc * -np.log10(pvalue)
+        return pvalue
+
+    def calibrate(
+        self,
+        fdr: float = 0.1,
+        n_pseudogenes: int = 10_000,
+        seed: int = 0,
+        n_jobs: int = 1,
+    ) -> Tuple[float, float]:
+        """
+        Derive the (threshold_low, threshold_high) pair reaching the target FDR on each side.
+        """
+        null_log2fc, null_pvalue = self.simulate_null(n_pseudogenes, seed, n_jobs)
+        null_stat = self._statistic(null_log2fc, null_pvalue)
+        real_log2fc = self.genes[self.fc_column].to_numpy(np.float64)
+        if self.method == "inc-product":
+            real_stat = self.genes[self.score_column].to_numpy(np.float64)
+        else:
+            real_stat = self.genes[self.pval_column].to_numpy(np.float64)
+        n_real = real_stat.size
+
+        thresholds = []
+        for side in ["low", "high"]:
+            real_side = real_log2fc < 0 if side == "low" else real_log2fc > 0
+            null_side = null_log2fc < 0 if side == "low" else null_log2fc > 0
+
+            # Extremity: larger is more significant on this side
+            if self.method == "inc-product":
+                sign = -1.0 if side == "low" else 1.0
+                real_ext, null_ext = sign * real_stat, sign * null_stat
+            else:
+                real_ext, null_ext = -real_stat, -null_stat
+            null_ext = np.where(null_side, null_ext, -np.inf)
+
+            extremity = fdr_threshold(real_ext[real_side], null_ext, n_real, fdr)
+            if extremity is None:
+                print(
+                    f"Warning: no {side} threshold reaches an FDR of {fdr}, "
+                    "using the most extreme null pseudo-gene",
+                    file=sys.stderr,
+                )
+                extremity = np.max(null_ext[null_side]) if null_side.any() else np.inf
+            # Signify uses strict comparisons, nudge so the boundary gene passes
+            extremity = np.nextafter(extremity, -np.inf)
+
+            if self.method == "inc-product":
+                thresholds.append(float(sign * extremity))
+            else:
+                thresholds.append(float(-extremity))
+        return thresholds[0], thresholds[1]
+
+    def write_config(
+        self,
+        output: str,
+        fdr: float = 0.1,
+        n_pseudogenes: int = 10_000,
+        seed: int = 0,
+        n_jobs: int = 1,
+    ):
+        threshold_low, threshold_high = self.calibrate(fdr, n_pseudogenes, seed, n_jobs)
+        config = {
+            "method": self.method,
+            "threshold_low": threshold_low,
+            "threshold_high": threshold_high,
+            "x": self.fc_column,
+            "y": self.pval_column,
+            "z": self.score_column
+            if self.method == "inc-product"
+            else self.pval_column,
+            "gene": self.gene_column,
+            "ntc_token": self.pseudogene_token,
+            "calibration": {
+                "fdr": fdr,
+                "n_pseudogenes": n_pseudogenes,
+                "seed": seed,
+                "ntc_guides": int(self.ntc_log2fc.size),
+            },
+        }
+        print(f"Saving calibrated config to: {output}", file=sys.stderr)
+        with open(output, "w") as f:
+            yaml.safe_dump(config, f, sort_keys=False)
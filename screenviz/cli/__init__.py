@@ -1,9 +1,14 @@
 import argparse as ap
 
+from ._calibrate import calibrate_parser
 from ._compare import compare_parser
 from ._gene import gene_parser
+from ._gene_index import index_parser, lookup_parser
 from ._idea import idea_parser
+from ._launch import dashboards_parser
+from ._metrics import metrics_parser
 from ._quality_control import quality_control_parser
+from ._report import report_parser
 from ._results import results_parser
 from ._sgrna import sgrna_parser
 
@@ -15,6 +20,12 @@ def get_args() -> ap.Namespace:
     sgrna_parser(subparser)
     compare_parser(subparser)
     idea_parser(subparser)
+    calibrate_parser(subparser)
     quality_control_parser(subparser)
+    metrics_parser(subparser)
     results_parser(subparser)
+    index_parser(subparser)
+    lookup_parser(subparser)
+    report_parser(subparser)
+    dashboards_parser(subparser)
     return parser.parse_args()
@@ -0,0 +1,111 @@
+from ..formats import format_names
+
+
+def calibrate_parser(subparser):
+    # create the parser for the "calibrate" command
+    parser_calibrate = subparser.add_parser(
+        "calibrate",
+        help="Calibrate the significance thresholds of a gene config with non-targeting pseudo-genes",
+    )
+    parser_calibrate.add_argument(
+        "-i", "--sgrna_input", help="Input file for sgRNA-level results", required=True
+    )
+    parser_calibrate.add_argument(
+        "-I", "--gene_input", help="Input file for gene-level results", required=True
+    )
+    parser_calibrate.add_argument(
+        "-o",
+        "--output",
+        help="Output config file (default = 'config_calibrated.yaml')",
+        required=False,
+        default="config_calibrated.yaml",
+    )
+    parser_calibrate.add_argument(
+        "-m",
+        "--method",
+        help="Thresholding method of the config (default = 'inc-product')",
+        choices=["inc-product", "inc-pvalue"],
+        required=False,
+        default="inc-product",
+    )
+    parser_calibrate.add_argument(
+        "--fdr",
+        type=float,
+        help="Target false discovery rate of each side (default = 0.1)",
+        required=False,
+        default=0.1,
+    )
+    parser_calibrate.add_argument(
+        "-n",
+        "--n_pseudogenes",
+        type=int,
+        help="Number of pseudo-genes to resample from the non-targeting guides (default = 10000)",
+        required=False,
+        default=10_000,
+    )
+    parser_calibrate.add_argument(
+        "--seed",
+        type=int,
+        help="Seed of the random number generator (default = 0)",
+        required=False,
+        default=0,
+    )
+    parser_calibrate.add_argument(
+        "--threads",
+        type=int,
+        help="Number of processes to simulate pseudo-genes with (default = 1)",
+        required=False,
+        default=1,
+    )
+    parser_calibrate.add_argument(
+        "--ntc_token",
+        help="Token to identify non-targeting guides in the sgRNA file (default = 'non-targeting')",
+        required=False,
+        default="non-targeting",
+    )
+    parser_calibrate.add_argument(
+        "--pseudogene_token",
+        help="Token to identify pseudo-genes in the gene file (default = 'amalgam')",
+        required=False,
+        default="amalgam",
+    )
+    parser_calibrate.add_argument(
+        "--sgrna_fc_column",
+        help="Column name of fold change values in the sgRNA file (default = 'log2fc')",
+        required=False,
+        default="log2fc",
+    )
+    parser_calibrate.add_argument(
+        "-g",
+        "--gene_column",
+        help="Column name of gene names in both files (default = 'gene')",
+        required=False,
+        default="gene",
+    )
+    parser_calibrate.add_argument(
+        "-f",
+        "--fc_column",
+        help="Column name of fold change values in the gene file (default = 'log2fc')",
+        required=False,
+        default="log2fc",
+    )
+    parser_calibrate.add_argument(
+        "-p",
+        "--pval_column",
+        help="Column name of p-values in the gene file (default = 'pvalue')",
+        required=False,
+        default="pvalue",
+    )
+    parser_calibrate.add_argument(
+        "-z",
+        "--score_column",
+        help="Column name of phenotype scores in the gene file (default = 'phenotype_score')",
+        required=False,
+        default="phenotype_score",
+    )
+    parser_calibrate.add_argument(
+        "--input_format",
+        help="Format of both input files (default = detected from the header when the column arguments do not match it)",
+        required=False,
+        choices=format_names(),
+    )
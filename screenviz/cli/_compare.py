@@ -1,3 +1,7 @@
+from ..formats import format_names
+from ._output import add_output_arguments
+
+
 def compare_parser(subparser):
     parser_compare_gene = subparser.add_parser(
         "compare",
@@ -9,6 +13,13 @@ def compare_parser(subparser):
     parser_compare_gene.add_argument(
         "-I", "--screen_b", help="Input file to use as the second screen", required=True
     )
+    parser_compare_gene.add_argument(
+        "-o",
+        "--output",
+        help="Output file (default = 'comparison.html'), add '.gz' to compress",
+        required=False,
+        default="comparison.html",
+    )
     parser_compare_gene.add_argument(
         "-x",
         "--variable_column_a",
@@ -73,3 +84,22 @@ def compare_parser(subparser):
         required=False,
         action="store_false",
     )
+    parser_compare_gene.add_argument(
+        "--input_format_a",
+        help="Format of the first screen (default = detected from the header when the column arguments do not match it)",
+        required=False,
+        choices=format_names(),
+    )
+    parser_compare_gene.add_argument(
+        "--input_format_b",
+        help="Format of the second screen (default = detected from the header when the column arguments do not match it)",
+        required=False,
+        choices=format_names(),
+    )
+    parser_compare_gene.add_argument(
+        "--full_precision",
+        help="Keep float64/int64 columns and object strings instead of compact dtypes (p-values, FDRs and scores are always float64, other floats such as fold changes are float32 by default)",
+        required=False,
+        action="store_true",
+    )
+    add_output_arguments(parser_compare_gene)
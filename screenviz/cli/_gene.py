@@ -1,3 +1,7 @@
+from ..formats import format_names
+from ._output import add_output_arguments
+
+
 def gene_parser(subparser):
     # create the parser for the "gene" command
     parser_gene = subparser.add_parser(
@@ -7,7 +11,7 @@ def gene_parser(subparser):
     parser_gene.add_argument(
         "-o",
         "--output",
-        help="Output file (default = 'gene_volcano.html')",
+        help="Output file (default = 'gene_volcano.html'), add '.gz' to compress",
         required=False,
         default="gene_volcano.html",
     )
@@ -53,3 +57,16 @@ def gene_parser(subparser):
         required=False,
         default=0.1,
     )
+    parser_gene.add_argument(
+        "--input_format",
+        help="Format of the input file (default = detected from the header when the column arguments do not match it)",
+        required=False,
+        choices=format_names(),
+    )
+    parser_gene.add_argument(
+        "--full_precision",
+        help="Keep float64/int64 columns and object strings instead of compact dtypes (p-values, FDRs and scores are always float64, other floats such as fold changes are float32 by default)",
+        required=False,
+        action="store_true",
+    )
+    add_output_arguments(parser_gene)
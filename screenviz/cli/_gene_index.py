@@ -0,0 +1,54 @@
+def index_parser(subparser):
+    # create the parser for the "index" command
+    parser_index = subparser.add_parser(
+        "index",
+        help="Build a cross-screen gene lookup index from a directory of screen results",
+    )
+    parser_index.add_argument(
+        "-d",
+        "--directory",
+        help="Directory of {prefix}.sgrna_results.tsv / {prefix}.gene_results.tsv (or MAGeCK summary) pairs",
+        required=True,
+    )
+    parser_index.add_argument(
+        "-o",
+        "--output",
+        help="Output directory of the index (default = 'gene_index')",
+        required=False,
+        default="gene_index",
+    )
+    parser_index.add_argument(
+        "--sgrna_threshold",
+        type=float,
+        help="FDR threshold of the sgRNAs counted as significant (default = 0.1)",
+        required=False,
+        default=0.1,
+    )
+    parser_index.add_argument(
+        "--threads",
+        type=int,
+        help="Number of screens to read concurrently (default = one per core)",
+        required=False,
+    )
+
+
+def lookup_parser(subparser):
+    # create the parser for the "lookup" command
+    parser_lookup = subparser.add_parser(
+        "lookup",
+        help="Show the results of genes across every screen of a gene lookup index",
+    )
+    parser_lookup.add_argument("genes", nargs="+", help="Gene names to look up")
+    parser_lookup.add_argument(
+        "-x",
+        "--index",
+        help="Directory of the index built with `screenviz index` (default = 'gene_index')",
+        required=False,
+        default="gene_index",
+    )
+    parser_lookup.add_argument(
+        "-o",
+        "--output",
+        help="Output tsv file (default = stdout)",
+        required=False,
+    )
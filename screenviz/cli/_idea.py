@@ -1,3 +1,6 @@
+from ..formats import format_names
+
+
 def idea_parser(subparser):
     # create the parser for the "geneviz" command
     parser_idea = subparser.add_parser(
@@ -8,16 +11,17 @@ def idea_parser(subparser):
     parser_idea.add_argument(
         "-o",
         "--output",
-        help="Output file (default = '<prefix>.<geneset>.html')",
+        help="Output prefix (default = 'network'), writes '<prefix>.<geneset>[.<side>].html' and '<prefix>.summary.tsv'",
         required=False,
         default="network",
     )
     parser_idea.add_argument(
         "-s",
         "--geneset",
-        help="Gene set to perform enrichment against (BP, MF, CC, or any name in Enrichr)",
+        nargs="+",
+        help="Gene set(s) to perform enrichment against (BP, MF, CC, any name in Enrichr, or the path of a local GMT file)",
         required=False,
-        default="BP",
+        default=["BP"],
     )
     parser_idea.add_argument(
         "-g",
@@ -66,7 +70,9 @@ def idea_parser(subparser):
     parser_idea.add_argument(
         "--sided",
         type=str,
-        help="One-sided enrichment, choose either 'up' or 'down'",
+        nargs="+",
+        choices=["up", "down", "both"],
+        help="Direction(s) of the enrichment, any of 'up', 'down' or 'both' (default = 'both')",
         required=False,
     )
     parser_idea.add_argument(
@@ -101,3 +107,21 @@ def idea_parser(subparser):
         help="Color palette for down-regulated genes",
         required=False,
     )
+    parser_idea.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory to cache parsed GMT libraries in (default = '~/.cache/screenviz')",
+        required=False,
+    )
+    parser_idea.add_argument(
+        "--threads",
+        type=int,
+        help="Number of genesets to run concurrently (default = one per geneset)",
+        required=False,
+    )
+    parser_idea.add_argument(
+        "--input_format",
+        help="Format of the input file (default = detected from the header when the column arguments do not match it)",
+        required=False,
+        choices=format_names(),
+    )
@@ -0,0 +1,15 @@
+def add_launch_arguments(parser):
+    parser.add_argument(
+        "--no-reuse",
+        help="Start a new dashboard even if one is already running for the same inputs",
+        required=False,
+        action="store_true",
+    )
+
+
+def dashboards_parser(subparser):
+    # create the parser for the "dashboards" command
+    subparser.add_parser(
+        "dashboards",
+        help="List the dashboards running for the current user (pid, kind, url and inputs)",
+    )
@@ -0,0 +1,52 @@
+def metrics_parser(subparser):
+    # create the parser for the "metrics" command
+    parser_metrics = subparser.add_parser(
+        "metrics",
+        help="Compute library QC metrics (Gini index, dropout, skew) of count matrices without a dashboard",
+    )
+    parser_metrics.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        help="Input count matrices (output of sgcount)",
+        required=True,
+    )
+    parser_metrics.add_argument(
+        "-o",
+        "--output",
+        help="Output tsv file (default = stdout)",
+        required=False,
+    )
+    parser_metrics.add_argument(
+        "-s",
+        "--guide_column",
+        help="Column name of sgRNA names (default = 'Guide')",
+        required=False,
+        default="Guide",
+    )
+    parser_metrics.add_argument(
+        "-g",
+        "--gene_column",
+        help="Column name of gene names (default = 'Gene')",
+        required=False,
+        default="Gene",
+    )
+    parser_metrics.add_argument(
+        "--chunksize",
+        type=int,
+        help="Number of guides read at a time (default = 500000)",
+        required=False,
+        default=500_000,
+    )
+    parser_metrics.add_argument(
+        "--threads",
+        type=int,
+        help="Number of count matrices processed in parallel (default = one per core)",
+        required=False,
+    )
+    parser_metrics.add_argument(
+        "--histograms",
+        type=str,
+        help="Also write the log10 count histograms of every sample to this file (default = None)",
+        required=False,
+    )
@@ -0,0 +1,27 @@
+def add_output_arguments(parser):
+    parser.add_argument(
+        "--format",
+        help="Output format, images replace an '.html' extension of the output (default = 'html')",
+        required=False,
+        choices=["html", "png", "svg", "pdf"],
+        default="html",
+    )
+    parser.add_argument(
+        "--no_rasterize",
+        help="Keep dense point clouds as vector paths in svg/pdf outputs",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--plotlyjs",
+        help="How to include plotly.js: inline in every file, from the CDN, or a single plotly.min.js shared by the output directory (default = 'embed')",
+        required=False,
+        choices=["embed", "cdn", "directory"],
+        default="embed",
+    )
+    parser.add_argument(
+        "--precision",
+        type=int,
+        help="Round plotted values to this many significant digits and store them as float32 (default = full precision)",
+        required=False,
+    )
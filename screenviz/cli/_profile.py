@@ -0,0 +1,19 @@
+def add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        help="Record per-callback timings and serve them on /_screenviz/metrics",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="Directory to dump a profiler report for every callback call (requires --profile)",
+        required=False,
+    )
+    parser.add_argument(
+        "--profile-backend",
+        help="Profiler used for the per-callback reports (default = 'cprofile')",
+        required=False,
+        choices=["cprofile", "pyinstrument"],
+        default="cprofile",
+    )
@@ -1,3 +1,7 @@
+from ._launch import add_launch_arguments
+from ._profile import add_profile_arguments
+
+
 def quality_control_parser(subparser):
     parser_quality_control = subparser.add_parser(
         "qc",
@@ -12,7 +16,8 @@ def quality_control_parser(subparser):
     parser_quality_control.add_argument(
         "-p",
         "--port",
-        help="Port number to run the visualization on (default = 8050)",
+        help="Port number to run the visualization on, the next free one is used if taken (default = 8050)",
+        type=int,
         required=False,
         default=8050,
     )
@@ -30,3 +35,28 @@ def quality_control_parser(subparser):
         required=False,
         default="Gene",
     )
+    parser_quality_control.add_argument(
+        "--full-precision",
+        help="Keep float64/int64 columns and object strings instead of compact dtypes (p-values, FDRs and scores are always float64, other floats such as fold changes are float32 by default)",
+        required=False,
+        action="store_true",
+    )
+    parser_quality_control.add_argument(
+        "--watch",
+        help="Reload the input file(s) in the background when they change and refresh connected pages",
+        required=False,
+        action="store_true",
+    )
+    parser_quality_control.add_argument(
+        "--store",
+        help="Convert the counts once into a memory-mapped store and serve the dashboard from it",
+        required=False,
+        action="store_true",
+    )
+    parser_quality_control.add_argument(
+        "--store-dir",
+        help="Directory of the memory-mapped store, implies --store (default = '{input}.store')",
+        required=False,
+    )
+    add_profile_arguments(parser_quality_control)
+    add_launch_arguments(parser_quality_control)
@@ -0,0 +1,15 @@
+def report_parser(subparser):
+    # create the parser for the "report" command
+    parser_report = subparser.add_parser(
+        "report",
+        help="Render every output listed in a YAML report spec from a single load of the inputs",
+    )
+    parser_report.add_argument(
+        "-c", "--config", help="YAML spec of the report outputs", required=True
+    )
+    parser_report.add_argument(
+        "--threads",
+        type=int,
+        help="Number of outputs to render concurrently (default = the spec's `threads` or one per core)",
+        required=False,
+    )
@@ -1,3 +1,7 @@
+from ._launch import add_launch_arguments
+from ._profile import add_profile_arguments
+
+
 def results_parser(subparser):
     parser_results = subparser.add_parser(
         "results", help="Visualize CRISPR screen results interactively"
@@ -11,9 +15,38 @@ def results_parser(subparser):
     parser_results.add_argument(
         "-n",
         "--prefix",
-        help="Prefix for the input files. Will match {prefix}.sgrna_results.tsv and {prefix}.gene_results.tsv",
+        help="Prefix for the input files. Will match {prefix}.sgrna_results.tsv and {prefix}.gene_results.tsv (or MAGeCK's {prefix}.sgrna_summary.txt and {prefix}.gene_summary.txt)",
         required=False,
     )
+    parser_results.add_argument(
+        "-d",
+        "--dir",
+        help="Browse every {prefix}.sgrna_results.tsv / {prefix}.gene_results.tsv (or MAGeCK summary) pair found in a directory",
+        required=False,
+    )
+    parser_results.add_argument(
+        "--memory-budget",
+        help="Memory budget (MB) of the screens kept loaded with --dir, the least recently viewed are evicted first (default = 2048)",
+        type=float,
+        default=2048,
+    )
+    parser_results.add_argument(
+        "--gene-index",
+        help="Add a gene lookup tab backed by an index built with `screenviz index`",
+        required=False,
+    )
+    parser_results.add_argument(
+        "-c",
+        "--counts",
+        help="Count matrix (sgcount output) whose counts are shown in the gene drill-down",
+        required=False,
+    )
+    parser_results.add_argument(
+        "--guide-column",
+        help="Column name of sgRNA names in the count matrix (default = 'Guide')",
+        required=False,
+        default="Guide",
+    )
     parser_results.add_argument(
         "--ntc-token",
         help="Token to identify negative controls in the sgRNA file",
@@ -29,7 +62,21 @@ def results_parser(subparser):
     parser_results.add_argument(
         "-p",
         "--port",
-        help="Port number to run the visualization on (default = 8050)",
+        help="Port number to run the visualization on, the next free one is used if taken (default = 8050)",
         type=int,
         default=8050,
     )
+    parser_results.add_argument(
+        "--full-precision",
+        help="Keep float64/int64 columns and object strings instead of compact dtypes (p-values, FDRs and scores are always float64, other floats such as fold changes are float32 by default)",
+        required=False,
+        action="store_true",
+    )
+    parser_results.add_argument(
+        "--watch",
+        help="Reload the input file(s) in the background when they change and refresh connected pages",
+        required=False,
+        action="store_true",
+    )
+    add_profile_arguments(parser_results)
+    add_launch_arguments(parser_results)
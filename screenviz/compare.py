@@ -1,11 +1,16 @@
 # screenviz.compare
 
 import sys
+from typing import Optional, Tuple
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.io as pio
 
+from ._dtypes import read_table
+from ._output import output_path, write_figure
+from .formats import read_results, resolve_format, screenviz_column
+
 pio.templates.default = "plotly_white"
 
 
@@ -34,33 +39,100 @@ class CompareScreens:
         threshold: float = 0.1,
         log_transform_a: bool = True,
         log_transform_b: bool = True,
+        full_precision: bool = False,
+        dataframe_a: Optional[pd.DataFrame] = None,
+        dataframe_b: Optional[pd.DataFrame] = None,
+        format_a: Optional[str] = None,
+        format_b: Optional[str] = None,
     ):
+        self.full_precision = full_precision
         self.filename_a = filename_a
         self.filename_b = filename_b
-        self.merge_column_a = merge_column_a
-        self.merge_column_b = merge_column_b
-        self.variable_column_a = variable_column_a
-        self.variable_column_b = variable_column_b
-        self.threshold_column_a = threshold_column_a
-        self.threshold_column_b = threshold_column_b
         self.threshold = threshold
         self.log_transform_a = log_transform_a
         self.log_transform_b = log_transform_b
 
+        # Native tool outputs (or forced formats) are mapped to the screenviz columns
+        (
+            self.format_a,
+            self.merge_column_a,
+            self.variable_column_a,
+            self.threshold_column_a,
+        ) = self.resolve_format(
+            filename_a,
+            merge_column_a,
+            variable_column_a,
+            threshold_column_a,
+            format_a,
+            dataframe_a,
+        )
+        (
+            self.format_b,
+            self.merge_column_b,
+            self.variable_column_b,
+            self.threshold_column_b,
+        ) = self.resolve_format(
+            filename_b,
+            merge_column_b,
+            variable_column_b,
+            threshold_column_b,
+            format_b,
+            dataframe_b,
+        )
+
         self.df_a = self.load_dataframe(
-            filename_a, merge_column_a, variable_column_a, threshold_column_a, "a"
+            filename_a,
+            self.merge_column_a,
+            self.variable_column_a,
+            self.threshold_column_a,
+            "a",
+            dataframe_a,
+            self.format_a,
         )
         self.df_b = self.load_dataframe(
-            filename_b, merge_column_b, variable_column_b, threshold_column_b, "b"
+            filename_b,
+            self.merge_column_b,
+            self.variable_column_b,
+            self.threshold_column_b,
+            "b",
+            dataframe_b,
+            self.format_b,
         )
         self.df = pd.merge(
             self.df_a,
             self.df_b,
-            left_on=f"{merge_column_a}_a",
-            right_on=f"{merge_column_b}_b",
+            left_on=f"{self.merge_column_a}_a",
+            right_on=f"{self.merge_column_b}_b",
         )
         self.df = self.classify_dataframe(self.df)
 
+    def resolve_format(
+        self,
+        filename: str,
+        merge_column: str,
+        variable_column: str,
+        threshold_column: str,
+        format: Optional[str] = None,
+        dataframe: Optional[pd.DataFrame] = None,
+    ) -> Tuple[Optional[str], str, str, str]:
+        """
+        The format of a screen's gene results and its (merge, variable, threshold) columns.
+
+        Without the given columns in its header the file is read through its
+        format, with the variable and threshold columns kept if they are
+        screenviz ones and switched to the p-value and FDR otherwise.
+        """
+        if dataframe is not None:
+            return None, merge_column, variable_column, threshold_column
+        columns = [merge_column, variable_column, threshold_column]
+        result_format = resolve_format(filename, "gene", columns, format)
+        if result_format is None:
+            return None, merge_column, variable_column, threshold_column
+        variable_column = screenviz_column(variable_column, "gene", "pvalue")
+        threshold_column = screenviz_column(threshold_column, "gene", "fdr")
+        result_format.check_reported([variable_column, threshold_column])
+        return result_format.name, "gene", variable_column, threshold_column
+
     def load_dataframe(
         self,
         filename: str,
@@ -68,8 +140,27 @@ class CompareScreens:
         variable_column: str,
         threshold_column: str,
         suffix: str,
+        dataframe: Optional[pd.DataFrame] = None,
+        format: Optional[str] = None,
     ) -> pd.DataFrame:
-        dataframe = pd.read_csv(filename, sep="\t")
+        if dataframe is None and format is not None:
+            dataframe = read_results(
+                filename,
+                "gene",
+                format=format,
+                columns=list(
+                    dict.fromkeys([merge_column, variable_column, threshold_column])
+                ),
+                full_precision=self.full_precision,
+            )
+            dataframe[merge_column] = dataframe[merge_column].astype(str)
+        elif dataframe is None:
+            dataframe = read_table(
+                filename,
+                string_columns=[merge_column],
+                full_precision=self.full_precision,
+                precise_columns=[variable_column, threshold_column],
+            )
         assert (
             merge_column in dataframe.columns
         ), f"Column {merge_column} not found in {filename}"
@@ -103,7 +194,14 @@ class CompareScreens:
         )
         return df
 
-    def plot_volcano(self, output: str = "comparison.html"):
+    def plot_volcano(
+        self,
+        output: str = "comparison.html",
+        plotlyjs: str = "embed",
+        precision: Optional[int] = None,
+        format: str = "html",
+        rasterize: bool = True,
+    ):
         variable_name_x = f"{self.variable_column_a}_a"
         variable_name_y = f"{self.variable_column_b}_b"
 
@@ -145,5 +243,13 @@ class CompareScreens:
             title="Comparison of two screen results",
         )
 
+        output = output_path(output, format)
         print(f"Saving comparison plot to: {output}", file=sys.stderr)
-        fig.write_html(output)
+        write_figure(
+            fig,
+            output,
+            plotlyjs=plotlyjs,
+            precision=precision,
+            format=format,
+            rasterize=rasterize,
+        )
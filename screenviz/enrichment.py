@@ -0,0 +1,254 @@
+# screenviz.enrichment
+
+import gzip
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+
+CACHE_DIR = os.environ.get(
+    "SCREENVIZ_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "screenviz")
+)
+CACHE_VERSION = 1
+
+
+class GeneSetLibrary:
+    """
+    A gene-set library held as a sparse (gene x term) incidence matrix.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        genes: np.ndarray,
+        terms: np.ndarray,
+        incidence: sparse.csc_matrix,
+    ):
+        self.name = name
+        self.genes = genes
+        self.terms = terms
+        self.incidence = incidence.tocsc()
+        self.gene_index = {gene: i for i, gene in enumerate(genes)}
+
+    def __len__(self):
+        return self.terms.size
+
+    @classmethod
+    def from_gmt(cls, filename: str, name: Optional[str] = None) -> "GeneSetLibrary":
+        """
+        Parse a (optionally gzipped) GMT file (term, description, gene, ...) into a library.
+        """
+        opener = gzip.open if filename.endswith(".gz") else open
+        gene_index = {}
+        terms = []
+        rows = []
+        cols = []
+        with opener(filename, "rt") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 3:
+                    continue
+                term = len(terms)
+                terms.append(fields[0])
+                # Enrichr-style GMTs may attach weights as `GENE,1.0`
+                members = {gene.split(",")[0] for gene in fields[2:] if gene}
+                for gene in members:
+                    rows.append(gene_index.setdefault(gene, len(gene_index)))
+                    cols.append(term)
+
+        genes = np.array(list(gene_index), dtype=str)
+        incidence = sparse.csc_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(genes), len(terms)),
+        )
+        return cls(name or library_name(filename), genes, np.array(terms), incidence)
+
+    @classmethod
+    def from_cache(cls, filename: str, name: str) -> "GeneSetLibrary":
+        with np.load(filename, allow_pickle=False) as data:
+            incidence = sparse.csc_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=tuple(data["shape"]),
+            )
+            return cls(name, data["genes"], data["terms"], incidence)
+
+    def to_cache(self, filename: str):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp = f"{filename}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            data=self.incidence.data,
+            indices=self.incidence.indices,
+            indptr=self.incidence.indptr,
+            shape=np.array(self.incidence.shape),
+            genes=self.genes,
+            terms=self.terms,
+        )
+        os.replace(tmp, filename)
+
+    def mask(self, genes: Iterable[str]) -> np.ndarray:
+        """
+        Boolean mask over the library genes for the provided gene names.
+        """
+        mask = np.zeros(self.genes.size, dtype=bool)
+        index = [self.gene_index[g] for g in genes if g in self.gene_index]
+        mask[index] = True
+        return mask
+
+    def term_genes(self, term: int, mask: np.ndarray) -> List[str]:
+        """
+        Genes of a term that fall within a mask.
+        """
+        start, stop = self.incidence.indptr[term], self.incidence.indptr[term + 1]
+        members = self.incidence.indices[start:stop]
+        return self.genes[members[mask[members]]].tolist()
+
+
+def library_name(filename: str) -> str:
+    """
+    Name a library after its file (`libs/GO_BP_2023.gmt` -> `GO_BP_2023`).
+    """
+    name = os.path.basename(filename)
+    for ext in [".gz", ".gmt", ".txt"]:
+        if name.endswith(ext):
+            name = name[: -len(ext)]
+    return name
+
+
+def is_local_library(geneset: str) -> bool:
+    """
+    Whether a geneset argument refers to a GMT file on disk rather than an Enrichr library.
+    """
+    return os.path.isfile(geneset)
+
+
+def _cache_path(filename: str, cache_dir: str) -> str:
+    stat = os.stat(filename)
+    key = (
+        f"{CACHE_VERSION}:{os.path.abspath(filename)}:{stat.st_mtime_ns}:{stat.st_size}"
+    )
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, "genesets", f"{library_name(filename)}.{digest}.npz")
+
+
+def load_library(filename: str, cache_dir: Optional[str] = CACHE_DIR) -> GeneSetLibrary:
+    """
+    Load a GMT library, reusing the binary cache of a previous parse when available.
+
+    The cache is keyed by the file path, modification time and size so edited
+    libraries are re-parsed. Pass `cache_dir=None` to disable caching.
+    """
+    name = library_name(filename)
+    if cache_dir is None:
+        return GeneSetLibrary.from_gmt(filename, name)
+
+    cache = _cache_path(filename, cache_dir)
+    if os.path.exists(cache):
+        return GeneSetLibrary.from_cache(cache, name)
+
+    library = GeneSetLibrary.from_gmt(filename, name)
+    try:
+        library.to_cache(cache)
+    except OSError:
+        pass
+    return library
+
+
+def enrich(
+    library: GeneSetLibrary,
+    queries: Dict[str, Iterable[str]],
+    background: Optional[Iterable[str]] = None,
+    threshold: Optional[float] = 0.05,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Hypergeometric over-representation of every term for several query gene sets.
+
+    All queries are scored with a single sparse product against the incidence
+    matrix, p-values come from a vectorized hypergeometric survival function and
+    are BH-corrected per query over all terms with members in the universe.
+
+    The universe is the background (if provided) intersected with the library genes.
+    Terms with an adjusted p-value above `threshold` are dropped (`None` keeps all).
+    """
+    universe = (
+        library.mask(background)
+        if background is not None
+        else np.ones(library.genes.size, dtype=bool)
+    )
+    names = list(queries)
+    query_masks = np.column_stack(
+        [universe] + [library.mask(queries[name]) & universe for name in names]
+    )
+
+    # (terms x [universe, query_1, ..., query_n]) overlap counts
+    counts = np.asarray(library.incidence.T @ query_masks.astype(np.int32))
+    term_size = counts[:, 0]
+    n_universe = universe.sum()
+    testable = term_size > 0
+
+    results = {}
+    for i, name in enumerate(names):
+        overlap = counts[:, i + 1]
+        n_query = query_masks[:, i + 1].sum()
+        pvalue = np.ones(len(library))
+        pvalue[testable] = stats.hypergeom.sf(
+            overlap[testable] - 1, n_universe, term_size[testable], n_query
+        )
+        adj_pvalue = np.ones(len(library))
+        if testable.any():
+            adj_pvalue[testable] = stats.false_discovery_control(pvalue[testable])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            odds_ratio = (overlap * (n_universe - term_size - n_query + overlap)) / (
+                (term_size - overlap) * (n_query - overlap)
+            )
+
+        keep = testable & (overlap > 0)
+        if threshold is not None:
+            keep &= adj_pvalue < threshold
+        keep = np.flatnonzero(keep)
+        keep = keep[np.argsort(pvalue[keep], kind="stable")]
+
+        query_mask = query_masks[:, i + 1]
+        results[name] = pd.DataFrame(
+            {
+                "rank": np.arange(1, keep.size + 1),
+                "library": library.name,
+                "term_name": library.terms[keep],
+                "pvalue": pvalue[keep],
+                "adj_pvalue": adj_pvalue[keep],
+                "odds_ratio": odds_ratio[keep],
+                "overlap": overlap[keep],
+                "term_size": term_size[keep],
+                "overlapping_genes": [
+                    library.term_genes(term, query_mask) for term in keep
+                ],
+            }
+        )
+    return results
+
+
+def run_enrichment(
+    genes: Iterable[str],
+    libraries: List[GeneSetLibrary],
+    background: Optional[Iterable[str]] = None,
+    threshold: Optional[float] = 0.05,
+) -> pd.DataFrame:
+    """
+    Over-representation of a gene set against several libraries, concatenated by library.
+
+    Mirrors the output of `idea.run_gsea` (`term_name`, `adj_pvalue`,
+    `overlapping_genes`) so it can be passed to `IDEA` directly.
+    """
+    genes = list(genes)
+    background = list(background) if background is not None else None
+    frames = [
+        enrich(library, {"query": genes}, background, threshold)["query"]
+        for library in libraries
+    ]
+    return pd.concat(frames, ignore_index=True).sort_values(
+        "pvalue", kind="stable", ignore_index=True
+    )
@@ -0,0 +1,321 @@
+# screenviz.formats
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ._dtypes import read_table
+
+# Columns of the results tables, as written by crispr_screen
+GENE_COLUMNS = ["gene", "log2fc", "pvalue", "fdr"]
+SGRNA_COLUMNS = ["sgrna", "gene", "log2fc", "pvalue_twosided", "fdr", "base"]
+LEVEL_COLUMNS = {"gene": GENE_COLUMNS, "sgrna": SGRNA_COLUMNS}
+
+# Columns compared against thresholds, read in full precision
+STATISTIC_COLUMNS = ["pvalue", "pvalue_twosided", "fdr"]
+
+# A derived column: the source columns it is computed from and the (vectorized) function
+Derived = Tuple[Sequence[str], Callable[..., np.ndarray]]
+
+
+def read_header(filename: str) -> List[str]:
+    """
+    The column names of a tab-separated table (only its header line is parsed).
+    """
+    return pd.read_csv(filename, sep="\t", nrows=0).columns.tolist()
+
+
+def two_sided_pvalue(pvalue_low: np.ndarray, pvalue_high: np.ndarray) -> np.ndarray:
+    return np.minimum(2.0 * np.minimum(pvalue_low, pvalue_high), 1.0)
+
+
+def directional(
+    lfc: np.ndarray, negative: np.ndarray, positive: np.ndarray
+) -> np.ndarray:
+    """
+    The statistic of the depletion test for depleted genes and of the enrichment test otherwise.
+    """
+    return np.where(lfc < 0, negative, positive)
+
+
+def mean(*values: np.ndarray) -> np.ndarray:
+    return np.mean(values, axis=0)
+
+
+class ResultFormat:
+    """
+    The layout of a tool's gene or sgRNA results relative to the screenviz columns.
+
+    `columns` maps every screenviz column to the column of the tool holding
+    it (renamed on load, without a copy) and `derived` lists the screenviz
+    columns computed on load from its columns. The `unreported` columns have
+    no equivalent in the tool's output and are filled with NaN on load. A
+    table is of this format when its header holds every source column.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        level: str,
+        columns: Dict[str, str],
+        derived: Optional[Dict[str, Derived]] = None,
+        unreported: Sequence[str] = (),
+        description: str = "",
+    ):
+        assert level in LEVEL_COLUMNS, f"Level must be one of {list(LEVEL_COLUMNS)}"
+        self.name = name
+        self.level = level
+        self.columns = columns
+        self.derived = derived or {}
+        self.unreported = list(unreported)
+        self.description = description
+        missing = [
+            col
+            for col in LEVEL_COLUMNS[level]
+            if col not in self.columns
+            and col not in self.derived
+            and col not in self.unreported
+        ]
+        assert not missing, f"Format {name} does not provide the columns {missing}"
+
+    def check_reported(self, columns: Sequence[str]):
+        """
+        Check that the tool reports the given screenviz columns.
+        """
+        unreported = [col for col in columns if col in self.unreported]
+        assert not unreported, (
+            f"The {self.name} {self.level} results report no {', '.join(unreported)}"
+        )
+
+    def source_columns(self, columns: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        The columns of the tool needed for some (by default all) of the screenviz columns.
+        """
+        sources = []
+        for col in columns or LEVEL_COLUMNS[self.level]:
+            if col in self.columns:
+                needed = [self.columns[col]]
+            elif col in self.derived:
+                needed = list(self.derived[col][0])
+            else:
+                needed = []
+            sources += [s for s in needed if s not in sources]
+        return sources
+
+    def matches(self, header: Sequence[str]) -> bool:
+        return all(col in header for col in self.source_columns())
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add the derived and unreported columns and rename the mapped ones (the data is not copied).
+        """
+        derived = {
+            col: func(*[df[s].to_numpy() for s in sources])
+            for col, (sources, func) in self.derived.items()
+            if all(s in df.columns for s in sources)
+        }
+        renames = {
+            source: col
+            for col, source in self.columns.items()
+            if source != col and source in df.columns
+        }
+        # Unmapped columns sharing a screenviz name are shadowed by the mapped ones
+        clashes = [c for c in renames.values() if c in df.columns and c not in renames]
+        df = df.drop(columns=clashes).rename(columns=renames)
+        for col, values in derived.items():
+            df[col] = values
+        for col in self.unreported:
+            df[col] = np.nan
+        return df
+
+
+FORMATS: List[ResultFormat] = []
+
+
+def register_format(result_format: ResultFormat):
+    """
+    Make a format detectable (formats registered first are tried first).
+    """
+    for known in FORMATS:
+        assert (known.name, known.level) != (
+            result_format.name,
+            result_format.level,
+        ), f"Duplicate {result_format.level} format: {result_format.name}"
+    FORMATS.append(result_format)
+
+
+def format_names() -> List[str]:
+    names = []
+    for result_format in FORMATS:
+        if result_format.name not in names:
+            names.append(result_format.name)
+    return names
+
+
+def get_format(name: str, level: str) -> ResultFormat:
+    for result_format in FORMATS:
+        if result_format.name == name and result_format.level == level:
+            return result_format
+    raise ValueError(
+        f"Unknown {level} results format: {name} (known: {', '.join(format_names())})"
+    )
+
+
+def sniff_format(header: Sequence[str], level: str) -> Optional[ResultFormat]:
+    """
+    The first registered format of a level matching a header, if any.
+    """
+    for result_format in FORMATS:
+        if result_format.level == level and result_format.matches(header):
+            return result_format
+    return None
+
+
+def detect_format(
+    filename: str, level: str, name: Optional[str] = None
+) -> ResultFormat:
+    """
+    The format of a results file, `name` if given, otherwise sniffed from its header.
+    """
+    if name is not None:
+        return get_format(name, level)
+    result_format = sniff_format(read_header(filename), level)
+    assert result_format is not None, (
+        f"Unrecognized {level} results format in {filename}, "
+        f"expected the output of one of: {', '.join(format_names())}"
+    )
+    return result_format
+
+
+def resolve_format(
+    filename: str, level: str, columns: Sequence[str], name: Optional[str] = None
+) -> Optional[ResultFormat]:
+    """
+    The format to read a file with when plotting the given columns.
+
+    `name` if given, otherwise none when the header already holds the
+    columns (they are used as they are) and the sniffed format if not.
+    """
+    if name is not None:
+        return get_format(name, level)
+    header = read_header(filename)
+    if all(col in header for col in columns):
+        return None
+    return sniff_format(header, level)
+
+
+def screenviz_column(column: str, level: str, default: str) -> str:
+    """
+    The column to use once a table is read through a format: `column` if it is a screenviz one, `default` otherwise.
+    """
+    return column if column in LEVEL_COLUMNS[level] else default
+
+
+def read_results(
+    filename: str,
+    level: str,
+    format: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    full_precision: bool = False,
+) -> pd.DataFrame:
+    """
+    Read a gene or sgRNA results table of any registered format with the screenviz columns.
+
+    With `columns` only the tool columns needed for them are parsed and
+    returned, otherwise every column of the table is kept.
+    """
+    result_format = detect_format(filename, level, format)
+    source = result_format.columns
+    usecols = None
+    if columns is not None:
+        usecols = result_format.source_columns(columns)
+    statistics = [c for c in STATISTIC_COLUMNS if c in LEVEL_COLUMNS[level]]
+    df = read_table(
+        filename,
+        categorical_columns=[source["gene"]] if "gene" in source else [],
+        string_columns=[source["sgrna"]] if "sgrna" in source else [],
+        full_precision=full_precision,
+        precise_columns=result_format.source_columns(statistics),
+        usecols=usecols,
+    )
+    df = result_format.apply(df)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+register_format(
+    ResultFormat(
+        "crispr_screen",
+        "gene",
+        {col: col for col in GENE_COLUMNS},
+        description="crispr_screen *.gene_results.tsv",
+    )
+)
+register_format(
+    ResultFormat(
+        "crispr_screen",
+        "sgrna",
+        {col: col for col in SGRNA_COLUMNS},
+        description="crispr_screen *.sgrna_results.tsv",
+    )
+)
+register_format(
+    ResultFormat(
+        "crispr_screen-onesided",
+        "sgrna",
+        {col: col for col in SGRNA_COLUMNS if col != "pvalue_twosided"},
+        derived={
+            "pvalue_twosided": (["pvalue_low", "pvalue_high"], two_sided_pvalue),
+        },
+        description="crispr_screen sgRNA results with one-sided p-values only",
+    )
+)
+register_format(
+    ResultFormat(
+        "mageck",
+        "gene",
+        {"gene": "id", "log2fc": "neg|lfc"},
+        derived={
+            "pvalue": (["neg|lfc", "neg|p-value", "pos|p-value"], directional),
+            "fdr": (["neg|lfc", "neg|fdr", "pos|fdr"], directional),
+        },
+        description="MAGeCK test *.gene_summary.txt",
+    )
+)
+register_format(
+    ResultFormat(
+        "mageck",
+        "sgrna",
+        {
+            "sgrna": "sgrna",
+            "gene": "Gene",
+            "log2fc": "LFC",
+            "pvalue_twosided": "p.twosided",
+            "fdr": "FDR",
+        },
+        derived={"base": (["control_mean", "treat_mean"], mean)},
+        description="MAGeCK test *.sgrna_summary.txt",
+    )
+)
+# BAGEL and CRISPhieRmix report no fold changes nor p-values: their gene score is
+# the effect axis (log2fc) and the FDR the significance axis
+register_format(
+    ResultFormat(
+        "bagel",
+        "gene",
+        {"gene": "Gene", "log2fc": "BF", "fdr": "FDR"},
+        unreported=["pvalue"],
+        description="BAGEL precision-recall output (Gene, BF, Recall, Precision, FDR)",
+    )
+)
+register_format(
+    ResultFormat(
+        "crisphiermix",
+        "gene",
+        {"gene": "gene", "log2fc": "score", "fdr": "FDR"},
+        unreported=["pvalue"],
+        description="CRISPhieRmix gene table (gene, score, locfdr, FDR)",
+    )
+)
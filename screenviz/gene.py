@@ -8,6 +8,10 @@ import yaml
 import plotly.express as px
 import plotly.io as pio
 
+from ._dtypes import read_table
+from ._output import output_path, write_figure
+from .formats import read_results, resolve_format, screenviz_column
+
 pio.templates.default = "plotly_white"
 
 
@@ -58,9 +62,14 @@ class VisualizeGenes:
         threshold_column: Optional[str] = "fdr",
         threshold: Optional[float] = 0.1,
         ntc_token: Optional[str] = None,
+        full_precision: bool = False,
+        dataframe: Optional[pd.DataFrame] = None,
+        format: Optional[str] = None,
     ):
         self.filename = filename
         self.config = config
+        self.full_precision = full_precision
+        self.format = format
 
         if self.config:
             self.load_config(self.config)
@@ -75,7 +84,7 @@ class VisualizeGenes:
             self.ntc_token = ntc_token
             self.method = None
 
-        self.df = self.load_dataframe(filename)
+        self.df = self.load_dataframe(filename, dataframe)
 
     def load_config(self, config: str):
         with open(config, "r") as f:
@@ -107,8 +116,60 @@ class VisualizeGenes:
             else:
                 self.ntc_token = None
 
-    def load_dataframe(self, filename: str) -> pd.DataFrame:
-        df = pd.read_csv(self.filename, sep="\t")
+    def resolve_format(self):
+        """
+        The format of the input file, unless it has the given columns.
+
+        The columns are then switched to the screenviz ones (the p-value and
+        threshold columns are kept if they are screenviz ones, otherwise the
+        p-value and FDR are used), which the tool must report. The columns of
+        a config, written by `screenviz calibrate`, are kept as they are.
+        """
+        columns = [
+            self.gene_column,
+            self.fc_column,
+            self.pval_column,
+            self.threshold_column,
+        ]
+        result_format = resolve_format(self.filename, "gene", columns, self.format)
+        if result_format is not None and not self.config:
+            self.gene_column, self.fc_column = "gene", "log2fc"
+            self.pval_column = screenviz_column(self.pval_column, "gene", "pvalue")
+            self.threshold_column = screenviz_column(
+                self.threshold_column, "gene", "fdr"
+            )
+        if result_format is not None:
+            result_format.check_reported([self.pval_column, self.threshold_column])
+        return result_format
+
+    def load_dataframe(
+        self, filename: str, dataframe: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        if dataframe is not None:
+            # Shallow copy so the derived columns stay local to this plot
+            df = dataframe.copy(deep=False)
+        else:
+            # Native tool outputs (or a forced format) are mapped to the screenviz columns
+            result_format = self.resolve_format()
+            if result_format is not None:
+                df = read_results(
+                    self.filename,
+                    "gene",
+                    format=result_format.name,
+                    full_precision=self.full_precision,
+                )
+                # The phenotype score of a calibrated config is the statistic of its null
+                if self.method == "inc-product" and self.threshold_column not in df:
+                    df[self.threshold_column] = df[self.fc_column] * -np.log10(
+                        df[self.pval_column]
+                    )
+            else:
+                df = read_table(
+                    self.filename,
+                    categorical_columns=[self.gene_column],
+                    full_precision=self.full_precision,
+                    precise_columns=[self.pval_column, self.threshold_column],
+                )
         assert (
             self.gene_column in df.columns
         ), f"The input file must have a column named {self.gene_column}"
@@ -165,8 +226,16 @@ class VisualizeGenes:
             legendgroup="Threshold",
         )
 
-    def plot_volcano(self, output: str = "volcano.html"):
-        self.df[f"log_{self.pval_column}"] = -np.log10(self.df[self.pval_column])
+    def plot_volcano(
+        self,
+        output: str = "volcano.html",
+        plotlyjs: str = "embed",
+        precision: Optional[int] = None,
+        format: str = "html",
+        rasterize: bool = True,
+    ):
+        if f"log_{self.pval_column}" not in self.df.columns:
+            self.df[f"log_{self.pval_column}"] = -np.log10(self.df[self.pval_column])
         self.df["is_significant"] = self.df.apply(
             lambda x: signify(
                 x,
@@ -226,5 +295,13 @@ class VisualizeGenes:
             title="Volcano plot of gene enrichment analysis",
         )
 
+        output = output_path(output, format)
         print(f"Saving volcano plot to: {output}", file=sys.stderr)
-        fig.write_html(output)
+        write_figure(
+            fig,
+            output,
+            plotlyjs=plotlyjs,
+            precision=precision,
+            format=format,
+            rasterize=rasterize,
+        )
@@ -1,14 +1,69 @@
 # screenviz.idea
 
+import os
 import sys
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 import pandas as pd
 from idea import run_gsea, IDEA
 
+from .formats import read_results, resolve_format, screenviz_column
+from .enrichment import (
+    CACHE_DIR,
+    enrich,
+    is_local_library,
+    library_name,
+    load_library,
+)
+
+SIDES = ["both", "up", "down"]
+
+
+def select_side(sig: pd.DataFrame, fc_column: str, side: str) -> pd.DataFrame:
+    """Subset the significant genes to one direction of the fold change."""
+    if side == "up":
+        return sig[sig[fc_column] > 0]
+    elif side == "down":
+        sig = sig[sig[fc_column] < 0].copy()
+        sig[fc_column] = -sig[fc_column]
+        return sig
+    return sig
+
+
+def enrich_geneset(
+    geneset: str,
+    queries: Dict[str, pd.Series],
+    background: pd.Series,
+    term_threshold: float,
+    cache_dir: Optional[str],
+) -> Dict[str, pd.DataFrame]:
+    """Run the enrichment of every side against a single geneset.
+
+    Local GMT libraries score all sides with a single pass over the library,
+    Enrichr libraries are queried once per side.
+    """
+    if is_local_library(geneset):
+        library = load_library(geneset, cache_dir=cache_dir)
+        return enrich(
+            library,
+            {side: genes.values for side, genes in queries.items()},
+            background=background.values,
+            threshold=term_threshold,
+        )
+    return {
+        side: run_gsea(
+            genes=genes.values,
+            library=geneset,
+            background=background.values,
+            threshold=term_threshold,
+        )
+        for side, genes in queries.items()
+    }
+
 
 def RunIDEA(
     filename: str,
-    geneset: str,
+    geneset: Union[str, List[str]],
     output: str,
     gene_column: str,
     fc_column: str,
@@ -16,39 +71,106 @@ def RunIDEA(
     threshold_column: str,
     threshold: float,
     term_threshold: float,
-    sided: Optional[str],
+    sided: Optional[Union[str, List[str]]],
     top: int,
     gene_palette: Optional[str] = None,
     term_palette: Optional[str] = None,
     up_color: Optional[str] = "Reds",
     down_color: Optional[str] = "Blues",
-):
-    """Run IDEA analysis."""
-    frame = pd.read_csv(filename, sep="\t")
+    cache_dir: Optional[str] = CACHE_DIR,
+    threads: Optional[int] = None,
+    dataframe: Optional[pd.DataFrame] = None,
+    format: Optional[str] = None,
+) -> Optional[pd.DataFrame]:
+    """Run IDEA analysis.
+
+    `geneset` is one or more Enrichr library names or paths of local GMT files
+    (computed offline) and `sided` one or more of 'up', 'down' and 'both'.
+
+    The input is loaded and filtered once, the enrichments of all genesets run
+    concurrently and every (geneset, side) pair is written as its own IDEA plot
+    along with a combined `<output>.summary.tsv` of all enriched terms, which
+    is returned (none, with a warning, when no term is enriched). A preloaded `dataframe` is used instead of reading `filename`, and native
+    tool outputs (or a forced `format`) are read with the screenviz columns.
+    """
+    genesets = [geneset] if isinstance(geneset, str) else list(geneset)
+    sides = [sided or "both"] if not isinstance(sided, list) else sided
+    for side in sides:
+        assert side in SIDES, f"Sided must be one of {SIDES}"
+
+    if dataframe is not None:
+        frame = dataframe.copy(deep=False)
+    else:
+        columns = [gene_column, fc_column, pval_column, threshold_column]
+        result_format = resolve_format(filename, "gene", columns, format)
+        if result_format is not None:
+            gene_column, fc_column = "gene", "log2fc"
+            pval_column = screenviz_column(pval_column, "gene", "fdr")
+            threshold_column = screenviz_column(threshold_column, "gene", "fdr")
+            result_format.check_reported([pval_column, threshold_column])
+            frame = read_results(filename, "gene", format=result_format.name)
+            frame[gene_column] = frame[gene_column].astype(str)
+        else:
+            frame = pd.read_csv(filename, sep="\t")
     frame["padj"] = frame[pval_column].values
     frame["gene_column"] = frame[gene_column].values
     sig = frame[frame[threshold_column] < threshold].copy()
-    if sided:
-        if sided == "up":
-            sig = sig[sig[fc_column] > 0]
-            gene_palette = up_color
-        elif sided == "down":
-            sig = sig[sig[fc_column] < 0]
-            sig[fc_column] = -sig[fc_column]
-            gene_palette = down_color
-
-    gsea = run_gsea(
-        genes=sig[gene_column].values,
-        library=geneset,
-        background=frame[gene_column].values,
-    )
-    if gsea.shape[0] == 0:
-        sys.exit(f"No gene sets were enriched for provided geneset: {geneset}")
-    idea = IDEA(
-        sig,
-        gsea.head(top),
-        deg_color_name=fc_column,
-        gene_palette=gene_palette,
-        term_palette=term_palette,
+    degs = {side: select_side(sig, fc_column, side) for side in sides}
+    queries = {side: degs[side][gene_column] for side in sides}
+    palettes = {"both": gene_palette, "up": up_color, "down": down_color}
+
+    with ThreadPoolExecutor(
+        max_workers=threads or min(len(genesets), os.cpu_count())
+    ) as pool:
+        futures = {
+            gs: pool.submit(
+                enrich_geneset,
+                gs,
+                queries,
+                frame[gene_column],
+                term_threshold,
+                cache_dir,
+            )
+            for gs in genesets
+        }
+        results = {gs: future.result() for gs, future in futures.items()}
+
+    summary = []
+    for gs in genesets:
+        name = library_name(gs) if is_local_library(gs) else gs
+        for side in sides:
+            gsea = results[gs][side]
+            if gsea.shape[0] == 0:
+                print(
+                    f"No gene sets were enriched for provided geneset: {name} ({side})",
+                    file=sys.stderr,
+                )
+                continue
+            summary.append(gsea.assign(geneset=name, side=side))
+
+            idea = IDEA(
+                degs[side],
+                gsea.head(top),
+                deg_color_name=fc_column,
+                gene_palette=palettes[side],
+                term_palette=term_palette,
+            )
+            suffix = name if side == "both" else f"{name}.{side}"
+            idea.visualize(f"{output}.{suffix}.html")
+
+    if len(summary) == 0:
+        print(
+            f"Warning: no gene sets were enriched for provided genesets: {genesets}",
+            file=sys.stderr,
+        )
+        return None
+
+    summary = pd.concat(summary, ignore_index=True)
+    summary["overlapping_genes"] = summary["overlapping_genes"].apply(
+        lambda genes: genes if isinstance(genes, str) else ";".join(genes)
     )
-    idea.visualize(f"{output}.{geneset}.html")
+    leading = ["geneset", "side"]
+    summary = summary[leading + [c for c in summary.columns if c not in leading]]
+    print(f"Saving enrichment summary to: {output}.summary.tsv", file=sys.stderr)
+    summary.to_csv(f"{output}.summary.tsv", sep="\t", index=False)
+    return summary
@@ -1,5 +1,10 @@
 # screenviz.qc.__init__
 
+import os
+from typing import Optional
+
+from .._launch import launch_dashboard
+from .._profiling import build_profiler
 from .app import CRISPRQCDashApp
 
 
@@ -8,6 +13,40 @@ def quality_control_app_entry(
     port: int,
     guide_column: str,
     gene_column: str,
+    profile: bool = False,
+    profile_dir: Optional[str] = None,
+    profile_backend: str = "cprofile",
+    full_precision: bool = False,
+    watch: bool = False,
+    store: bool = False,
+    store_dir: Optional[str] = None,
+    reuse: bool = True,
 ):
-    app = CRISPRQCDashApp(filename, guide_column, gene_column)
-    app.run(debug=True, port=port)
+    launch_dashboard(
+        "qc",
+        [filename],
+        dict(
+            guide_column=guide_column,
+            gene_column=gene_column,
+            full_precision=full_precision,
+            store=store,
+            store_dir=os.path.abspath(store_dir) if store_dir else None,
+            watch=watch,
+            profile=profile,
+            profile_dir=os.path.abspath(profile_dir) if profile_dir else None,
+            profile_backend=profile_backend,
+        ),
+        lambda: CRISPRQCDashApp(
+            filename,
+            guide_column,
+            gene_column,
+            profiler=build_profiler(profile, profile_dir, profile_backend),
+            full_precision=full_precision,
+            watch=watch,
+            store=store,
+            store_dir=store_dir,
+        ),
+        port=port,
+        reuse=reuse,
+        watch=watch,
+    )
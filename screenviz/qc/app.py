@@ -1,13 +1,63 @@
 # screenviz.qc.app
 
+from typing import Dict, List, Optional, Tuple
+
 import dash
-from dash import html
+import pandas as pd
+from dash import dcc, html
 
+from .._launch import serve
+from .._profiling import CallbackProfiler
+from .._startup import StartupLoader
+from .._watch import Watcher, should_start_watcher
 from .correlation_matrix_card import CorrelationMatrixCard
 from .histogram_membership_card import HistogramMembershipCard
 from .kde_histogram_card import KDEHistogramCard
+from .metrics import compute_metrics
+from .metrics_card import LibraryMetricsCard
+from .normalization import NORMALIZATION_METHODS, NormalizedCounts
 from .scatter_data_card import ScatterDataCard
-from .utils import calculate_correlation_matrix, load_data
+from .scatter_matrix_card import ScatterMatrixCard, group_replicates
+from .store import open_store
+from .utils import calculate_correlation_matrix, load_data, unchanged_samples
+
+
+class QCState:
+    """
+    The count table of the dashboard and everything derived from it.
+
+    The startup steps fill in the first state as their results come in, a
+    reload builds a complete new one and swaps it in with a single
+    assignment. Callbacks read `app.state` once and then only use that
+    state, so they never mix the tables of two versions of the file.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        df_normal: pd.DataFrame,
+        df_log: pd.DataFrame,
+        sample_columns: List[str],
+        gene_list: List[str],
+        store_summaries: Dict,
+    ):
+        self.df = df
+        self.df_normal = df_normal
+        self.df_log = df_log
+        self.sample_columns = sample_columns
+        self.gene_list = gene_list
+        self.store_summaries = store_summaries
+        self.correlation_matrix: Optional[pd.DataFrame] = None
+        self.total_read_counts: Optional[pd.Series] = None
+        self.normalized_counts: Optional[NormalizedCounts] = None
+        self.library_metrics: Optional[pd.DataFrame] = None
+
+    def get_counts(self, log_transform: bool, normalization: str = "raw"):
+        """
+        The (optionally log10(x+1)) counts of a normalization method shared by all cards.
+        """
+        df_normal, df_log = self.normalized_counts.get(normalization or "raw")
+        return df_log if log_transform else df_normal
 
 
 class CRISPRQCDashApp:
@@ -27,29 +77,287 @@ class CRISPRQCDashApp:
         "margin": "20px 0",
     }
 
-    def __init__(self, filename: str, guide_column: str, gene_column: str):
-        self.app = dash.Dash(__name__)
-        self.df, self.df_normal, self.df_log, self.sample_columns, self.gene_list = (
-            load_data(filename, guide_column, gene_column)
-        )
+    def __init__(
+        self,
+        filename: str,
+        guide_column: str,
+        gene_column: str,
+        profiler: Optional[CallbackProfiler] = None,
+        full_precision: bool = False,
+        watch: bool = False,
+        store: bool = False,
+        store_dir: Optional[str] = None,
+        background: bool = True,
+    ):
+        # Cards are rendered once their data is loaded, after the callbacks are registered
+        self.app = dash.Dash(__name__, suppress_callback_exceptions=True)
+        self.profiler = profiler
+        self.filename = filename
+        self.full_precision = full_precision
         self.guide_column = guide_column
         self.gene_column = gene_column
-        self.correlation_matrix = calculate_correlation_matrix(
-            self.df, self.sample_columns
-        )
-        self.total_read_counts = self.df_normal[self.sample_columns].sum()
+        self.store = store or store_dir is not None
+        self.store_dir = store_dir
+        self.state: Optional[QCState] = None
 
         self.scatter_data_card = ScatterDataCard(self)
+        self.scatter_matrix_card = ScatterMatrixCard(self)
         self.histogram_membership_card = HistogramMembershipCard(self)
         self.correlation_matrix_card = CorrelationMatrixCard(self)
         self.kde_histogram_card = KDEHistogramCard(self)
+        self.library_metrics_card = LibraryMetricsCard(self)
+
+        if self.profiler is not None:
+            self.profiler.instrument(
+                self.app,
+                [
+                    self.scatter_data_card,
+                    self.scatter_matrix_card,
+                    self.histogram_membership_card,
+                    self.correlation_matrix_card,
+                    self.kde_histogram_card,
+                    self.library_metrics_card,
+                ],
+            )
 
-        self.app.layout = self.create_layout()
+        self.startup = self.create_startup()
+        self.watcher = Watcher({filename: self.reload}) if watch else None
+        # Watched dashboards render the layout on every page load to show reloaded data
+        self.app.layout = self.create_layout if watch else self.create_layout()
         self.register_callbacks()
 
+        if not background:
+            self.startup.start()
+            if not self.startup.wait():
+                raise RuntimeError(f"Failed to load {filename}: {self.startup.errors}")
+
+    def create_startup(self) -> StartupLoader:
+        """
+        The loading steps and the cards waiting on them.
+
+        The server starts with skeleton cards: the counts are loaded first,
+        then the summaries, normalized views and library metrics are computed
+        concurrently (the replicate pair histograms after the normalized views) and
+        each card is swapped in as soon as its inputs are ready.
+        """
+        startup = StartupLoader(card_style=self.CARD_STYLE)
+
+        def load_counts():
+            self.state = QCState(*self.load_counts())
+
+        def load_summaries():
+            state = self.state
+            state.correlation_matrix, state.total_read_counts = self.load_summaries(
+                state.df, state.df_normal, state.sample_columns, state.store_summaries
+            )
+
+        def load_normalization():
+            state = self.state
+            state.normalized_counts = self.load_normalization(
+                state.df_normal, state.df_log, state.sample_columns
+            )
+
+        def load_library_metrics():
+            state = self.state
+            state.library_metrics = self.load_library_metrics(
+                state.df_normal, state.sample_columns, state.store_summaries
+            )
+
+        def load_pair_histograms():
+            state = self.state
+            self.load_pair_histograms(state.normalized_counts, state.sample_columns)
+
+        startup.add_step("counts", load_counts)
+        startup.add_step("summaries", load_summaries, ["counts"])
+        startup.add_step("normalization", load_normalization, ["counts"])
+        startup.add_step("library metrics", load_library_metrics, ["counts"])
+        startup.add_step("pair histograms", load_pair_histograms, ["normalization"])
+
+        for section_id, title, card, requires in [
+            (
+                "scatter-and-data",
+                "Scatter Plot and Data Table",
+                self.scatter_data_card,
+                ["counts", "normalization"],
+            ),
+            (
+                "scatter-matrix",
+                "Sample Scatter Matrix",
+                self.scatter_matrix_card,
+                ["summaries", "pair histograms"],
+            ),
+            (
+                "kde-histogram",
+                "sgRNA Count Distribution",
+                self.kde_histogram_card,
+                ["normalization"],
+            ),
+            (
+                "histogram-and-membership",
+                "Gene Membership Distribution and Table",
+                self.histogram_membership_card,
+                ["counts"],
+            ),
+            (
+                "correlation-and-readcounts",
+                "Sample Correlation Matrix and Read Counts",
+                self.correlation_matrix_card,
+                ["summaries", "normalization"],
+            ),
+            (
+                "library-metrics",
+                "Library Metrics",
+                self.library_metrics_card,
+                ["library metrics"],
+            ),
+        ]:
+            startup.add_section(
+                section_id,
+                title,
+                lambda card=card: card.create_card(self.CARD_STYLE),
+                requires,
+            )
+        return startup
+
+    def load(self, previous: Optional[QCState] = None) -> QCState:
+        """
+        Load the count table and the summaries derived from it (all steps in turn).
+
+        The results of a `previous` state are reused for every sample whose
+        counts did not change (all of them if the table is the same).
+        """
+        state = QCState(*self.load_counts())
+        unchanged = []
+        if previous is not None:
+            unchanged = unchanged_samples(
+                previous.df,
+                state.df,
+                state.sample_columns,
+                [self.guide_column, self.gene_column],
+            )
+            if unchanged == previous.sample_columns == state.sample_columns:
+                return previous
+
+        state.correlation_matrix, state.total_read_counts = self.load_summaries(
+            state.df, state.df_normal, state.sample_columns, state.store_summaries
+        )
+        state.normalized_counts = self.load_normalization(
+            state.df_normal, state.df_log, state.sample_columns
+        )
+        self.load_pair_histograms(
+            state.normalized_counts,
+            state.sample_columns,
+            previous.normalized_counts if previous is not None else None,
+            unchanged,
+        )
+        state.library_metrics = self.load_library_metrics(
+            state.df_normal,
+            state.sample_columns,
+            state.store_summaries,
+            previous.library_metrics if previous is not None else None,
+            unchanged,
+        )
+        return state
+
+    def load_counts(
+        self,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, List[str], List[str], Dict]:
+        """
+        Load the count table, its log10(x+1) view, samples, genes and stored summaries.
+
+        With a backing store the frames are views over its memory-mapped
+        matrices and the summaries are read from its sidecar.
+        """
+        if self.store:
+            store = open_store(
+                self.filename,
+                self.guide_column,
+                self.gene_column,
+                full_precision=self.full_precision,
+                store_dir=self.store_dir,
+            )
+            return (*store.frames(), store.summaries())
+        return (
+            *load_data(
+                self.filename, self.guide_column, self.gene_column, self.full_precision
+            ),
+            {},
+        )
+
+    def load_summaries(
+        self,
+        df: pd.DataFrame,
+        df_normal: pd.DataFrame,
+        sample_columns: List[str],
+        store_summaries: Dict,
+    ) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        The (correlation matrix, total read counts) of the samples.
+        """
+        if store_summaries:
+            return (
+                store_summaries["correlation_matrix"],
+                store_summaries["total_read_counts"],
+            )
+        return (
+            calculate_correlation_matrix(df, sample_columns),
+            df_normal[sample_columns].sum(),
+        )
+
+    def load_normalization(
+        self, df_normal: pd.DataFrame, df_log: pd.DataFrame, sample_columns: List[str]
+    ) -> NormalizedCounts:
+        normalized_counts = NormalizedCounts(df_normal, df_log, sample_columns)
+        # Binned once here so the distribution card only redraws on sample changes
+        normalized_counts.histograms("raw")
+        return normalized_counts
+
+    def load_pair_histograms(
+        self,
+        normalized_counts: NormalizedCounts,
+        sample_columns: List[str],
+        previous: Optional[NormalizedCounts] = None,
+        unchanged: Optional[List[str]] = None,
+    ):
+        pair_histograms = normalized_counts.pair_histograms("raw")
+        if previous is not None and unchanged:
+            pair_histograms.reuse(previous.pair_histograms("raw"), unchanged)
+        # Only the replicate pairs are binned here, the others when the matrix is first drawn
+        for samples in group_replicates(sample_columns).values():
+            if 1 < len(samples) < len(sample_columns):
+                pair_histograms.compute(samples)
+
+    def load_library_metrics(
+        self,
+        df_normal: pd.DataFrame,
+        sample_columns: List[str],
+        store_summaries: Dict,
+        previous: Optional[pd.DataFrame] = None,
+        unchanged: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        # Computed when the store was converted, so the columns are not paged in
+        if "library_metrics" in store_summaries:
+            return store_summaries["library_metrics"]
+        if previous is None or not unchanged:
+            return compute_metrics(df_normal, sample_columns, self.gene_column)
+        # The metrics of a sample only depend on its counts (and the shared genes)
+        changed = [s for s in sample_columns if s not in unchanged]
+        frames = [previous[previous["sample"].isin(unchanged)]]
+        if changed:
+            frames.append(compute_metrics(df_normal, changed, self.gene_column))
+        return pd.concat(frames).set_index("sample").loc[sample_columns].reset_index()
+
+    def reload(self):
+        """
+        Reload the count table and rebuild what changed, then swap the new state in.
+        """
+        self.startup.wait()
+        self.state = self.load(self.state)
+
     def create_layout(self):
         return html.Div(
             [
+                self.watcher.create_layout() if self.watcher else html.Div(),
                 html.H1(
                     "CRISPR Screen Quality Control Visualization Suite",
                     style={
@@ -58,43 +366,37 @@ class CRISPRQCDashApp:
                         "marginBottom": "30px",
                     },
                 ),
+                self.startup.create_layout(),
                 self.create_table_of_contents(),
+                self.create_normalization_dropdown(),
                 html.Div(
                     [
-                        html.Div(
-                            id="scatter-and-data",
-                            children=[
-                                self.scatter_data_card.create_card(self.CARD_STYLE)
-                            ],
-                        ),
-                        html.Div(
-                            id="kde-histogram",
-                            children=[
-                                self.kde_histogram_card.create_card(self.CARD_STYLE)
-                            ],
-                        ),
-                        html.Div(
-                            id="histogram-and-membership",
-                            children=[
-                                self.histogram_membership_card.create_card(
-                                    self.CARD_STYLE
-                                )
-                            ],
-                        ),
-                        html.Div(
-                            id="correlation-and-readcounts",
-                            children=[
-                                self.correlation_matrix_card.create_card(
-                                    self.CARD_STYLE
-                                )
-                            ],
-                        ),
+                        self.startup.create_section(section.section_id)
+                        for section in self.startup.sections
                     ]
                 ),
             ],
             style={"fontFamily": "Arial, sans-serif", "padding": "20px"},
         )
 
+    def create_normalization_dropdown(self):
+        return html.Div(
+            [
+                html.Label("Count normalization:"),
+                dcc.Dropdown(
+                    id="normalization-dropdown",
+                    options=[
+                        {"label": label, "value": method}
+                        for method, label in NORMALIZATION_METHODS.items()
+                    ],
+                    value="raw",
+                    clearable=False,
+                    style={"width": "300px"},
+                ),
+            ],
+            style={"marginBottom": "30px"},
+        )
+
     def create_table_of_contents(self):
         return html.Div(
             [
@@ -107,6 +409,12 @@ class CRISPRQCDashApp:
                                 href="#scatter-and-data",
                             )
                         ),
+                        html.Li(
+                            html.A(
+                                "Sample Scatter Matrix",
+                                href="#scatter-matrix",
+                            )
+                        ),
                         html.Li(
                             html.A(
                                 "sgRNA Count Distribution",
@@ -125,6 +433,12 @@ class CRISPRQCDashApp:
                                 href="#correlation-and-readcounts",
                             )
                         ),
+                        html.Li(
+                            html.A(
+                                "Library Metrics",
+                                href="#library-metrics",
+                            )
+                        ),
                     ]
                 ),
             ],
@@ -133,9 +447,24 @@ class CRISPRQCDashApp:
 
     def register_callbacks(self):
         self.scatter_data_card.register_callbacks(self.app)
+        self.scatter_matrix_card.register_callbacks(self.app)
         self.histogram_membership_card.register_callbacks(self.app)
         self.correlation_matrix_card.register_callbacks(self.app)
         self.kde_histogram_card.register_callbacks(self.app)
+        self.library_metrics_card.register_callbacks(self.app)
+        self.startup.register_callbacks(self.app)
+        if self.watcher is not None:
+            self.watcher.register_callbacks(self.app)
 
-    def run(self, debug=True, port=8050):
-        self.app.run(debug=debug, port=port)
+    def run(self, debug=True, port=8050, sock=None):
+        # Only load from the serving process, not from the parent of the debug reloader
+        # (pre-bound sockets are served without the reloader)
+        serving = should_start_watcher(debug and sock is None)
+        if serving:
+            self.startup.start()
+        if self.watcher is not None and serving:
+            self.watcher.start()
+        if sock is not None:
+            serve(self.app, sock, debug=debug)
+        else:
+            self.app.run(debug=debug, port=port)
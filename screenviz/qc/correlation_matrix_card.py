@@ -4,6 +4,9 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from dash import dcc, html
+from dash.dependencies import Input, Output
+
+from .normalization import NORMALIZATION_METHODS
 
 
 class CorrelationMatrixCard:
@@ -72,10 +75,11 @@ class CorrelationMatrixCard:
         )
 
     def create_correlation_heatmap(self):
+        state = self.parent.state
         fig = px.imshow(
-            self.parent.correlation_matrix,
-            x=self.parent.sample_columns,
-            y=self.parent.sample_columns,
+            state.correlation_matrix,
+            x=state.sample_columns,
+            y=state.sample_columns,
             color_continuous_scale="viridis",
             aspect="auto",
         )
@@ -88,19 +92,19 @@ class CorrelationMatrixCard:
         )
 
         # Add white borders between cells
-        for i in range(len(self.parent.sample_columns) + 1):
+        for i in range(len(state.sample_columns) + 1):
             fig.add_shape(
                 type="line",
                 x0=i - 0.5,
                 x1=i - 0.5,
                 y0=-0.5,
-                y1=len(self.parent.sample_columns) - 0.5,
+                y1=len(state.sample_columns) - 0.5,
                 line=dict(color="white", width=3),
             )
             fig.add_shape(
                 type="line",
                 x0=-0.5,
-                x1=len(self.parent.sample_columns) - 0.5,
+                x1=len(state.sample_columns) - 0.5,
                 y0=i - 0.5,
                 y1=i - 0.5,
                 line=dict(color="white", width=3),
@@ -108,22 +112,30 @@ class CorrelationMatrixCard:
 
         return fig
 
-    def create_read_count_barplot(self):
-        log10_counts = np.log10(self.parent.total_read_counts)
+    def create_read_count_barplot(self, normalization="raw"):
+        state = self.parent.state
+        log10_counts = np.log10(state.total_read_counts)
+        text = state.total_read_counts.apply(lambda x: f"{x:,}")
+        title = "Total Read Counts per Sample"
+        if normalization not in [None, "raw"]:
+            # The cached size factors of the selected normalization
+            size_factors = state.normalized_counts.size_factors[normalization]
+            text = [f"{t} (size factor {f:.3g})" for t, f in zip(text, size_factors)]
+            title = f"{title} ({NORMALIZATION_METHODS[normalization]})"
 
         fig = go.Figure(
             data=[
                 go.Bar(
-                    x=self.parent.sample_columns,
+                    x=state.sample_columns,
                     y=log10_counts,
-                    text=self.parent.total_read_counts.apply(lambda x: f"{x:,}"),
+                    text=text,
                     textposition="auto",
                 )
             ]
         )
 
         fig.update_layout(
-            title="Total Read Counts per Sample",
+            title=title,
             xaxis_title="Samples",
             yaxis_title="Log10[ Total Reads ]",
             height=600,
@@ -133,5 +145,11 @@ class CorrelationMatrixCard:
         return fig
 
     def register_callbacks(self, app):
-        # No callbacks are needed for this card as it's static
-        pass
+        # The Spearman correlation is invariant to per-sample scaling, so only
+        # the read counts follow the normalization
+        @app.callback(
+            Output("read-count-barplot", "figure"),
+            [Input("normalization-dropdown", "value")],
+        )
+        def update_read_count_barplot(normalization):
+            return self.create_read_count_barplot(normalization)
@@ -0,0 +1,114 @@
+# screenviz.qc.export
+
+import io
+import zlib
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+EXPORT_ROUTE = "/_screenviz/export"
+EXPORT_CHUNKSIZE = 50_000
+EXPORT_FORMATS = {
+    "tsv": "text/tab-separated-values",
+    "tsv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only sink that hands back whatever has been written since the last drain.
+
+    Keeps track of the absolute stream position so that writers which record
+    offsets (e.g. parquet footers) see a contiguous file.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.buffer.append(bytes(b))
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_tsv(
+    df: pd.DataFrame, index: np.ndarray, chunksize: int = EXPORT_CHUNKSIZE
+) -> Iterator[bytes]:
+    """
+    Yield the selected rows of a dataframe as TSV-encoded chunks.
+    """
+    yield ("\t".join(map(str, df.columns)) + "\n").encode()
+    for start in range(0, index.size, chunksize):
+        chunk = df.iloc[index[start : start + chunksize]]
+        yield chunk.to_csv(sep="\t", index=False, header=False).encode()
+
+
+def iter_gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Gzip-compress a stream of byte chunks on the fly.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_parquet(
+    df: pd.DataFrame, index: np.ndarray, chunksize: int = EXPORT_CHUNKSIZE
+) -> Iterator[bytes]:
+    """
+    Yield the selected rows of a dataframe as a parquet file, one row group per chunk.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for start in range(0, index.size, chunksize):
+            chunk = df.iloc[index[start : start + chunksize]]
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_export(
+    df: pd.DataFrame,
+    index: np.ndarray,
+    fmt: str = "tsv",
+    chunksize: int = EXPORT_CHUNKSIZE,
+) -> Iterator[bytes]:
+    """
+    Stream the selected rows of a dataframe in the requested export format.
+    """
+    assert fmt in EXPORT_FORMATS, f"Export format must be one of {list(EXPORT_FORMATS)}"
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "Parquet export requires `pyarrow` to be installed"
+            ) from e
+        return iter_parquet(df, index, chunksize)
+    chunks = iter_tsv(df, index, chunksize)
+    if fmt == "tsv.gz":
+        return iter_gzip(chunks)
+    return chunks
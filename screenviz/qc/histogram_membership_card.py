@@ -47,15 +47,13 @@ class HistogramMembershipCard:
         )
 
     def _create_histogram_dropdown(self):
+        state = self.parent.state
         return html.Div(
             [
                 dcc.Dropdown(
                     id="histogram-sample-dropdown",
                     options=[{"label": "All Samples", "value": "All Samples"}]
-                    + [
-                        {"label": col, "value": col}
-                        for col in self.parent.sample_columns
-                    ],
+                    + [{"label": col, "value": col} for col in state.sample_columns],
                     value="All Samples",
                     style={"width": "100%", "marginBottom": "10px"},
                 ),
@@ -122,23 +120,23 @@ class HistogramMembershipCard:
         return fig
 
     def generate_histogram_data(self, selected_sample=None):
+        state = self.parent.state
         if selected_sample is None or selected_sample == "All Samples":
-            non_zero_counts = (self.parent.df[self.parent.sample_columns] > 0).sum(
-                axis=1
-            )
+            non_zero_counts = (state.df[state.sample_columns] > 0).sum(axis=1)
         else:
-            non_zero_counts = (self.parent.df[selected_sample] > 0).astype(int)
+            non_zero_counts = (state.df[selected_sample] > 0).astype(int)
 
         mask = non_zero_counts > 0
-        masked_df = self.parent.df[mask]
+        masked_df = state.df[mask]
         sgrna_counts = masked_df[self.parent.gene_column].value_counts().sort_index()
+        # Categorical gene columns also report genes without any remaining sgRNAs
+        sgrna_counts = sgrna_counts[sgrna_counts > 0]
         membership_counts = sgrna_counts.value_counts().sort_index()
         return membership_counts
 
     def generate_gene_membership_data(self):
-        gene_counts = (
-            self.parent.df[self.parent.gene_column].value_counts().reset_index()
-        )
+        state = self.parent.state
+        gene_counts = state.df[self.parent.gene_column].value_counts().reset_index()
         gene_counts.columns = ["Gene", "Number of sgRNAs"]
         return gene_counts.to_dict("records")
 
@@ -156,14 +154,14 @@ class HistogramMembershipCard:
         )
         def update_gene_membership_table(selected_sample):
             # This callback updates the gene membership table based on the selected sample
+            state = self.parent.state
             if selected_sample is None or selected_sample == "All Samples":
                 return self.generate_gene_membership_data()
             else:
                 # Filter the dataframe based on the selected sample
-                mask = self.parent.df[selected_sample] > 0
-                filtered_df = self.parent.df[mask]
-                gene_counts = (
-                    filtered_df[self.parent.gene_column].value_counts().reset_index()
-                )
+                mask = state.df[selected_sample] > 0
+                filtered_df = state.df[mask]
+                gene_counts = filtered_df[self.parent.gene_column].value_counts()
+                gene_counts = gene_counts[gene_counts > 0].reset_index()
                 gene_counts.columns = ["Gene", "Number of sgRNAs"]
                 return gene_counts.to_dict("records")
@@ -0,0 +1,226 @@
+# screenviz.qc.histograms
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Width of the log10(x+1) bins shared by every sample
+LOG_BIN_WIDTH = 0.05
+
+# Bins along each axis of the pairwise (scatter matrix) density histograms
+PAIR_BINS = 24
+
+
+def log_bin_edges(max_value: float, bin_width: float = LOG_BIN_WIDTH) -> np.ndarray:
+    """
+    Fixed bin edges from 0 covering `max_value` (in log10(x+1) units).
+    """
+    n_bins = max(int(np.floor(max_value / bin_width)) + 1, 1)
+    return np.round(np.arange(n_bins + 1) * bin_width, 10)
+
+
+class LogHistograms:
+    """
+    Histograms of the log10(x+1) counts of every sample over shared bins.
+    """
+
+    def __init__(
+        self, edges: np.ndarray, counts: np.ndarray, sample_columns: List[str]
+    ):
+        self.edges = edges
+        self.counts = counts
+        self.sample_columns = sample_columns
+        self.positions = {sample: i for i, sample in enumerate(sample_columns)}
+
+    @property
+    def centers(self) -> np.ndarray:
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def density(self, samples: List[str]) -> np.ndarray:
+        """
+        Densities (integrating to one) of the selected samples, one row each.
+        """
+        counts = self.counts[[self.positions[s] for s in samples]]
+        totals = counts.sum(axis=1, keepdims=True)
+        width = np.diff(self.edges)
+        return np.divide(
+            counts, totals * width, out=np.zeros(counts.shape), where=totals > 0
+        )
+
+    def to_frame(self, samples: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Long format table of the bins (one row per sample and bin), of all samples by default.
+        """
+        samples = self.sample_columns if samples is None else samples
+        counts = self.counts[[self.positions[s] for s in samples]]
+        n_samples, n_bins = counts.shape
+        return pd.DataFrame(
+            {
+                "sample": np.repeat(samples, n_bins),
+                "bin_start": np.tile(self.edges[:-1], n_samples),
+                "bin_end": np.tile(self.edges[1:], n_samples),
+                "count": counts.ravel(),
+                "density": self.density(samples).ravel(),
+            }
+        )
+
+
+def compute_log_histograms(
+    df_log: pd.DataFrame,
+    sample_columns: List[str],
+    bin_width: float = LOG_BIN_WIDTH,
+) -> LogHistograms:
+    """
+    Bin the log10(x+1) counts of every sample in a single pass over the matrix.
+
+    Bins are fixed width from zero, so the bin of each value is its integer
+    quotient by the width and every sample column is tallied with one `np.bincount`
+    (in the column's own precision, contiguous for column-major counts).
+    """
+    max_value = max(float(df_log[sample_columns].max().max()), 0.0)
+    edges = log_bin_edges(max_value, bin_width)
+    n_bins = len(edges) - 1
+    counts = np.zeros((len(sample_columns), n_bins), dtype=np.int64)
+    for j, sample in enumerate(sample_columns):
+        bins = (df_log[sample].to_numpy() / bin_width).astype(np.intp)
+        np.clip(bins, 0, n_bins - 1, out=bins)
+        counts[j] = np.bincount(bins, minlength=n_bins)
+    return LogHistograms(edges, counts, sample_columns)
+
+
+class PairHistograms:
+    """
+    2D histograms of the log10(x+1) counts of pairs of samples over shared bins.
+
+    Pairs are binned on first use and cached: `counts[(i, j)]` holds the
+    (y bin, x bin) counts of the sample `i` along y against the sample `j`
+    along x (with `j < i`).
+    """
+
+    def __init__(
+        self,
+        df_log: pd.DataFrame,
+        sample_columns: List[str],
+        edges: np.ndarray,
+        threads: Optional[int] = None,
+    ):
+        assert len(edges) - 1 <= 127, (
+            "Pair histograms support at most 127 bins per axis"
+        )
+        self.df_log = df_log
+        self.sample_columns = sample_columns
+        self.edges = edges
+        self.threads = threads
+        self.positions = {sample: i for i, sample in enumerate(sample_columns)}
+        self.counts: Dict[Tuple[int, int], np.ndarray] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def bins(self) -> int:
+        return len(self.edges) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.counts.values()) + self.edges.nbytes
+
+    def codes(self, sample: str) -> np.ndarray:
+        """
+        The bin of every count of a sample, as a small integer code.
+        """
+        width = self.edges[1] - self.edges[0]
+        values = (self.df_log[sample].to_numpy() / width).astype(np.intp)
+        np.clip(values, 0, self.bins - 1, out=values)
+        return values.astype(np.uint8)
+
+    def compute(self, samples: List[str]):
+        """
+        Bin every pair of the given samples not cached yet.
+
+        The bins are shared, so the codes of each sample are computed once
+        and the 2D bin of a pair is `y code * bins + x code`: each pair is
+        tallied with a single `np.bincount`, one task per y sample.
+        """
+        bins = self.bins
+        positions = sorted({self.positions[s] for s in samples})
+        with self.lock:
+            missing = [
+                (i, j)
+                for i in positions
+                for j in positions
+                if j < i and (i, j) not in self.counts
+            ]
+            if not missing:
+                return
+            needed = sorted({k for pair in missing for k in pair})
+            codes = {k: self.codes(self.sample_columns[k]) for k in needed}
+            rows: Dict[int, List[int]] = {}
+            for i, j in missing:
+                rows.setdefault(i, []).append(j)
+
+            def count_row(i: int):
+                y = codes[i].astype(np.int16) * bins
+                for j in rows[i]:
+                    self.counts[(i, j)] = (
+                        np.bincount(y + codes[j], minlength=bins * bins)
+                        .astype(np.int32)
+                        .reshape(bins, bins)
+                    )
+
+            workers = max(1, min(len(rows), self.threads or os.cpu_count()))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(count_row, rows))
+
+    def reuse(self, previous: "PairHistograms", samples: List[str]):
+        """
+        Take over the pairs of `samples` already binned by `previous` over the same bins.
+        """
+        if not np.array_equal(previous.edges, self.edges):
+            return
+        with previous.lock:
+            pairs = list(previous.counts.items())
+        with self.lock:
+            for (i, j), counts in pairs:
+                y_sample, x_sample = (
+                    previous.sample_columns[i],
+                    previous.sample_columns[j],
+                )
+                if y_sample not in samples or x_sample not in samples:
+                    continue
+                y, x = self.positions[y_sample], self.positions[x_sample]
+                # Reordered samples swap the axes of the pair
+                self.counts[(y, x) if y > x else (x, y)] = counts if y > x else counts.T
+
+    def get(self, x_sample: str, y_sample: str) -> np.ndarray:
+        """
+        The (y bin, x bin) counts of a pair of samples (in either order).
+        """
+        i, j = self.positions[y_sample], self.positions[x_sample]
+        pair = (i, j) if i > j else (j, i)
+        if pair not in self.counts:
+            self.compute([x_sample, y_sample])
+        return self.counts[pair] if i > j else self.counts[pair].T
+
+
+def compute_pair_histograms(
+    df_log: pd.DataFrame,
+    sample_columns: List[str],
+    bins: int = PAIR_BINS,
+    threads: Optional[int] = None,
+    max_value: Optional[float] = None,
+) -> PairHistograms:
+    """
+    The (lazily binned) pair histograms of the log10(x+1) counts.
+
+    The bins span the counts of all samples, up to `max_value` if given
+    (e.g. the last edge of the sample histograms) so that the matrix is not
+    read again to find it.
+    """
+    if max_value is None:
+        max_value = float(df_log[sample_columns].max().max())
+    max_value = max(max_value, 0.0)
+    edges = np.linspace(0.0, max_value if max_value > 0 else 1.0, bins + 1)
+    return PairHistograms(df_log, sample_columns, edges, threads)
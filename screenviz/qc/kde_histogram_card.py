@@ -1,17 +1,31 @@
 # screenviz.qc.kde_histogram_card
 
+from urllib.parse import urlencode
+
+import flask
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from dash import dash_table, dcc, html
 from dash.dependencies import Input, Output
 from scipy import stats
 
+from .normalization import NORMALIZATION_METHODS
+
+HISTOGRAM_MODES = {
+    "kde": "KDE overlay",
+    "ridgeline": "Histogram ridge-lines",
+    "heatmap": "Histogram heatmap",
+}
+HISTOGRAM_EXPORT_ROUTE = "/_screenviz/count-histograms.tsv"
+
 
 class KDEHistogramCard:
     def __init__(self, parent):
         self.parent = parent
 
     def create_card(self, card_style):
+        state = self.parent.state
         return html.Div(
             [
                 html.H3("sgRNA Count Distribution"),
@@ -20,6 +34,16 @@ class KDEHistogramCard:
                         # KDE Histogram plot
                         html.Div(
                             [
+                                dcc.RadioItems(
+                                    id="histogram-mode",
+                                    options=[
+                                        {"label": label, "value": mode}
+                                        for mode, label in HISTOGRAM_MODES.items()
+                                    ],
+                                    value="kde",
+                                    inline=True,
+                                    style={"marginBottom": "10px"},
+                                ),
                                 dcc.Graph(
                                     id="kde-histogram-plot",
                                     config={
@@ -34,6 +58,14 @@ class KDEHistogramCard:
                                         "displaylogo": False,
                                     },
                                 ),
+                                html.A(
+                                    "Export histograms (tsv)",
+                                    id="count-histograms-export",
+                                    href=self.parent.app.get_relative_path(
+                                        HISTOGRAM_EXPORT_ROUTE
+                                    ),
+                                    download="count_histograms.tsv",
+                                ),
                             ],
                             style={
                                 "width": "70%",
@@ -57,7 +89,7 @@ class KDEHistogramCard:
                                     ],
                                     data=[
                                         {"sample": col, "include": "Yes"}
-                                        for col in self.parent.sample_columns
+                                        for col in state.sample_columns
                                     ],
                                     editable=True,
                                     row_selectable=False,
@@ -93,28 +125,21 @@ class KDEHistogramCard:
             style=card_style,
         )
 
-    def create_kde_histogram(self, selected_samples):
+    def create_kde_histogram(self, selected_samples, normalization="raw"):
+        state = self.parent.state
         fig = go.Figure()
+        df_log = state.get_counts(True, normalization)
 
         for sample in selected_samples:
-            kde = self.calculate_kde(self.parent.df_log[sample])
+            kde = self.calculate_kde(df_log[sample])
             fig.add_trace(go.Scatter(x=kde[0], y=kde[1], mode="lines", name=sample))
 
-        x_min = self.parent.df_log[selected_samples].values.min()
-        x_max = self.parent.df_log[selected_samples].values.max()
-        tick_values = np.arange(np.floor(x_min), np.ceil(x_max) + 1)
-
-        # Include 10^x label on the x-axis
+        x_min = df_log[selected_samples].values.min()
+        x_max = df_log[selected_samples].values.max()
 
         fig.update_layout(
             title="Distribution of Log10 sgRNA Counts",
-            xaxis=dict(
-                title="Counts",
-                tickmode="array",
-                tickvals=tick_values,
-                ticktext=[f"10<sup>{int(val)}</sup>" for val in tick_values],
-                tickangle=0,
-            ),
+            xaxis=self.log_count_axis(x_min, x_max),
             yaxis_title="Density",
             barmode="overlay",
             height=600,
@@ -122,6 +147,99 @@ class KDEHistogramCard:
 
         return fig
 
+    def log_count_axis(self, x_min, x_max):
+        # Include 10^x label on the x-axis
+        tick_values = np.arange(np.floor(x_min), np.ceil(x_max) + 1)
+        return dict(
+            title="Counts",
+            tickmode="array",
+            tickvals=tick_values,
+            ticktext=[f"10<sup>{int(val)}</sup>" for val in tick_values],
+            tickangle=0,
+        )
+
+    def create_histogram_figure(
+        self, selected_samples, normalization="raw", mode="kde"
+    ):
+        if mode == "kde":
+            return self.create_kde_histogram(selected_samples, normalization)
+        if len(selected_samples) == 0:
+            return go.Figure()
+
+        # Cached bins: changing the selection only slices the precomputed densities
+        histograms = self.parent.state.normalized_counts.histograms(
+            normalization or "raw"
+        )
+        density = histograms.density(selected_samples)
+        centers = histograms.centers
+        observed = np.flatnonzero(density.any(axis=0))
+        x_min, x_max = histograms.edges[observed[0]], histograms.edges[observed[-1] + 1]
+
+        fig = go.Figure()
+        if mode == "ridgeline":
+            # One row per sample, each curve scaled to overlap its neighbour a little
+            scale = 1.5 / max(density.max(), 1e-12)
+            # Each filled area runs along the curve and back along the sample's baseline
+            x = np.concatenate([centers, centers[::-1]])
+            for i, sample in enumerate(selected_samples):
+                fig.add_trace(
+                    go.Scatter(
+                        x=x,
+                        y=np.concatenate(
+                            [i + density[i] * scale, np.full(len(centers), i)]
+                        ),
+                        mode="lines",
+                        fill="toself",
+                        line={"width": 1},
+                        name=sample,
+                        customdata=np.concatenate([density[i], density[i][::-1]]),
+                        hovertemplate="%{customdata:.3f}<extra>" + sample + "</extra>",
+                    )
+                )
+            fig.update_layout(
+                yaxis=dict(
+                    tickmode="array",
+                    tickvals=np.arange(len(selected_samples)),
+                    ticktext=selected_samples,
+                ),
+                showlegend=False,
+            )
+        else:
+            fig.add_trace(
+                go.Heatmap(
+                    x=centers,
+                    y=selected_samples,
+                    z=density,
+                    colorscale="Viridis",
+                    colorbar={"title": "Density"},
+                )
+            )
+
+        fig.update_layout(
+            title="Distribution of Log10 sgRNA Counts",
+            xaxis=self.log_count_axis(x_min, x_max),
+            yaxis_title="Samples",
+            height=max(600, 20 * len(selected_samples)),
+        )
+        return fig
+
+    def export_frame(self, selected_samples, normalization="raw", mode="kde"):
+        """
+        The table behind the figure: the KDE curves, or the histogram bins in the other modes.
+        """
+        state = self.parent.state
+        if mode != "kde":
+            histograms = state.normalized_counts.histograms(normalization)
+            return histograms.to_frame(selected_samples)
+        df_log = state.get_counts(True, normalization)
+        frames = []
+        for sample in selected_samples:
+            x, density = self.calculate_kde(df_log[sample])
+            frames.append(pd.DataFrame({"sample": sample, "x": x, "density": density}))
+        if not frames:
+            return pd.DataFrame(columns=["sample", "x", "density"])
+        return pd.concat(frames, ignore_index=True)
+
     def calculate_kde(self, data, bandwidth=0.05):
         x_range = np.linspace(data.min(), data.max(), 1000)
         kde = stats.gaussian_kde(data, bw_method=bandwidth)
@@ -133,10 +251,60 @@ class KDEHistogramCard:
             [
                 Input("sample-selection-table", "data"),
                 Input("sample-selection-table", "columns"),
+                Input("normalization-dropdown", "value"),
+                Input("histogram-mode", "value"),
             ],
         )
-        def update_kde_histogram(rows, columns):
+        def update_kde_histogram(rows, columns, normalization, mode):
             selected_samples = [
                 row["sample"] for row in rows if row["include"] == "Yes"
             ]
-            return self.create_kde_histogram(selected_samples)
+            return self.create_histogram_figure(selected_samples, normalization, mode)
+
+        @app.callback(
+            [
+                Output("count-histograms-export", "href"),
+                Output("count-histograms-export", "download"),
+            ],
+            [
+                Input("sample-selection-table", "data"),
+                Input("normalization-dropdown", "value"),
+                Input("histogram-mode", "value"),
+            ],
+        )
+        def update_export_link(rows, normalization, mode):
+            # The export follows the displayed samples, normalization and mode
+            params = [("normalization", normalization or "raw"), ("mode", mode)]
+            selected_samples = [
+                row["sample"] for row in rows if row["include"] == "Yes"
+            ]
+            if len(selected_samples) < len(rows):
+                params += [("sample", sample) for sample in selected_samples]
+            href = app.get_relative_path(HISTOGRAM_EXPORT_ROUTE)
+            name = "count_kde" if mode == "kde" else "count_histograms"
+            return f"{href}?{urlencode(params)}", f"{name}.tsv"
+
+        @app.server.route(HISTOGRAM_EXPORT_ROUTE)
+        def export_count_histograms():
+            state = self.parent.state
+            args = flask.request.args
+            normalization = args.get("normalization", "raw")
+            if normalization not in NORMALIZATION_METHODS:
+                return flask.Response(
+                    f"Unknown normalization: {normalization}", status=400
+                )
+            # Without a mode the bins are exported
+            mode = args.get("mode", "heatmap")
+            if mode not in HISTOGRAM_MODES:
+                return flask.Response(f"Unknown histogram mode: {mode}", status=400)
+            selected_samples = args.getlist("sample") or state.sample_columns
+            unknown = [s for s in selected_samples if s not in state.sample_columns]
+            if unknown:
+                return flask.Response(f"Unknown samples: {unknown}", status=400)
+            name = "count_kde" if mode == "kde" else "count_histograms"
+            frame = self.export_frame(selected_samples, normalization, mode)
+            return flask.Response(
+                frame.to_csv(sep="\t", index=False),
+                mimetype="text/tab-separated-values",
+                headers={"Content-Disposition": f"attachment; filename={name}.tsv"},
+            )
@@ -0,0 +1,287 @@
+# screenviz.qc.metrics
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .histograms import LOG_BIN_WIDTH, LogHistograms, log_bin_edges
+
+# Counts below this are tallied in a dense per-sample histogram, the larger ones in a sparse one
+HISTOGRAM_SIZE = 1 << 12
+DEFAULT_CHUNKSIZE = 500_000
+
+METRIC_COLUMNS = {
+    "total_reads": "Total reads",
+    "zero_fraction": "Fraction of zero-count guides",
+    "gini_index": "Gini index",
+    "skew_ratio": "90/10 percentile skew ratio",
+    "zero_guides_per_gene": "Mean zero-count guides per gene",
+    "dropout_genes": "Genes with every guide at zero",
+}
+
+
+class SampleMetrics:
+    """
+    Streaming accumulator of the library QC metrics of every sample.
+
+    Integer counts are tallied per sample into value histograms: a dense
+    int32 one for counts below `HISTOGRAM_SIZE` (16 KB per sample) and a
+    sparse one (distinct values and their counts) for the larger ones. The
+    Gini index and percentiles are exact without sorting the guides, and
+    chunks of rows can be fed one at a time. Zero-count guides are tallied
+    per gene and sample.
+    """
+
+    def __init__(self, sample_columns: List[str]):
+        self.sample_columns = sample_columns
+        n_samples = len(sample_columns)
+        self.histograms = np.zeros((n_samples, HISTOGRAM_SIZE), dtype=np.int32)
+        self.tails: List[Tuple[np.ndarray, np.ndarray]] = [
+            (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+            for _ in range(n_samples)
+        ]
+        self.totals = np.zeros(n_samples, dtype=np.float64)
+        self.gene_codes: Dict[str, int] = {}
+        self.gene_guides = np.zeros(0, dtype=np.int64)
+        self.gene_zeros = np.zeros((0, n_samples), dtype=np.int64)
+        self.n_guides = 0
+
+    def encode_genes(self, genes: pd.Series) -> np.ndarray:
+        """
+        Codes of the genes of a chunk consistent across chunks.
+        """
+        categorical = pd.Categorical(genes.astype(str))
+        for gene in categorical.categories:
+            self.gene_codes.setdefault(gene, len(self.gene_codes))
+        lookup = np.array(
+            [self.gene_codes[gene] for gene in categorical.categories], dtype=np.int64
+        )
+        return lookup[categorical.codes]
+
+    def update(self, counts: np.ndarray, genes: pd.Series):
+        """
+        Add a chunk of guides (rows of `counts`, samples as columns).
+        """
+        assert counts.shape[1] == len(self.sample_columns), (
+            "The count chunk must have one column per sample"
+        )
+        codes = self.encode_genes(genes)
+        n_genes = len(self.gene_codes)
+        if n_genes > len(self.gene_guides):
+            pad = n_genes - len(self.gene_guides)
+            self.gene_guides = np.concatenate(
+                [self.gene_guides, np.zeros(pad, dtype=np.int64)]
+            )
+            self.gene_zeros = np.vstack(
+                [self.gene_zeros, np.zeros((pad, len(self.sample_columns)), np.int64)]
+            )
+        self.gene_guides += np.bincount(codes, minlength=n_genes)
+
+        for j in range(counts.shape[1]):
+            column = np.asarray(counts[:, j])
+            assert column.dtype.kind in "iu" or np.all(column == np.floor(column)), (
+                "Library metrics require integer counts"
+            )
+            column = column.astype(np.int64, copy=False)
+            large = column >= HISTOGRAM_SIZE
+            self.histograms[j] += np.bincount(
+                column[~large], minlength=HISTOGRAM_SIZE
+            ).astype(np.int32)
+            if large.any():
+                self.add_tail(j, column[large])
+            self.totals[j] += column.sum()
+            self.gene_zeros[:, j] += np.bincount(
+                codes, weights=column == 0, minlength=n_genes
+            ).astype(np.int64)
+        self.n_guides += counts.shape[0]
+
+    def add_tail(self, j: int, values: np.ndarray):
+        """
+        Merge counts at or above `HISTOGRAM_SIZE` into the sparse histogram of a sample.
+        """
+        tail_values, tail_counts = self.tails[j]
+        values, counts = np.unique(values, return_counts=True)
+        merged, inverse = np.unique(
+            np.concatenate([tail_values, values]), return_inverse=True
+        )
+        self.tails[j] = (
+            merged,
+            np.bincount(
+                inverse,
+                weights=np.concatenate([tail_counts, counts]),
+                minlength=len(merged),
+            ).astype(np.int64),
+        )
+
+    def value_counts(self, j: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distinct counts of a sample in increasing order and their number of guides.
+        """
+        histogram = self.histograms[j]
+        observed = np.flatnonzero(histogram)
+        tail_values, tail_counts = self.tails[j]
+        return (
+            np.concatenate([observed, tail_values]),
+            np.concatenate([histogram[observed].astype(np.int64), tail_counts]),
+        )
+
+    def sample_metrics(self, j: int) -> Dict[str, float]:
+        values, counts = self.value_counts(j)
+        values = values.astype(np.float64)
+        counts = counts.astype(np.float64)
+        n = self.n_guides
+
+        # Sum of rank * value over the guides in sorted order, value by value
+        cumulative = np.cumsum(counts)
+        before = cumulative - counts
+        ranked_sum = (values * (counts * before + counts * (counts + 1) / 2)).sum()
+        total = self.totals[j]
+        gini = 2 * ranked_sum / (n * total) - (n + 1) / n if total > 0 else 0.0
+
+        def percentile(q: float) -> float:
+            # Nearest-rank percentile read off the value histogram
+            rank = max(int(np.ceil(q * n)), 1)
+            return float(values[np.searchsorted(cumulative, rank)])
+
+        p10, p90 = percentile(0.1), percentile(0.9)
+        zeros = self.gene_zeros[:, j]
+        return {
+            "total_reads": int(total),
+            "zero_fraction": self.histograms[j, 0] / n if n > 0 else np.nan,
+            "gini_index": gini,
+            "skew_ratio": p90 / p10 if p10 > 0 else np.inf,
+            "zero_guides_per_gene": zeros.mean() if len(zeros) > 0 else np.nan,
+            "dropout_genes": int(((zeros == self.gene_guides) & (zeros > 0)).sum()),
+        }
+
+    def log_histograms(self, bin_width: float = LOG_BIN_WIDTH) -> LogHistograms:
+        """
+        log10(x+1) count histograms of every sample, regrouped from the value histograms.
+
+        No further pass over the counts is needed, so streamed (headless) runs
+        get the same bins as the dashboard.
+        """
+        value_counts = [self.value_counts(j) for j in range(len(self.sample_columns))]
+        max_count = max(
+            [values[-1] for values, _ in value_counts if len(values)], default=0
+        )
+        edges = log_bin_edges(np.log10(max_count + 1), bin_width)
+        n_bins = len(edges) - 1
+
+        counts = np.zeros((len(self.sample_columns), n_bins), dtype=np.int64)
+        for j, (values, value_guides) in enumerate(value_counts):
+            bins = (np.log10(values + 1.0) / bin_width).astype(np.int64)
+            np.clip(bins, 0, n_bins - 1, out=bins)
+            counts[j] = np.bincount(
+                bins, weights=value_guides, minlength=n_bins
+            ).astype(np.int64)
+        return LogHistograms(edges, counts, self.sample_columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        metrics = pd.DataFrame(
+            [self.sample_metrics(j) for j in range(len(self.sample_columns))],
+            columns=list(METRIC_COLUMNS),
+        )
+        metrics.insert(0, "sample", self.sample_columns)
+        return metrics
+
+
+def accumulate_metrics(
+    df: pd.DataFrame,
+    sample_columns: List[str],
+    gene_column: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> SampleMetrics:
+    """
+    Accumulate the metrics of every sample of a loaded count frame, in blocks of rows.
+    """
+    metrics = SampleMetrics(sample_columns)
+    for start in range(0, len(df), chunksize):
+        block = df.iloc[start : start + chunksize]
+        metrics.update(block[sample_columns].to_numpy(), block[gene_column])
+    return metrics
+
+
+def compute_metrics(
+    df: pd.DataFrame,
+    sample_columns: List[str],
+    gene_column: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> pd.DataFrame:
+    """
+    Library QC metrics of every sample of a loaded count frame.
+    """
+    return accumulate_metrics(df, sample_columns, gene_column, chunksize).to_frame()
+
+
+def metrics_from_file(
+    filename: str,
+    guide_column: str,
+    gene_column: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    histograms: bool = False,
+) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Library QC metrics (and optionally the log count histograms) of a count
+    table streamed from disk in chunks of rows.
+    """
+    metrics = None
+    for chunk in pd.read_csv(filename, sep="\t", chunksize=chunksize):
+        sample_columns = [
+            c for c in chunk.columns if c not in [guide_column, gene_column]
+        ]
+        if metrics is None:
+            metrics = SampleMetrics(sample_columns)
+        metrics.update(chunk[sample_columns].to_numpy(), chunk[gene_column])
+    assert metrics is not None, f"{filename} has no rows"
+    frame = metrics.to_frame()
+    frame.insert(0, "file", filename)
+    if not histograms:
+        return frame, None
+    bins = metrics.log_histograms().to_frame()
+    bins.insert(0, "file", filename)
+    return frame, bins
+
+
+def RunMetrics(
+    filenames: List[str],
+    output: Optional[str] = None,
+    guide_column: str = "Guide",
+    gene_column: str = "Gene",
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    threads: Optional[int] = None,
+    histograms: Optional[str] = None,
+):
+    """
+    Compute the library QC metrics of many count tables in parallel (one process per table).
+
+    With `histograms` the log count histograms of every sample are written to that file too.
+    """
+    start = time.perf_counter()
+    workers = max(1, min(len(filenames), threads or os.cpu_count()))
+    args = [
+        (f, guide_column, gene_column, chunksize, histograms is not None)
+        for f in filenames
+    ]
+    if workers == 1:
+        frames = [metrics_from_file(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(metrics_from_file, *zip(*args)))
+    results = pd.concat([frame for frame, _ in frames], ignore_index=True)
+    if histograms is not None:
+        bins = pd.concat([bins for _, bins in frames], ignore_index=True)
+        bins.to_csv(histograms, sep="\t", index=False)
+    if output is None:
+        results.to_csv(sys.stdout, sep="\t", index=False)
+    else:
+        results.to_csv(output, sep="\t", index=False)
+    print(
+        f"Computed metrics of {len(filenames)} count table(s) in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
@@ -0,0 +1,113 @@
+# screenviz.qc.metrics_card
+
+import flask
+import plotly.graph_objects as go
+from dash import dash_table, dcc, html
+from dash.dependencies import Input, Output
+
+from .metrics import METRIC_COLUMNS
+
+METRICS_EXPORT_ROUTE = "/_screenviz/library-metrics.tsv"
+
+
+class LibraryMetricsCard:
+    def __init__(self, parent):
+        self.parent = parent
+
+    def create_card(self, card_style):
+        state = self.parent.state
+        return html.Div(
+            [
+                html.H3("Library Metrics"),
+                html.Div(
+                    [
+                        html.Div(
+                            [
+                                dcc.Dropdown(
+                                    id="library-metric-dropdown",
+                                    options=[
+                                        {"label": label, "value": metric}
+                                        for metric, label in METRIC_COLUMNS.items()
+                                    ],
+                                    value="gini_index",
+                                    clearable=False,
+                                    style={"width": "100%", "marginBottom": "10px"},
+                                ),
+                                dcc.Graph(id="library-metric-barplot"),
+                            ],
+                            style={
+                                "width": "50%",
+                                "display": "inline-block",
+                                "vertical-align": "top",
+                            },
+                        ),
+                        html.Div(
+                            [
+                                dash_table.DataTable(
+                                    id="library-metrics-table",
+                                    columns=[{"name": "Sample", "id": "sample"}]
+                                    + [
+                                        {
+                                            "name": label,
+                                            "id": metric,
+                                            "type": "numeric",
+                                            "format": {"specifier": ".4~g"},
+                                        }
+                                        for metric, label in METRIC_COLUMNS.items()
+                                    ],
+                                    data=state.library_metrics.to_dict("records"),
+                                    page_size=10,
+                                    sort_action="native",
+                                    style_table={"overflowX": "auto"},
+                                ),
+                                html.A(
+                                    "Export metrics (tsv)",
+                                    id="library-metrics-export",
+                                    href=self.parent.app.get_relative_path(
+                                        METRICS_EXPORT_ROUTE
+                                    ),
+                                    download="library_metrics.tsv",
+                                ),
+                            ],
+                            style={
+                                "width": "50%",
+                                "display": "inline-block",
+                                "vertical-align": "top",
+                            },
+                        ),
+                    ]
+                ),
+            ],
+            className="card",
+            style=card_style,
+        )
+
+    def create_metric_barplot(self, metric="gini_index"):
+        metrics = self.parent.state.library_metrics
+        fig = go.Figure(data=[go.Bar(x=metrics["sample"], y=metrics[metric])])
+        fig.update_layout(
+            title=f"{METRIC_COLUMNS[metric]} per Sample",
+            xaxis_title="Samples",
+            yaxis_title=METRIC_COLUMNS[metric],
+            height=500,
+        )
+        return fig
+
+    def register_callbacks(self, app):
+        @app.callback(
+            Output("library-metric-barplot", "figure"),
+            [Input("library-metric-dropdown", "value")],
+        )
+        def update_metric_barplot(metric):
+            return self.create_metric_barplot(metric)
+
+        @app.server.route(METRICS_EXPORT_ROUTE)
+        def export_library_metrics():
+            state = self.parent.state
+            return flask.Response(
+                state.library_metrics.to_csv(sep="\t", index=False),
+                mimetype="text/tab-separated-values",
+                headers={
+                    "Content-Disposition": "attachment; filename=library_metrics.tsv"
+                },
+            )
@@ -0,0 +1,178 @@
+# screenviz.qc.normalization
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .histograms import (
+    LogHistograms,
+    PairHistograms,
+    compute_log_histograms,
+    compute_pair_histograms,
+)
+from .selection_index import SelectionIndex
+
+# Selection indexes kept per count table (each holds an argsort and two sorted columns)
+SELECTION_INDEX_CACHE_SIZE = 8
+
+NORMALIZATION_METHODS = {
+    "raw": "Raw counts",
+    "cpm": "Counts per million",
+    "median-of-ratios": "Median of ratios",
+    "total": "Total count scaling",
+}
+
+
+def compute_size_factors(counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Size factors of every sample for all normalization methods at once.
+
+    The matrix is read one sample column at a time (contiguous for
+    column-major counts): the library sizes and the per-guide sums of log
+    counts are accumulated in a single pass, and the median-of-ratios
+    factors then only revisit the guides counted in every sample.
+
+    - cpm: library size / 1e6
+    - total: library size / mean library size
+    - median-of-ratios: median ratio of each sample to the per-guide geometric mean (DESeq2)
+    """
+    n_guides, n_samples = counts.shape
+    library_sizes = np.zeros(n_samples, dtype=np.float64)
+    log_sums = np.zeros(n_guides, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        for j in range(n_samples):
+            column = np.asarray(counts[:, j], dtype=np.float64)
+            library_sizes[j] = column.sum()
+            # Guides with a zero count in any sample end at -inf and are excluded
+            log_sums += np.log(column)
+
+    expressed = np.isfinite(log_sums)
+    log_means = log_sums[expressed] / n_samples
+    ratios = np.ones(n_samples, dtype=np.float64)
+    if expressed.any():
+        for j in range(n_samples):
+            column = np.asarray(counts[expressed, j], dtype=np.float64)
+            ratios[j] = np.exp(np.median(np.log(column) - log_means))
+
+    mean_size = library_sizes.mean() if library_sizes.mean() > 0 else 1.0
+    return {
+        "raw": np.ones(n_samples, dtype=np.float64),
+        "cpm": np.where(library_sizes > 0, library_sizes / 1e6, 1.0),
+        "total": np.where(library_sizes > 0, library_sizes / mean_size, 1.0),
+        "median-of-ratios": ratios,
+    }
+
+
+class NormalizedCounts:
+    """
+    Lazily computed normalized views of the count matrix.
+
+    The size factors are computed on the first normalized request and each
+    method's (normalized, log10(x+1)) frames are built once and then shared
+    by every card. The raw method returns the loaded frames themselves.
+    The log count histograms of each method (per sample and per pair of
+    samples, the latter as each pair is first used) are cached alongside,
+    as are the scatter selection indexes of the most recent sample pairs.
+    """
+
+    def __init__(
+        self,
+        df_normal: pd.DataFrame,
+        df_log: pd.DataFrame,
+        sample_columns: List[str],
+    ):
+        self.df_normal = df_normal
+        self.df_log = df_log
+        self.sample_columns = sample_columns
+        self.views = {"raw": (df_normal, df_log)}
+        self.histogram_cache: Dict[str, LogHistograms] = {}
+        self.pair_histogram_cache: Dict[str, PairHistograms] = {}
+        self.selection_indices = OrderedDict()
+        self.lock = threading.Lock()
+        self._size_factors = None
+
+    @property
+    def size_factors(self) -> Dict[str, np.ndarray]:
+        if self._size_factors is None:
+            counts = self.df_normal[self.sample_columns].to_numpy()
+            self._size_factors = compute_size_factors(counts)
+        return self._size_factors
+
+    def get(self, method: str = "raw") -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        The (normalized, log10(x+1) normalized) frames of a method.
+        """
+        assert method in NORMALIZATION_METHODS, (
+            f"Normalization must be one of {list(NORMALIZATION_METHODS)}"
+        )
+        with self.lock:
+            if method not in self.views:
+                self.views[method] = self.build_views(self.size_factors[method])
+            return self.views[method]
+
+    def histograms(self, method: str = "raw") -> LogHistograms:
+        """
+        The log10(x+1) count histograms of every sample under a method.
+        """
+        _, df_log = self.get(method)
+        with self.lock:
+            if method not in self.histogram_cache:
+                self.histogram_cache[method] = compute_log_histograms(
+                    df_log, self.sample_columns
+                )
+            return self.histogram_cache[method]
+
+    def pair_histograms(self, method: str = "raw") -> PairHistograms:
+        """
+        The 2D log10(x+1) count histograms of the pairs of samples under a method (binned on first use).
+        """
+        _, df_log = self.get(method)
+        # The sample histograms already span the counts, their last edge bounds the bins
+        max_value = float(self.histograms(method).edges[-1])
+        with self.lock:
+            if method not in self.pair_histogram_cache:
+                self.pair_histogram_cache[method] = compute_pair_histograms(
+                    df_log, self.sample_columns, max_value=max_value
+                )
+            return self.pair_histogram_cache[method]
+
+    def selection_index(
+        self, x_col: str, y_col: str, log_transform: bool, method: str = "raw"
+    ) -> SelectionIndex:
+        """
+        The sorted-by-x selection index of a sample pair under a method (least recently used evicted).
+        """
+        key = (method, bool(log_transform), x_col, y_col)
+        with self.lock:
+            if key in self.selection_indices:
+                self.selection_indices.move_to_end(key)
+                return self.selection_indices[key]
+        df_normal, df_log = self.get(method)
+        df = df_log if log_transform else df_normal
+        index = SelectionIndex(df[x_col].to_numpy(), df[y_col].to_numpy())
+        with self.lock:
+            self.selection_indices[key] = index
+            self.selection_indices.move_to_end(key)
+            while len(self.selection_indices) > SELECTION_INDEX_CACHE_SIZE:
+                self.selection_indices.popitem(last=False)
+        return index
+
+    def build_views(
+        self, size_factors: np.ndarray
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        counts = self.df_normal[self.sample_columns]
+        normalized = np.empty(counts.shape, dtype=np.float32, order="F")
+        for j, sample in enumerate(self.sample_columns):
+            np.divide(counts[sample].to_numpy(), size_factors[j], out=normalized[:, j])
+        log_normalized = np.log10(normalized + 1, dtype=np.float32)
+
+        meta = self.df_normal.drop(columns=self.sample_columns)
+        columns = self.df_normal.columns
+        frames = []
+        for matrix in [normalized, log_normalized]:
+            samples = pd.DataFrame(matrix, columns=self.sample_columns, copy=False)
+            frames.append(pd.concat([meta, samples], axis=1)[columns])
+        return frames[0], frames[1]
@@ -1,13 +1,18 @@
 # screenviz.qc.scatter_data_card
 
+import json
 import warnings
+from urllib.parse import urlencode
 
-import dash
-import pandas as pd
+import flask
+import numpy as np
 import plotly.express as px
 from dash import dash_table, dcc, html
 from dash.dependencies import Input, Output, State
 
+from .export import EXPORT_FORMATS, EXPORT_ROUTE, iter_export
+from .normalization import NORMALIZATION_METHODS
+
 
 class ScatterDataCard:
     def __init__(self, parent):
@@ -53,6 +58,7 @@ class ScatterDataCard:
         )
 
     def _create_axis_dropdown(self, axis):
+        state = self.parent.state
         return html.Div(
             [
                 html.Label(f"Select {axis.upper()}-axis Sample:"),
@@ -60,14 +66,14 @@ class ScatterDataCard:
                     id=f"{axis}-axis-dropdown",
                     options=[
                         {"label": col, "value": col}
-                        for col in self.parent.sample_columns
+                        for col in state.sample_columns
                     ],
-                    value=self.parent.sample_columns[0]
+                    value=state.sample_columns[0]
                     if axis == "x"
                     else (
-                        self.parent.sample_columns[1]
-                        if len(self.parent.sample_columns) > 1
-                        else self.parent.sample_columns[0]
+                        state.sample_columns[1]
+                        if len(state.sample_columns) > 1
+                        else state.sample_columns[0]
                     ),
                 ),
             ],
@@ -75,17 +81,18 @@ class ScatterDataCard:
         )
 
     def _create_gene_dropdown(self):
+        state = self.parent.state
         return html.Div(
             [
                 html.Label("Highlight Gene:"),
                 dcc.Dropdown(
                     id="gene-dropdown",
                     options=[
-                        {"label": gene, "value": gene} for gene in self.parent.gene_list
+                        {"label": gene, "value": gene} for gene in state.gene_list
                     ],
                     value="non-targeting"
-                    if "non-targeting" in self.parent.gene_list
-                    else self.parent.gene_list[0],
+                    if "non-targeting" in state.gene_list
+                    else state.gene_list[0],
                     placeholder="Select a gene to highlight",
                 ),
             ],
@@ -113,7 +120,6 @@ class ScatterDataCard:
                     config={
                         "displayModeBar": True,
                         "modeBarButtonsToRemove": [
-                            "lasso2d",
                             "autoScale2d",
                             "hoverClosestCartesian",
                             "hoverCompareCartesian",
@@ -126,10 +132,35 @@ class ScatterDataCard:
         )
 
     def _create_scatter_plot_data_table(self):
+        state = self.parent.state
         return html.Div(
             [
-                html.Button("Export TSV", id="export-button"),
-                dcc.Download(id="download-dataframe-tsv"),
+                html.Div(
+                    [
+                        html.A(
+                            html.Button("Export Selection"),
+                            id="export-link",
+                            href=EXPORT_ROUTE,
+                            download="exported_data.tsv",
+                        ),
+                        dcc.Dropdown(
+                            id="export-format-dropdown",
+                            options=[
+                                {"label": fmt.upper(), "value": fmt}
+                                for fmt in EXPORT_FORMATS
+                            ],
+                            value="tsv",
+                            clearable=False,
+                            style={
+                                "width": "120px",
+                                "display": "inline-block",
+                                "vertical-align": "middle",
+                                "margin-left": "10px",
+                            },
+                        ),
+                    ],
+                    style={"margin-bottom": "10px"},
+                ),
                 dash_table.DataTable(
                     id="data-table",
                     columns=[
@@ -139,11 +170,11 @@ class ScatterDataCard:
                             "type": "numeric",
                             "format": {"specifier": ".4f"},
                         }
-                        if self.parent.df[i].dtype in ["float64", "float32"]
+                        if state.df[i].dtype in ["float64", "float32"]
                         else {"name": i, "id": i}
-                        for i in self.parent.df.columns
+                        for i in state.df.columns
                     ],
-                    data=self.parent.df.to_dict("records"),
+                    data=state.df.to_dict("records"),
                     page_size=21,
                     style_table={"height": "750px", "overflowY": "auto"},
                     style_header={"fontWeight": "bold", "textAlign": "center"},
@@ -158,17 +189,33 @@ class ScatterDataCard:
             ]
         )
 
+    def query_selection(
+        self, state, x_col, y_col, log_transform, selected_data, normalization="raw"
+    ):
+        """
+        Resolve a box or lasso selection to the selected row indices (or None).
+        """
+        if not selected_data:
+            return None
+        # Cached on the normalized views, so a reloaded table starts with none
+        index = state.normalized_counts.selection_index(
+            x_col, y_col, log_transform, normalization or "raw"
+        )
+        return index.query(selected_data)
+
     def get_figure(
         self,
+        state,
         x_col,
         y_col,
-        selection_range,
+        selected_data,
         highlighted_gene,
-        selected_points,
+        selected_index,
         log_transform,
         current_layout=None,
+        normalization="raw",
     ):
-        df = self.parent.df_log if log_transform else self.parent.df_normal
+        df = state.get_counts(log_transform, normalization)
 
         if highlighted_gene:
             df["color_by_gene"] = df[self.parent.gene_column].map(
@@ -200,25 +247,26 @@ class ScatterDataCard:
                 hover_data=[self.parent.guide_column, self.parent.gene_column],
             )
 
-        if selected_points:
-            opacity_list = [
-                self.parent.SELECTED_OPACITY
-                if i in selected_points
-                else self.parent.UNSELECTED_OPACITY
-                for i in range(len(df))
-            ]
-        else:
-            opacity_list = [self.parent.DEFAULT_OPACITY] * len(df)
-
         if highlighted_gene:
             fig.update_traces(
                 mode="markers",
                 marker={
                     "size": 10,
                     "line": {"width": 1.0, "color": "black"},
-                    "opacity": opacity_list,
+                    "opacity": self.parent.DEFAULT_OPACITY,
                 },
             )
+            if selected_index is not None:
+                # Each trace holds the rows of one color group in frame order
+                is_selected = np.zeros(len(df), dtype=bool)
+                is_selected[selected_index] = True
+                groups = df["color_by_gene"].to_numpy()
+                for trace in fig.data:
+                    trace.marker.opacity = np.where(
+                        is_selected[groups == trace.name],
+                        self.parent.SELECTED_OPACITY,
+                        self.parent.UNSELECTED_OPACITY,
+                    )
         else:
             fig.update_traces(marker={"color": self.parent.DEFAULT_MARKER_COLOR})
 
@@ -228,6 +276,8 @@ class ScatterDataCard:
             newselection_mode="gradual",
         )
 
+        selection_range = selected_data.get("range") if selected_data else None
+        lasso_points = selected_data.get("lassoPoints") if selected_data else None
         if selection_range:
             fig.add_shape(
                 type="rect",
@@ -239,6 +289,17 @@ class ScatterDataCard:
                 fillcolor=self.parent.SELECT_FILL_COLOR,
                 opacity=0.2,
             )
+        elif lasso_points:
+            path = "M " + " L ".join(
+                f"{x},{y}" for x, y in zip(lasso_points["x"], lasso_points["y"])
+            )
+            fig.add_shape(
+                type="path",
+                path=path + " Z",
+                line=dict(color="black", width=3),
+                fillcolor=self.parent.SELECT_FILL_COLOR,
+                opacity=0.2,
+            )
 
         # Add A/B line (diagonal line)
         x_range = fig.layout.xaxis.range or [df[x_col].min(), df[x_col].max()]
@@ -258,7 +319,9 @@ class ScatterDataCard:
         )
 
         new_layout = {
-            "title": "Scatter Plot",
+            "title": "Scatter Plot"
+            if normalization in [None, "raw"]
+            else f"Scatter Plot ({NORMALIZATION_METHODS[normalization]})",
             "xaxis_title": f"Log10p[ {x_col} ]" if log_transform else x_col,
             "yaxis_title": f"Log10p[ {y_col} ]" if log_transform else y_col,
         }
@@ -289,33 +352,40 @@ class ScatterDataCard:
                 Input("y-axis-dropdown", "value"),
                 Input("gene-dropdown", "value"),
                 Input("log-transform-switch", "value"),
+                Input("normalization-dropdown", "value"),
             ],
             [State("scatter-plot", "figure")],
         )
         def update_graph(
-            selectedData, x_col, y_col, highlighted_gene, log_transform, current_figure
+            selectedData,
+            x_col,
+            y_col,
+            highlighted_gene,
+            log_transform,
+            normalization,
+            current_figure,
         ):
-            selection_range = (
-                selectedData["range"]
-                if selectedData and "range" in selectedData
-                else None
+            state = self.parent.state
+            selected_index = self.query_selection(
+                state,
+                x_col,
+                y_col,
+                "log" in log_transform,
+                selectedData,
+                normalization,
             )
-            selected_points = []
-            if selectedData and "points" in selectedData:
-                selected_points = [
-                    point["pointIndex"] for point in selectedData["points"]
-                ]
-
             current_layout = current_figure["layout"] if current_figure else None
 
             fig = self.get_figure(
+                state,
                 x_col,
                 y_col,
-                selection_range,
+                selectedData,
                 highlighted_gene,
-                selected_points,
+                selected_index,
                 "log" in log_transform,
                 current_layout,
+                normalization,
             )
             return fig
 
@@ -326,31 +396,91 @@ class ScatterDataCard:
                 Input("x-axis-dropdown", "value"),
                 Input("y-axis-dropdown", "value"),
                 Input("log-transform-switch", "value"),
+                Input("normalization-dropdown", "value"),
             ],
         )
-        def update_table(selecteddata, x_col, y_col, log_transform):
-            df = self.parent.df_log if "log" in log_transform else self.parent.df_normal
-            if selecteddata and "range" in selecteddata:
-                selection_range = selecteddata["range"]
-                filtered_df = df[
-                    (df[x_col] >= selection_range["x"][0])
-                    & (df[x_col] <= selection_range["x"][1])
-                    & (df[y_col] >= selection_range["y"][0])
-                    & (df[y_col] <= selection_range["y"][1])
-                ]
-                return filtered_df.to_dict("records")
+        def update_table(selecteddata, x_col, y_col, log_transform, normalization):
+            state = self.parent.state
+            df = state.get_counts("log" in log_transform, normalization)
+            selected_index = self.query_selection(
+                state,
+                x_col,
+                y_col,
+                "log" in log_transform,
+                selecteddata,
+                normalization,
+            )
+            if selected_index is not None:
+                return df.iloc[selected_index].to_dict("records")
             return df.to_dict("records")
 
         @app.callback(
-            Output("download-dataframe-tsv", "data"),
-            Input("export-button", "n_clicks"),
-            State("data-table", "data"),
-            prevent_initial_call=True,
+            [Output("export-link", "href"), Output("export-link", "download")],
+            [
+                Input("scatter-plot", "selectedData"),
+                Input("x-axis-dropdown", "value"),
+                Input("y-axis-dropdown", "value"),
+                Input("log-transform-switch", "value"),
+                Input("export-format-dropdown", "value"),
+                Input("normalization-dropdown", "value"),
+            ],
         )
-        def export_table_to_tsv(n_clicks, table_data):
-            if n_clicks is None:
-                return dash.no_update
-            df = pd.DataFrame(table_data)
-            return dcc.send_data_frame(
-                df.to_csv, "exported_data.tsv", sep="\t", index=False
+        def update_export_link(
+            selecteddata, x_col, y_col, log_transform, fmt, normalization
+        ):
+            # Only the selection parameters go to the browser, the rows are
+            # filtered and streamed server-side when the link is followed.
+            params = {
+                "x": x_col,
+                "y": y_col,
+                "log": int("log" in log_transform),
+                "format": fmt,
+                "normalization": normalization or "raw",
+            }
+            if selecteddata and selecteddata.get("range"):
+                params["selection"] = json.dumps({"range": selecteddata["range"]})
+            elif selecteddata and selecteddata.get("lassoPoints"):
+                params["selection"] = json.dumps(
+                    {"lassoPoints": selecteddata["lassoPoints"]}
+                )
+            href = f"{app.get_relative_path(EXPORT_ROUTE)}?{urlencode(params)}"
+            return href, f"exported_data.{fmt}"
+
+        @app.server.route(EXPORT_ROUTE)
+        def export_selection():
+            state = self.parent.state
+            args = flask.request.args
+            x_col, y_col = args.get("x"), args.get("y")
+            fmt = args.get("format", "tsv")
+            if x_col not in state.sample_columns:
+                flask.abort(400, f"Unknown sample: {x_col}")
+            if y_col not in state.sample_columns:
+                flask.abort(400, f"Unknown sample: {y_col}")
+            if fmt not in EXPORT_FORMATS:
+                flask.abort(400, f"Unknown export format: {fmt}")
+            normalization = args.get("normalization", "raw")
+            if normalization not in NORMALIZATION_METHODS:
+                flask.abort(400, f"Unknown normalization: {normalization}")
+
+            log_transform = args.get("log") == "1"
+            df = state.get_counts(log_transform, normalization)
+            selected_data = (
+                json.loads(args["selection"]) if "selection" in args else None
+            )
+            index = self.query_selection(
+                state, x_col, y_col, log_transform, selected_data, normalization
+            )
+            if index is None:
+                index = np.arange(len(df))
+            try:
+                chunks = iter_export(df[state.df.columns], index, fmt)
+            except ImportError as e:
+                flask.abort(501, str(e))
+
+            return flask.Response(
+                flask.stream_with_context(chunks),
+                mimetype=EXPORT_FORMATS[fmt],
+                headers={
+                    "Content-Disposition": f"attachment; filename=exported_data.{fmt}"
+                },
             )
@@ -0,0 +1,274 @@
+# screenviz.qc.scatter_matrix_card
+
+import re
+from typing import Dict, List
+
+import numpy as np
+import plotly.graph_objects as go
+from dash import dcc, html
+from dash.dependencies import Input, Output
+from dash.exceptions import PreventUpdate
+
+from .normalization import NORMALIZATION_METHODS
+
+# Replicate suffix of a sample name (e.g. `_rep1`, `-r2`, `.replicate3`), stripped to get its condition.
+# Other trailing digits (time points as `T14`, `day7`, doses as `_i10`) are part of the condition.
+REPLICATE_SUFFIX = re.compile(r"[_.\-](?:replicate|rep|r)\d+$", re.IGNORECASE)
+
+# Empty pixels between the thumbnails of the matrix
+THUMBNAIL_GAP = 3
+
+# Empty bins (0) are transparent, the others scaled from 1 to 255
+THUMBNAIL_COLORSCALE = [
+    [0.0, "rgba(0,0,0,0)"],
+    [1 / 255, "#E6E6E6"],
+    [1.0, "#4D4D4D"],
+]
+
+
+def condition_name(sample: str) -> str:
+    condition = REPLICATE_SUFFIX.sub("", sample)
+    return condition if condition else sample
+
+
+def group_replicates(sample_columns: List[str]) -> Dict[str, List[str]]:
+    """
+    Samples grouped by condition (their names without the replicate suffix), in order of appearance.
+    """
+    groups: Dict[str, List[str]] = {}
+    for sample in sample_columns:
+        groups.setdefault(condition_name(sample), []).append(sample)
+    return groups
+
+
+class ScatterMatrixCard:
+    """
+    Density thumbnails of every pair of samples with their correlations.
+
+    The lower triangle shows the 2D log count histogram of each pair (binned
+    on first view and cached per normalization), the upper triangle the Spearman correlation, and
+    replicates of a condition are placed next to each other. Clicking a
+    pair opens it in the scatter plot card.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+
+    def groups(self, state) -> Dict[str, List[str]]:
+        return group_replicates(state.sample_columns)
+
+    def samples(self, state) -> List[str]:
+        return [sample for group in self.groups(state).values() for sample in group]
+
+    def create_card(self, card_style):
+        return html.Div(
+            [
+                html.H3("Sample Scatter Matrix"),
+                html.P(
+                    "Lower triangle: log10(count+1) density of each pair of samples. "
+                    "Upper triangle: Spearman correlation. "
+                    "Click a pair to open it in the scatter plot."
+                ),
+                self.create_replicate_summary(),
+                dcc.Graph(
+                    id="scatter-matrix-plot",
+                    figure=self.create_scatter_matrix(),
+                    config={
+                        "displayModeBar": True,
+                        "modeBarButtonsToRemove": [
+                            "select2d",
+                            "lasso2d",
+                            "autoScale2d",
+                            "hoverClosestCartesian",
+                            "hoverCompareCartesian",
+                            "toggleSpikelines",
+                        ],
+                        "displaylogo": False,
+                    },
+                ),
+                dcc.Store(id="scatter-matrix-scroll"),
+            ],
+            className="card",
+            style=card_style,
+        )
+
+    def create_replicate_summary(self):
+        """
+        Mean correlation between the replicates of each condition.
+        """
+        state = self.parent.state
+        correlations = state.correlation_matrix
+        items = []
+        for condition, samples in self.groups(state).items():
+            if len(samples) < 2 or len(samples) == len(state.sample_columns):
+                continue
+            values = correlations.loc[samples, samples].to_numpy()
+            mean = values[np.triu_indices(len(samples), k=1)].mean()
+            items.append(
+                html.Li(f"{condition}: {len(samples)} replicates, mean {mean:.3f}")
+            )
+        if not items:
+            return html.Div()
+        return html.Div(
+            [html.Label("Replicate correlation (Spearman):"), html.Ul(items)]
+        )
+
+    def create_scatter_matrix(self, normalization="raw"):
+        state = self.parent.state
+        samples = self.samples(state)
+        n = len(samples)
+        fig = go.Figure()
+        if n < 2:
+            fig.update_layout(title="The scatter matrix needs at least two samples")
+            return fig
+
+        normalization = normalization or "raw"
+        pair_histograms = state.normalized_counts.pair_histograms(normalization)
+        # Bins the pairs not cached yet in parallel, once per normalization
+        pair_histograms.compute(samples)
+        bins = pair_histograms.bins
+        cell = bins + THUMBNAIL_GAP
+
+        # One heatmap per row of thumbnails, holding the pairs left of the diagonal
+        for i in range(1, n):
+            z = np.zeros((bins, i * cell - THUMBNAIL_GAP), dtype=np.uint8)
+            for j in range(i):
+                counts = pair_histograms.get(samples[j], samples[i])
+                scaled = np.log1p(counts)
+                if scaled.max() > 0:
+                    scaled = np.where(counts > 0, 1 + 254 * scaled / scaled.max(), 0)
+                # Rows flipped so that low counts are at the bottom of the thumbnail
+                z[:, j * cell : j * cell + bins] = np.rint(scaled[::-1])
+            fig.add_trace(
+                go.Heatmap(
+                    z=z,
+                    x0=0,
+                    dx=1,
+                    y0=i * cell,
+                    dy=1,
+                    zmin=0,
+                    zmax=255,
+                    colorscale=THUMBNAIL_COLORSCALE,
+                    showscale=False,
+                    hoverinfo="none",
+                )
+            )
+
+        correlations = state.correlation_matrix.loc[samples, samples].to_numpy()
+        upper = np.triu(np.ones((n, n), dtype=bool), k=1)
+        z = np.where(upper, correlations, np.nan)
+        text = [
+            [
+                f"{samples[j]} vs {samples[i]}<br>Spearman: {correlations[i, j]:.3f}"
+                for j in range(n)
+            ]
+            for i in range(n)
+        ]
+        fig.add_trace(
+            go.Heatmap(
+                z=z,
+                x0=(bins - 1) / 2,
+                dx=cell,
+                y0=(bins - 1) / 2,
+                dy=cell,
+                zmin=float(np.nanmin(z)),
+                zmax=1.0,
+                colorscale="Blues",
+                text=text,
+                texttemplate="%{z:.2f}",
+                hovertemplate="%{text}<extra></extra>",
+                hoverongaps=False,
+                xgap=THUMBNAIL_GAP,
+                ygap=THUMBNAIL_GAP,
+                colorbar=dict(title="Spearman"),
+            )
+        )
+
+        # Outline the replicates of each condition
+        start = 0
+        for group in self.groups(state).values():
+            end = start + len(group)
+            if 1 < len(group) < n:
+                fig.add_shape(
+                    type="rect",
+                    x0=start * cell - 1.5,
+                    x1=end * cell - THUMBNAIL_GAP + 0.5,
+                    y0=start * cell - 1.5,
+                    y1=end * cell - THUMBNAIL_GAP + 0.5,
+                    line=dict(color=self.parent.THEME_COLOR, width=2),
+                )
+            start = end
+
+        centers = np.arange(n) * cell + (bins - 1) / 2
+        axis = dict(
+            tickvals=centers,
+            ticktext=samples,
+            showgrid=False,
+            zeroline=False,
+            range=[-2, n * cell - THUMBNAIL_GAP + 1],
+        )
+        size = int(np.clip(n * 60, 400, 1200))
+        fig.update_layout(
+            title=f"Sample Scatter Matrix ({NORMALIZATION_METHODS[normalization]})",
+            xaxis=dict(axis, tickangle=-45),
+            # Reversed so that the matrix reads top-down like the correlation matrix
+            yaxis=dict(axis, range=axis["range"][::-1], scaleanchor="x"),
+            width=size + 200,
+            height=size + 150,
+            plot_bgcolor="white",
+        )
+        return fig
+
+    def clicked_pair(self, click_data):
+        """
+        The (x, y) samples of the clicked thumbnail or correlation, none on the diagonal and gaps.
+        """
+        state = self.parent.state
+        if not click_data or not click_data.get("points"):
+            return None
+        pair_histograms = state.normalized_counts.pair_histograms("raw")
+        cell = pair_histograms.bins + THUMBNAIL_GAP
+        point = click_data["points"][0]
+        j, i = int((point["x"] + 0.5) // cell), int((point["y"] + 0.5) // cell)
+        samples = self.samples(state)
+        if i == j or not (0 <= i < len(samples) and 0 <= j < len(samples)):
+            return None
+        return samples[j], samples[i]
+
+    def register_callbacks(self, app):
+        @app.callback(
+            Output("scatter-matrix-plot", "figure"),
+            [Input("normalization-dropdown", "value")],
+        )
+        def update_scatter_matrix(normalization):
+            return self.create_scatter_matrix(normalization)
+
+        @app.callback(
+            [
+                Output("x-axis-dropdown", "value"),
+                Output("y-axis-dropdown", "value"),
+            ],
+            [Input("scatter-matrix-plot", "clickData")],
+            prevent_initial_call=True,
+        )
+        def open_pair(click_data):
+            pair = self.clicked_pair(click_data)
+            if pair is None:
+                raise PreventUpdate
+            return pair
+
+        # Bring the scatter plot of the opened pair into view
+        app.clientside_callback(
+            """
+            function(clickData) {
+                const card = document.getElementById("scatter-and-data");
+                if (clickData && card) {
+                    card.scrollIntoView({behavior: "smooth"});
+                }
+                return null;
+            }
+            """,
+            Output("scatter-matrix-scroll", "data"),
+            [Input("scatter-matrix-plot", "clickData")],
+            prevent_initial_call=True,
+        )
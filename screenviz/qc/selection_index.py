@@ -0,0 +1,81 @@
+# screenviz.qc.selection_index
+
+from typing import Optional
+
+import numpy as np
+
+
+def points_in_polygon(
+    x: np.ndarray, y: np.ndarray, poly_x: np.ndarray, poly_y: np.ndarray
+) -> np.ndarray:
+    """
+    Even-odd rule point-in-polygon test, vectorized over the points.
+    """
+    inside = np.zeros(x.shape[0], dtype=bool)
+    next_x = np.roll(poly_x, -1)
+    next_y = np.roll(poly_y, -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for xi, yi, xj, yj in zip(poly_x, poly_y, next_x, next_y):
+            crosses = (yi > y) != (yj > y)
+            x_intersect = (xj - xi) * (y - yi) / (yj - yi) + xi
+            inside ^= crosses & (x < x_intersect)
+    return inside
+
+
+class SelectionIndex:
+    """
+    Sorted-by-x index over a single (sample, sample) plane.
+
+    Box and lasso selections are resolved by binary searching the x-bounds of
+    the selection and only testing the points within that band.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray):
+        self.order = np.argsort(x, kind="stable")
+        self.x = np.ascontiguousarray(x[self.order])
+        self.y = np.ascontiguousarray(y[self.order])
+
+    def __len__(self):
+        return self.order.size
+
+    def _band(self, x0: float, x1: float) -> slice:
+        start = np.searchsorted(self.x, x0, side="left")
+        stop = np.searchsorted(self.x, x1, side="right")
+        return slice(start, stop)
+
+    def query_range(self, selection_range: dict) -> np.ndarray:
+        """
+        Row indices (ascending) of the points within a rectangular selection.
+        """
+        x0, x1 = sorted(selection_range["x"])
+        y0, y1 = sorted(selection_range["y"])
+        band = self._band(x0, x1)
+        y = self.y[band]
+        hits = self.order[band][(y >= y0) & (y <= y1)]
+        return np.sort(hits)
+
+    def query_lasso(self, lasso_points: dict) -> np.ndarray:
+        """
+        Row indices (ascending) of the points within a lasso selection.
+        """
+        poly_x = np.asarray(lasso_points["x"], dtype=float)
+        poly_y = np.asarray(lasso_points["y"], dtype=float)
+        band = self._band(poly_x.min(), poly_x.max())
+        x, y = self.x[band], self.y[band]
+        candidates = np.flatnonzero((y >= poly_y.min()) & (y <= poly_y.max()))
+        inside = points_in_polygon(x[candidates], y[candidates], poly_x, poly_y)
+        return np.sort(self.order[band][candidates[inside]])
+
+    def query(self, selected_data: Optional[dict]) -> Optional[np.ndarray]:
+        """
+        Resolve a plotly `selectedData` payload to row indices.
+
+        Returns `None` if there is no active box or lasso selection.
+        """
+        if not selected_data:
+            return None
+        if selected_data.get("range"):
+            return self.query_range(selected_data["range"])
+        if selected_data.get("lassoPoints"):
+            return self.query_lasso(selected_data["lassoPoints"])
+        return None
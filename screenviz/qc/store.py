@@ -0,0 +1,271 @@
+# screenviz.qc.store
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .._dtypes import string_dtype
+from .._watch import file_signature
+from .metrics import METRIC_COLUMNS, compute_metrics
+from .utils import calculate_correlation_matrix, load_data
+
+STORE_VERSION = 2
+SIDECAR_FILE = "store.json"
+COUNTS_FILE = "counts.npy"
+LOG_COUNTS_FILE = "log_counts.npy"
+GENE_CODES_FILE = "gene_codes.npy"
+GUIDE_OFFSETS_FILE = "guide_offsets.npy"
+GUIDE_DATA_FILE = "guides.bin"
+
+
+def default_store_dir(filename: str) -> str:
+    return f"{filename}.store"
+
+
+def replace_file(path: str, data):
+    """
+    Write an array (as `.npy`) or bytes to a new file and move it over `path`.
+
+    Maps of the previous file stay valid (e.g. while a watched dashboard
+    is still serving them) instead of being truncated under the readers.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        if isinstance(data, np.ndarray):
+            np.save(f, data)
+        else:
+            f.write(data)
+    os.replace(tmp, path)
+
+
+def write_strings(values: pd.Series, offsets_file: str, data_file: str):
+    """
+    Write strings as concatenated utf-8 bytes and their int64 offsets (the arrow layout).
+    """
+    encoded = [value.encode("utf-8") for value in values.astype(str)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    replace_file(offsets_file, offsets)
+    replace_file(data_file, b"".join(encoded))
+
+
+def read_strings(offsets_file: str, data_file: str) -> pd.Series:
+    """
+    Map strings written by `write_strings`.
+
+    With pyarrow the strings are a zero-copy view over the mapped files,
+    otherwise they are decoded into python objects.
+    """
+    offsets = np.load(offsets_file, mmap_mode="r")
+    if os.path.getsize(data_file) > 0:
+        data = np.memmap(data_file, dtype=np.uint8, mode="r")
+    else:
+        data = np.zeros(0, dtype=np.uint8)
+
+    if string_dtype() is not None:
+        import pyarrow as pa
+
+        array = pa.LargeStringArray.from_buffers(
+            len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(data)
+        )
+        return pd.Series(pd.arrays.ArrowStringArray(array))
+
+    raw = data.tobytes()
+    return pd.Series(
+        [
+            raw[start:end].decode("utf-8")
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ],
+        dtype=object,
+    )
+
+
+def convert_counts(
+    filename: str,
+    store_dir: str,
+    guide_column: str,
+    gene_column: str,
+    full_precision: bool = False,
+):
+    """
+    Convert a count table once into a column-major memory-mapped store.
+
+    The raw and log10(x+1) counts are written as fortran-ordered `.npy`
+    matrices so each sample is one contiguous block of the file. Guide names
+    are written in the arrow string layout, gene names as categorical codes,
+    and the sample and gene names, the correlation matrix, the library
+    sizes and the library metrics go to a JSON sidecar.
+    """
+    start = time.perf_counter()
+    df, _, df_log, sample_columns, gene_list = load_data(
+        filename, guide_column, gene_column, full_precision
+    )
+    os.makedirs(store_dir, exist_ok=True)
+
+    replace_file(
+        os.path.join(store_dir, COUNTS_FILE),
+        np.asfortranarray(df[sample_columns].to_numpy()),
+    )
+    replace_file(
+        os.path.join(store_dir, LOG_COUNTS_FILE),
+        np.asfortranarray(df_log[sample_columns].to_numpy()),
+    )
+    genes = pd.Categorical(df[gene_column].astype(str))
+    replace_file(os.path.join(store_dir, GENE_CODES_FILE), genes.codes.astype(np.int32))
+    write_strings(
+        df[guide_column],
+        os.path.join(store_dir, GUIDE_OFFSETS_FILE),
+        os.path.join(store_dir, GUIDE_DATA_FILE),
+    )
+
+    correlation_matrix = calculate_correlation_matrix(df, sample_columns)
+    try:
+        library_metrics = compute_metrics(df, sample_columns, gene_column)
+        library_metrics = library_metrics.to_dict(orient="list")
+    except AssertionError as e:
+        # Left to the dashboard, which reports the error on the metrics card
+        print(f"Library metrics not stored: {e}", file=sys.stderr)
+        library_metrics = None
+    sidecar = {
+        "version": STORE_VERSION,
+        "source": os.path.abspath(filename),
+        "signature": list(file_signature(filename)),
+        "full_precision": full_precision,
+        "guide_column": guide_column,
+        "gene_column": gene_column,
+        "columns": df.columns.tolist(),
+        "samples": sample_columns,
+        "genes": genes.categories.tolist(),
+        "gene_list": [str(gene) for gene in gene_list],
+        "total_read_counts": df[sample_columns].sum().astype(int).tolist(),
+        "correlation_matrix": correlation_matrix.to_numpy().tolist(),
+        "library_metrics": library_metrics,
+    }
+    # Written last so an interrupted conversion is never picked up as valid
+    replace_file(
+        os.path.join(store_dir, SIDECAR_FILE), json.dumps(sidecar).encode("utf-8")
+    )
+    print(
+        f"Converted {filename} to {store_dir} in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+
+
+class CountStore:
+    """
+    Read-only view of a count store written by `convert_counts`.
+
+    Opening the store only reads the JSON sidecar and maps the matrices,
+    the frames it returns are zero-copy views whose pages are read on demand.
+    """
+
+    def __init__(self, store_dir: str):
+        with open(os.path.join(store_dir, SIDECAR_FILE), "r") as f:
+            self.sidecar = json.load(f)
+        self.store_dir = store_dir
+        self.sample_columns: List[str] = self.sidecar["samples"]
+        self.counts = np.load(os.path.join(store_dir, COUNTS_FILE), mmap_mode="r")
+        self.log_counts = np.load(
+            os.path.join(store_dir, LOG_COUNTS_FILE), mmap_mode="r"
+        )
+
+    def is_current(
+        self, filename: str, guide_column: str, gene_column: str, full_precision: bool
+    ) -> bool:
+        """
+        Check that the store was built from the current version of a file with the same options.
+        """
+        signature = file_signature(filename)
+        return (
+            self.sidecar["version"] == STORE_VERSION
+            and signature is not None
+            and list(signature) == self.sidecar["signature"]
+            and self.sidecar["guide_column"] == guide_column
+            and self.sidecar["gene_column"] == gene_column
+            and self.sidecar["full_precision"] == full_precision
+        )
+
+    def metadata_frame(self) -> pd.DataFrame:
+        store_dir = self.store_dir
+        guides = read_strings(
+            os.path.join(store_dir, GUIDE_OFFSETS_FILE),
+            os.path.join(store_dir, GUIDE_DATA_FILE),
+        )
+        codes = np.load(os.path.join(store_dir, GENE_CODES_FILE), mmap_mode="r")
+        genes = pd.Categorical.from_codes(
+            codes, categories=self.sidecar["genes"], validate=False
+        )
+        return pd.DataFrame(
+            {self.sidecar["guide_column"]: guides, self.sidecar["gene_column"]: genes}
+        )
+
+    def frames(
+        self,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, List[str], List[str]]:
+        """
+        The frames of `load_data` as views over the mapped matrices.
+        """
+        meta = self.metadata_frame()
+        df = pd.concat(
+            [
+                meta,
+                pd.DataFrame(self.counts, columns=self.sample_columns, copy=False),
+            ],
+            axis=1,
+        )[self.sidecar["columns"]]
+        df_log = pd.concat(
+            [
+                meta,
+                pd.DataFrame(self.log_counts, columns=self.sample_columns, copy=False),
+            ],
+            axis=1,
+        )[self.sidecar["columns"]]
+        # Separate (lazily copied) frames as the scatter card adds columns to `df_normal`
+        df_normal = df.copy(deep=False)
+        return (df, df_normal, df_log, self.sample_columns, self.sidecar["gene_list"])
+
+    def summaries(self) -> Dict:
+        """
+        The correlation matrix, library sizes and library metrics computed at conversion.
+        """
+        summaries = dict(
+            correlation_matrix=pd.DataFrame(
+                self.sidecar["correlation_matrix"],
+                index=self.sample_columns,
+                columns=self.sample_columns,
+            ),
+            total_read_counts=pd.Series(
+                self.sidecar["total_read_counts"], index=self.sample_columns
+            ),
+        )
+        if self.sidecar["library_metrics"] is not None:
+            summaries["library_metrics"] = pd.DataFrame(
+                self.sidecar["library_metrics"]
+            )[["sample", *METRIC_COLUMNS]]
+        return summaries
+
+
+def open_store(
+    filename: str,
+    guide_column: str,
+    gene_column: str,
+    full_precision: bool = False,
+    store_dir: Optional[str] = None,
+) -> CountStore:
+    """
+    Open the count store of a file, converting it first if it is missing or out of date.
+    """
+    store_dir = store_dir or default_store_dir(filename)
+    if os.path.exists(os.path.join(store_dir, SIDECAR_FILE)):
+        store = CountStore(store_dir)
+        if store.is_current(filename, guide_column, gene_column, full_precision):
+            return store
+        print(f"Count store {store_dir} is out of date, rebuilding", file=sys.stderr)
+        os.remove(os.path.join(store_dir, SIDECAR_FILE))
+    convert_counts(filename, store_dir, guide_column, gene_column, full_precision)
+    return CountStore(store_dir)
@@ -5,11 +5,18 @@ from typing import List, Tuple
 import numpy as np
 import pandas as pd
 
+from .._dtypes import read_table
+
 
 def load_data(
-    filename: str, guide_column: str, gene_column: str
+    filename: str, guide_column: str, gene_column: str, full_precision: bool = False
 ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, List[str], List[str]]:
-    frame = pd.read_csv(filename, sep="\t")
+    frame = read_table(
+        filename,
+        categorical_columns=[gene_column],
+        string_columns=[guide_column],
+        full_precision=full_precision,
+    )
     sample_columns = [
         col for col in frame.columns if col not in [guide_column, gene_column]
     ]
@@ -17,6 +24,8 @@ def load_data(
     df_normal = df.copy()
     df_log = df.copy()
     df_log[sample_columns] = np.log10(df[sample_columns] + 1)
+    if not full_precision:
+        df_log[sample_columns] = df_log[sample_columns].astype(np.float32)
     gene_list = sorted(df[gene_column].unique())
     return (df, df_normal, df_log, sample_columns, gene_list)
 
@@ -25,3 +34,23 @@ def calculate_correlation_matrix(
     df: pd.DataFrame, sample_columns: List[str], method: str = "spearman"
 ) -> pd.DataFrame:
     return df[sample_columns].corr(method=method)
+
+
+def unchanged_samples(
+    previous: pd.DataFrame,
+    df: pd.DataFrame,
+    sample_columns: List[str],
+    key_columns: List[str],
+) -> List[str]:
+    """
+    The samples of `df` with the same counts in `previous` (none unless the guides and genes are the same).
+    """
+
+    def same(column: str) -> bool:
+        return column in previous.columns and np.array_equal(
+            previous[column].to_numpy(), df[column].to_numpy()
+        )
+
+    if len(previous) != len(df) or not all(same(c) for c in key_columns):
+        return []
+    return [sample for sample in sample_columns if same(sample)]
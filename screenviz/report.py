@@ -0,0 +1,375 @@
+# screenviz.report
+
+import multiprocessing as mp
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from ._dtypes import read_table
+from .compare import CompareScreens
+from .formats import LEVEL_COLUMNS, read_results, resolve_format
+from .gene import VisualizeGenes
+from .results.screens import result_files
+from .sgrna import VisualizeSGRNAs
+
+STAGES = ["gene", "sgrna", "compare", "idea", "dashboard"]
+
+# Output options shared by the plotting stages
+OUTPUT_OPTIONS = ["format", "plotlyjs", "precision", "rasterize"]
+
+# Defaults matching the `crispr_screen` result files
+STAGE_DEFAULTS = {
+    "gene": dict(output="gene_volcano.html", fc_column="log2fc"),
+    "sgrna": dict(
+        output="sgrna_volcano.html", fc_column="log2fc", pval_column="pvalue_twosided"
+    ),
+    "compare": dict(output="comparison.html"),
+    "idea": dict(
+        output="network",
+        fc_column="log2fc",
+        pval_column="fdr",
+        threshold_column="fdr",
+        threshold=0.1,
+        term_threshold=0.1,
+        geneset=["BP"],
+        sided=None,
+        top=30,
+    ),
+    "dashboard": dict(output="dashboard.html"),
+}
+
+# Columns whose -log10 transform is shared by the volcano stages
+LOG_COLUMNS = ["pvalue", "pvalue_twosided", "fdr"]
+
+# Set in the parent before forking the stage workers, which inherit the loaded frames
+_ACTIVE_REPORT = None
+
+
+class Report:
+    """
+    A report pipeline described by a YAML spec.
+
+    Every input table is loaded once into a shared typed frame (along with the
+    derived -log10 columns) and the independent output stages then run
+    concurrently, each on a shallow copy of the shared frames. Native tool
+    outputs are read with the screenviz columns (see `screenviz.formats`).
+
+    ```yaml
+    prefix: results              # or `gene_file` and `sgrna_file`
+    input_format: mageck         # optional, detected from the headers by default
+    output_dir: report
+    threads: 4
+    defaults:                    # output options of every plotting stage
+      plotlyjs: directory
+      precision: 4
+    outputs:
+      - type: gene
+        config: results.screenviz.yaml
+      - type: sgrna
+      - type: compare
+        screen_b: other.gene_results.tsv
+      - type: idea
+        geneset: [BP, MF]
+      - type: dashboard
+    ```
+    """
+
+    def __init__(self, spec: Dict, threads: Optional[int] = None):
+        assert "outputs" in spec, "The report spec must have an 'outputs' key"
+        if "prefix" in spec:
+            self.sgrna_file, self.gene_file = result_files(spec["prefix"])
+        else:
+            self.gene_file = spec.get("gene_file")
+            self.sgrna_file = spec.get("sgrna_file")
+
+        self.output_dir = spec.get("output_dir", ".")
+        self.threads = threads or spec.get("threads") or os.cpu_count()
+        self.full_precision = spec.get("full_precision", False)
+        self.input_format = spec.get("input_format")
+        self.ntc_token = spec.get("ntc_token", "non-targeting")
+        self.amalgam_token = spec.get("amalgam_token", "amalgam")
+        self.defaults = spec.get("defaults", {})
+
+        self.stages = [self.parse_stage(stage) for stage in spec["outputs"]]
+        self.frames = {}
+        self.formats = {}
+
+    @classmethod
+    def from_yaml(cls, filename: str, threads: Optional[int] = None) -> "Report":
+        with open(filename, "r") as f:
+            return cls(yaml.safe_load(f), threads=threads)
+
+    def parse_stage(self, stage: Dict) -> Dict:
+        assert "type" in stage, "Every report output must have a 'type' key"
+        assert stage["type"] in STAGES, f"Report output type must be one of {STAGES}"
+        kind = stage["type"]
+        options = {**STAGE_DEFAULTS[kind], **stage}
+
+        if kind in ["gene", "idea"]:
+            options.setdefault("input", self.gene_file)
+        elif kind == "sgrna":
+            options.setdefault("input", self.sgrna_file)
+        elif kind == "compare":
+            options.setdefault("screen_a", self.gene_file)
+            assert "screen_b" in options, "Compare outputs must have a 'screen_b' key"
+        elif kind == "dashboard":
+            assert self.gene_file and self.sgrna_file, (
+                "Dashboard outputs require both a gene and an sgRNA file"
+            )
+        for key in ["input", "screen_a"]:
+            if key in options:
+                assert options[key] is not None, (
+                    f"No input file for the {kind} output, set `prefix` or `{key}`"
+                )
+        options["output"] = os.path.join(self.output_dir, options["output"])
+        return options
+
+    def input_files(self) -> Dict[str, str]:
+        """
+        The level ("gene" or "sgrna") of every input file, in order of use.
+        """
+        files = {}
+        for stage in self.stages:
+            if stage["type"] == "dashboard":
+                candidates = [(self.sgrna_file, "sgrna"), (self.gene_file, "gene")]
+            elif stage["type"] == "sgrna":
+                candidates = [(stage["input"], "sgrna")]
+            else:
+                candidates = [
+                    (stage.get(k), "gene") for k in ["input", "screen_a", "screen_b"]
+                ]
+            for filename, level in candidates:
+                if filename is not None and filename not in files:
+                    files[filename] = level
+        return files
+
+    def threshold_columns(self, filename: str) -> List[str]:
+        """
+        The p-value and threshold columns the stages read from an input file.
+        """
+        columns = []
+        for stage in self.stages:
+            for suffix in ["", "_a", "_b"]:
+                key = f"screen{suffix}" if suffix else "input"
+                if stage.get(key) != filename:
+                    continue
+                for option in ["pval_column", "variable_column", "threshold_column"]:
+                    if f"{option}{suffix}" in stage:
+                        columns.append(stage[f"{option}{suffix}"])
+        return columns
+
+    def load_frame(self, filename: str, level: str) -> pd.DataFrame:
+        """
+        Read an input file, through its format unless it has the crispr_screen columns.
+        """
+        result_format = resolve_format(
+            filename, level, LEVEL_COLUMNS[level], self.input_format
+        )
+        self.formats[filename] = result_format
+        if result_format is not None:
+            df = read_results(
+                filename,
+                level,
+                format=result_format.name,
+                full_precision=self.full_precision,
+            )
+        else:
+            df = read_table(
+                filename,
+                categorical_columns=["gene"],
+                string_columns=["sgrna"],
+                full_precision=self.full_precision,
+                precise_columns=self.threshold_columns(filename),
+            )
+        for col in LOG_COLUMNS:
+            if col in df.columns:
+                df[f"log_{col}"] = -np.log10(df[col])
+        return df
+
+    def load(self):
+        """
+        Load every input table once, concurrently.
+        """
+        files = self.input_files()
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(len(files), self.threads))
+        ) as pool:
+            frames = pool.map(self.load_frame, files.keys(), files.values())
+            self.frames = dict(zip(files, frames))
+
+    def check_reported(self, stage: Dict):
+        """
+        Check that the tools of a stage's inputs report the columns it plots.
+        """
+        kind = stage["type"]
+        if kind == "gene" and "config" not in stage:
+            checks = {
+                stage["input"]: [
+                    stage.get("pval_column", "pvalue"),
+                    stage.get("threshold_column", "fdr"),
+                ]
+            }
+        elif kind == "idea":
+            checks = {stage["input"]: [stage["pval_column"], stage["threshold_column"]]}
+        elif kind == "compare":
+            checks = {
+                stage[f"screen_{screen}"]: [
+                    stage.get(f"variable_column_{screen}", "pvalue"),
+                    stage.get(f"threshold_column_{screen}", "fdr"),
+                ]
+                for screen in ["a", "b"]
+            }
+        else:
+            checks = {}
+        for filename, columns in checks.items():
+            if self.formats.get(filename) is not None:
+                self.formats[filename].check_reported(columns)
+
+    def _output_options(self, stage: Dict) -> Dict:
+        return {
+            key: stage[key] if key in stage else self.defaults[key]
+            for key in OUTPUT_OPTIONS
+            if key in stage or key in self.defaults
+        }
+
+    def _class_options(self, stage: Dict, exclude: List[str]) -> Dict:
+        skip = set(exclude + OUTPUT_OPTIONS + ["type", "output"])
+        return {k: v for k, v in stage.items() if k not in skip}
+
+    def run_stage(self, index: int) -> float:
+        stage = self.stages[index]
+        kind = stage["type"]
+        start = time.perf_counter()
+        self.check_reported(stage)
+
+        if kind == "gene":
+            vg = VisualizeGenes(
+                filename=stage["input"],
+                full_precision=self.full_precision,
+                dataframe=self.frames[stage["input"]],
+                **self._class_options(stage, ["input"]),
+            )
+            vg.plot_volcano(output=stage["output"], **self._output_options(stage))
+        elif kind == "sgrna":
+            sg = VisualizeSGRNAs(
+                filename=stage["input"],
+                full_precision=self.full_precision,
+                dataframe=self.frames[stage["input"]],
+                **self._class_options(stage, ["input"]),
+            )
+            sg.plot_volcano(output=stage["output"], **self._output_options(stage))
+        elif kind == "compare":
+            cs = CompareScreens(
+                filename_a=stage["screen_a"],
+                filename_b=stage["screen_b"],
+                full_precision=self.full_precision,
+                dataframe_a=self.frames[stage["screen_a"]],
+                dataframe_b=self.frames[stage["screen_b"]],
+                **self._class_options(stage, ["screen_a", "screen_b"]),
+            )
+            cs.plot_volcano(output=stage["output"], **self._output_options(stage))
+        elif kind == "idea":
+            # Imported here so the other stages run without the IDEA dependencies
+            from .idea import RunIDEA
+
+            options = self._class_options(stage, ["input"])
+            gene_column = options.pop("gene_column", "gene")
+            frame = self.frames[stage["input"]]
+            RunIDEA(
+                filename=stage["input"],
+                output=stage["output"],
+                gene_column=gene_column,
+                dataframe=frame.astype({gene_column: str}),
+                **options,
+            )
+        elif kind == "dashboard":
+            from .results.static import write_static_dashboard
+
+            output_options = self._output_options(stage)
+            print(f"Saving static dashboard to: {stage['output']}", file=sys.stderr)
+            write_static_dashboard(
+                sgrna_file=self.sgrna_file,
+                gene_file=self.gene_file,
+                output=stage["output"],
+                ntc_token=self.ntc_token,
+                amalgam_token=self.amalgam_token,
+                sgrna_frame=self.frames[self.sgrna_file],
+                gene_frame=self.frames[self.gene_file],
+                plotlyjs=output_options.get("plotlyjs", "embed"),
+                precision=output_options.get("precision"),
+            )
+        return time.perf_counter() - start
+
+    def run(self) -> List[Dict]:
+        """
+        Load the inputs once and run every output stage concurrently.
+
+        Stages run in forked worker processes (which inherit the loaded frames
+        without copying them) where available and in threads otherwise. A
+        failed stage is reported without stopping the others, and the failed
+        stages are returned.
+        """
+        global _ACTIVE_REPORT
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.load()
+        print(
+            f"Loaded {len(self.frames)} input file(s) in {time.perf_counter() - start:.2f}s",
+            file=sys.stderr,
+        )
+        indices = range(len(self.stages))
+        workers = max(1, min(len(self.stages), self.threads))
+        if workers > 1 and "fork" in mp.get_all_start_methods():
+            _ACTIVE_REPORT = self
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=mp.get_context("fork")
+                ) as pool:
+                    results = list(pool.map(_run_active_stage, indices))
+            finally:
+                _ACTIVE_REPORT = None
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self.try_stage, indices))
+
+        failed = []
+        for stage, (elapsed, error) in zip(self.stages, results):
+            if error is None:
+                status = f"{elapsed:.2f}s"
+            else:
+                status = f"failed after {elapsed:.2f}s ({error})"
+                failed.append(stage)
+            print(f"{stage['type']} -> {stage['output']}: {status}", file=sys.stderr)
+        print(f"Report finished in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        return failed
+
+    def try_stage(self, index: int) -> Tuple[float, Optional[str]]:
+        """
+        Run a stage, returning its error instead of raising it so the other stages still run.
+        """
+        start = time.perf_counter()
+        try:
+            return self.run_stage(index), None
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def _run_active_stage(index: int) -> Tuple[float, Optional[str]]:
+    return _ACTIVE_REPORT.try_stage(index)
+
+
+def RunReport(config: str, threads: Optional[int] = None):
+    """
+    Run the report pipeline described by a YAML spec.
+    """
+    failed = Report.from_yaml(config, threads=threads).run()
+    if failed:
+        sys.exit(f"{len(failed)} of the report outputs failed")
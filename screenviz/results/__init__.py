@@ -1,12 +1,97 @@
 # screenviz.results.__init__
 
+import os
+
+from .._launch import launch_dashboard
+from .._profiling import build_profiler
 from .app import ResultsDashApp
+from .browser import ScreenBrowserApp
+from .screens import DEFAULT_MEMORY_BUDGET_MB
 
 
 def results_app_entry(
-    sgrna_file, gene_file, port=8050, ntc_token="non-targeting", amalgam_token="amalgam"
+    sgrna_file,
+    gene_file,
+    port=8050,
+    ntc_token="non-targeting",
+    amalgam_token="amalgam",
+    profile=False,
+    profile_dir=None,
+    profile_backend="cprofile",
+    full_precision=False,
+    watch=False,
+    gene_index=None,
+    count_file=None,
+    guide_column="Guide",
+    reuse=True,
+):
+    launch_dashboard(
+        "results",
+        [sgrna_file, gene_file] + ([count_file] if count_file else []),
+        dict(
+            guide_column=guide_column,
+            ntc_token=ntc_token,
+            amalgam_token=amalgam_token,
+            full_precision=full_precision,
+            gene_index=os.path.abspath(gene_index) if gene_index else None,
+            watch=watch,
+            profile=profile,
+            profile_dir=os.path.abspath(profile_dir) if profile_dir else None,
+            profile_backend=profile_backend,
+        ),
+        lambda: ResultsDashApp(
+            sgrna_file,
+            gene_file,
+            ntc_token=ntc_token,
+            amalgam_token=amalgam_token,
+            profiler=build_profiler(profile, profile_dir, profile_backend),
+            full_precision=full_precision,
+            watch=watch,
+            gene_index=gene_index,
+            count_file=count_file,
+            guide_column=guide_column,
+        ),
+        port=port,
+        reuse=reuse,
+        watch=watch,
+    )
+
+
+def results_browser_entry(
+    directory,
+    port=8050,
+    ntc_token="non-targeting",
+    amalgam_token="amalgam",
+    profile=False,
+    profile_dir=None,
+    profile_backend="cprofile",
+    full_precision=False,
+    memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+    gene_index=None,
+    reuse=True,
 ):
-    app = ResultsDashApp(
-        sgrna_file, gene_file, ntc_token=ntc_token, amalgam_token=amalgam_token
+    launch_dashboard(
+        "results-browser",
+        [directory],
+        dict(
+            ntc_token=ntc_token,
+            amalgam_token=amalgam_token,
+            full_precision=full_precision,
+            gene_index=os.path.abspath(gene_index) if gene_index else None,
+            memory_budget_mb=memory_budget_mb,
+            profile=profile,
+            profile_dir=os.path.abspath(profile_dir) if profile_dir else None,
+            profile_backend=profile_backend,
+        ),
+        lambda: ScreenBrowserApp(
+            directory,
+            ntc_token=ntc_token,
+            amalgam_token=amalgam_token,
+            profiler=build_profiler(profile, profile_dir, profile_backend),
+            full_precision=full_precision,
+            memory_budget_mb=memory_budget_mb,
+            gene_index=gene_index,
+        ),
+        port=port,
+        reuse=reuse,
     )
-    app.run(debug=True, port=port)
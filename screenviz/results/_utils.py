@@ -1,34 +1,70 @@
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
 
-REQ_SGRNA = ["sgrna", "gene", "log2fc", "pvalue_twosided", "fdr", "base"]
-REQ_GENES = ["gene", "log2fc", "pvalue", "fdr"]
+from ..formats import GENE_COLUMNS, SGRNA_COLUMNS, read_results
 
+REQ_SGRNA = SGRNA_COLUMNS
+REQ_GENES = GENE_COLUMNS
 
-def load_dataframe(filename: str, required_columns: List[str]) -> pd.DataFrame:
+
+def load_dataframe(
+    filename: str,
+    level: str,
+    required_columns: List[str],
+    full_precision: bool = False,
+    format: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Load a results dataframe of any known format and check that it has the required columns.
+
+    The format is detected from the header and its columns are mapped to
+    the crispr_screen names. Gene names are loaded as categoricals, sgRNA
+    names as pyarrow strings and numeric columns are downcast to 32 bits
+    unless `full_precision` is set.
     """
-    Load a dataframe from a file and check that it has the required columns.
+    df = read_results(filename, level, format=format, full_precision=full_precision)
+    check_columns(df, required_columns)
+    return df
+
+
+def check_columns(df: pd.DataFrame, required_columns: List[str]):
+    """
+    Check that a (possibly preloaded) dataframe has the required columns.
     """
-    df = pd.read_csv(filename, sep="\t")
     for col in required_columns:
         assert col in df.columns, f"The input file must have a column named {col}"
-    return df
 
 
 def load_gene_dataframe(
     filename: str,
+    full_precision: bool = False,
+    format: Optional[str] = None,
 ) -> pd.DataFrame:
     """
     Load a gene dataframe from a file and check that it has the required columns.
     """
-    return load_dataframe(filename, required_columns=REQ_GENES)
+    return load_dataframe(
+        filename,
+        "gene",
+        required_columns=REQ_GENES,
+        full_precision=full_precision,
+        format=format,
+    )
 
 
 def load_sgrna_dataframe(
     filename: str,
+    full_precision: bool = False,
+    format: Optional[str] = None,
 ) -> pd.DataFrame:
     """
     Load an sgRNA dataframe from a file and check that it has the required columns.
     """
-    return load_dataframe(filename, required_columns=REQ_SGRNA)
+    return load_dataframe(
+        filename,
+        "sgrna",
+        required_columns=REQ_SGRNA,
+        full_precision=full_precision,
+        format=format,
+    )
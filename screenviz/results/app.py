@@ -1,10 +1,33 @@
 # screenviz.results.app
 
+from typing import Optional
+
 import dash
 from dash import dcc, html
 
+from .._launch import serve
+from .._profiling import CallbackProfiler
+from .._startup import StartupLoader
+from .._watch import Watcher, should_start_watcher
+from ._utils import load_gene_dataframe
 from .gene_card import GeneCard
+from .lookup_card import GeneLookupCard
 from .sgrna_card import SGRNACard
+from .sgrna_index import load_count_dataframe
+
+
+class ResultsCards:
+    """
+    The sgRNA and gene cards of the dashboard.
+
+    A reload builds new cards and swaps them in together with a single
+    assignment of `app.state`: the callbacks resolve their card once per
+    request and never see the sgRNAs of one version with the genes of another.
+    """
+
+    def __init__(self, sgrna_card: SGRNACard, gene_card: GeneCard):
+        self.sgrna_card = sgrna_card
+        self.gene_card = gene_card
 
 
 class ResultsDashApp:
@@ -14,46 +37,218 @@ class ResultsDashApp:
         gene_file: str,
         ntc_token: str = "non-targeting",
         amalgam_token="amalgam",
+        profiler: Optional[CallbackProfiler] = None,
+        full_precision: bool = False,
+        watch: bool = False,
+        gene_index: Optional[str] = None,
+        count_file: Optional[str] = None,
+        guide_column: str = "Guide",
+        background: bool = True,
     ):
-        self.app = dash.Dash(__name__)
+        # Tabs are rendered once their data is loaded, after the callbacks are registered
+        self.app = dash.Dash(__name__, suppress_callback_exceptions=True)
+        self.profiler = profiler
+        self.sgrna_file = sgrna_file
+        self.gene_file = gene_file
+        self.ntc_token = ntc_token
+        self.amalgam_token = amalgam_token
+        self.full_precision = full_precision
+        self.count_file = count_file
+        self.guide_column = guide_column
 
-        # Initialize the cards
-        self.sgrna_card = SGRNACard(sgrna_file, ntc_token=ntc_token)
-        self.gene_card = GeneCard(
-            gene_file=gene_file, sgrna_file=sgrna_file, amalgam_token=amalgam_token
+        # Initialize the cards (their tables are loaded by the startup steps)
+        self.state = ResultsCards(
+            SGRNACard(
+                sgrna_file,
+                ntc_token=ntc_token,
+                full_precision=full_precision,
+                defer=True,
+            ),
+            GeneCard(
+                gene_file=gene_file,
+                sgrna_file=sgrna_file,
+                amalgam_token=amalgam_token,
+                full_precision=full_precision,
+                defer=True,
+            ),
         )
         # self.idea_card = IDEACard(idea_file)
+        self.lookup_card = GeneLookupCard(gene_index) if gene_index else None
+
+        if self.profiler is not None:
+            cards = [self.state.sgrna_card, self.state.gene_card, self.lookup_card]
+            self.profiler.instrument(self.app, [c for c in cards if c is not None])
 
-        self.app.layout = self.create_layout()
+        self.startup = self.create_startup()
+        self.watcher = (
+            Watcher({sgrna_file: self.reload_sgrna, gene_file: self.reload_gene})
+            if watch
+            else None
+        )
+        # Watched dashboards render the layout on every page load to show reloaded data
+        self.app.layout = self.create_layout if watch else self.create_layout()
         self.register_callbacks()
 
+        if not background:
+            self.startup.start()
+            if not self.startup.wait():
+                raise RuntimeError(
+                    f"Failed to load {sgrna_file} / {gene_file}: {self.startup.errors}"
+                )
+
+    def create_startup(self) -> StartupLoader:
+        """
+        The loading steps and the tabs waiting on them.
+
+        The sgRNA and gene tables are read concurrently, the gene card then
+        shares the sgRNA frame of the sgRNA card instead of reading it again.
+        The count matrix (if any) is read alongside and joined to the sgRNAs
+        of the gene drill-down.
+        """
+        startup = StartupLoader()
+        gene_requires = ["sgRNA results", "gene table"]
+
+        # The startup cards are only served once their step is done
+        sgrna_card, gene_card = self.state.sgrna_card, self.state.gene_card
+
+        def load_gene_table():
+            gene_card.gene_frame = load_gene_dataframe(
+                self.gene_file, self.full_precision
+            )
+
+        def load_gene_card():
+            gene_card.sgrna_frame = sgrna_card.sgrna_frame
+            gene_card.load()
+
+        def load_counts():
+            gene_card.count_frame = load_count_dataframe(
+                self.count_file, self.guide_column, self.full_precision
+            )
+
+        startup.add_step("sgRNA results", sgrna_card.load)
+        startup.add_step("gene table", load_gene_table)
+        if self.count_file is not None:
+            startup.add_step("counts", load_counts)
+            gene_requires.append("counts")
+        startup.add_step("gene results", load_gene_card, gene_requires)
+        startup.add_section(
+            "sgrna-results",
+            "sgRNA Differential Abundance",
+            lambda: self.state.sgrna_card.layout,
+            ["sgRNA results"],
+        )
+        startup.add_section(
+            "gene-results",
+            "Gene Differential Abundance",
+            lambda: self.state.gene_card.layout,
+            ["gene results"],
+        )
+        return startup
+
+    def reload_sgrna(self):
+        """
+        Rebuild both cards against the reloaded sgRNA table, then swap them in.
+        """
+        self.startup.wait()
+        state = self.state
+        sgrna_card = SGRNACard(
+            self.sgrna_file,
+            ntc_token=self.ntc_token,
+            full_precision=self.full_precision,
+        )
+        gene_card = GeneCard(
+            gene_file=self.gene_file,
+            sgrna_file=self.sgrna_file,
+            amalgam_token=self.amalgam_token,
+            full_precision=self.full_precision,
+            gene_frame=state.gene_card.gene_frame,
+            sgrna_frame=sgrna_card.sgrna_frame,
+            count_frame=state.gene_card.count_frame,
+        )
+        self.state = ResultsCards(*self.instrument_cards(sgrna_card, gene_card))
+
+    def reload_gene(self):
+        """
+        Rebuild the gene card against the reloaded gene table, then swap it in.
+        """
+        self.startup.wait()
+        state = self.state
+        gene_card = GeneCard(
+            gene_file=self.gene_file,
+            sgrna_file=self.sgrna_file,
+            amalgam_token=self.amalgam_token,
+            full_precision=self.full_precision,
+            sgrna_frame=state.gene_card.sgrna_frame,
+            count_frame=state.gene_card.count_frame,
+        )
+        (gene_card,) = self.instrument_cards(gene_card)
+        self.state = ResultsCards(state.sgrna_card, gene_card)
+
+    def instrument_cards(self, *cards):
+        """
+        Time the figure builders of reloaded cards like those of the startup cards.
+        """
+        if self.profiler is not None:
+            for card in cards:
+                self.profiler.wrap_figure_builders(card)
+        return cards
+
     def create_layout(self):
         return html.Div(
             [
+                self.watcher.create_layout() if self.watcher else html.Div(),
                 html.H1("CRISPR Screen Results Dashboard"),
+                self.startup.create_layout(),
                 dcc.Tabs(
                     [
                         dcc.Tab(
-                            label="sgRNA Results", children=[self.sgrna_card.layout]
+                            label="sgRNA Results",
+                            children=[self.startup.create_section("sgrna-results")],
+                        ),
+                        dcc.Tab(
+                            label="Gene Results",
+                            children=[self.startup.create_section("gene-results")],
                         ),
-                        dcc.Tab(label="Gene Results", children=[self.gene_card.layout]),
                         # dcc.Tab(
                         #     label="Pathway Results", children=[self.idea_card.layout]
                         # ),
                     ]
+                    + self.lookup_tabs()
                 ),
             ]
         )
 
+    def lookup_tabs(self):
+        if self.lookup_card is None:
+            return []
+        return [dcc.Tab(label="Gene Lookup", children=[self.lookup_card.layout])]
+
     def register_callbacks(self):
-        self.sgrna_card.register_callbacks(self.app)
-        self.gene_card.register_callbacks(self.app)
+        self.state.sgrna_card.register_callbacks(
+            self.app, lambda: self.state.sgrna_card
+        )
+        self.state.gene_card.register_callbacks(self.app, lambda: self.state.gene_card)
         # self.idea_card.register_callbacks(self.app)
+        if self.lookup_card is not None:
+            self.lookup_card.register_callbacks(self.app)
+        self.startup.register_callbacks(self.app)
+        if self.watcher is not None:
+            self.watcher.register_callbacks(self.app)
 
-    def run(self, debug=True, port=8050):
-        self.app.run(debug=debug, port=port)
+    def run(self, debug=True, port=8050, sock=None):
+        # Only load from the serving process, not from the parent of the debug reloader
+        # (pre-bound sockets are served without the reloader)
+        serving = should_start_watcher(debug and sock is None)
+        if serving:
+            self.startup.start()
+        if self.watcher is not None and serving:
+            self.watcher.start()
+        if sock is not None:
+            serve(self.app, sock, debug=debug)
+        else:
+            self.app.run(debug=debug, port=port)
 
 
-def results_app_entry(sgrna_file, gene_file, port=8050):
-    app = ResultsDashApp(sgrna_file, gene_file)
+def results_app_entry(sgrna_file, gene_file, port=8050, count_file=None):
+    app = ResultsDashApp(sgrna_file, gene_file, count_file=count_file)
     app.run(debug=True, port=port)
@@ -0,0 +1,212 @@
+# screenviz.results.browser
+
+from typing import Optional
+
+import dash
+from dash import ctx, dcc, html
+from dash.dependencies import Input, Output, State
+
+from .._launch import serve
+from .._profiling import CallbackProfiler
+from .gene_card import clicked_gene
+from .lookup_card import GeneLookupCard
+from .screens import DEFAULT_MEMORY_BUDGET_MB, ScreenCache, index_screens
+
+
+class ScreenBrowserApp:
+    """
+    Results dashboard over every screen of a directory.
+
+    Screens are indexed from their file headers at startup and only loaded
+    when selected. Loaded screens are kept in a least-recently-viewed cache
+    bounded by `memory_budget_mb`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ntc_token: str = "non-targeting",
+        amalgam_token="amalgam",
+        profiler: Optional[CallbackProfiler] = None,
+        full_precision: bool = False,
+        memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+        gene_index: Optional[str] = None,
+    ):
+        self.app = dash.Dash(__name__)
+        self.profiler = profiler
+        self.entries = index_screens(directory)
+        assert len(self.entries) > 0, (
+            f"No gene / sgRNA results pairs found in {directory}"
+        )
+        self.cache = ScreenCache(
+            self.entries,
+            memory_budget_mb=memory_budget_mb,
+            ntc_token=ntc_token,
+            amalgam_token=amalgam_token,
+            full_precision=full_precision,
+            profiler=profiler,
+        )
+        self.default_screen = next(iter(self.entries))
+        self.lookup_card = GeneLookupCard(gene_index) if gene_index else None
+
+        if self.profiler is not None:
+            # The cards of each screen are instrumented as the cache loads it
+            cards = [self.lookup_card] if self.lookup_card is not None else []
+            self.profiler.instrument(self.app, cards)
+
+        self.app.layout = self.create_layout()
+        self.register_callbacks()
+
+    def create_layout(self):
+        # The card layouts (component ids and controls) are shared by all screens
+        screen = self.cache.get(self.default_screen)
+        return html.Div(
+            [
+                html.H1("CRISPR Screen Results Dashboard"),
+                html.Label("Screen:"),
+                dcc.Dropdown(
+                    id="screen-dropdown",
+                    options=[
+                        {"label": entry.label, "value": name}
+                        for name, entry in self.entries.items()
+                    ],
+                    value=self.default_screen,
+                    clearable=False,
+                ),
+                dcc.Tabs(
+                    [
+                        dcc.Tab(
+                            label="sgRNA Results",
+                            children=[screen.sgrna_card.create_layout()],
+                        ),
+                        dcc.Tab(
+                            label="Gene Results",
+                            children=[screen.gene_card.create_layout()],
+                        ),
+                    ]
+                    + self.lookup_tabs()
+                ),
+            ]
+        )
+
+    def lookup_tabs(self):
+        if self.lookup_card is None:
+            return []
+        return [dcc.Tab(label="Gene Lookup", children=[self.lookup_card.layout])]
+
+    def register_callbacks(self):
+        app = self.app
+        if self.lookup_card is not None:
+            self.lookup_card.register_callbacks(app)
+
+        @app.callback(
+            [Output("sgrna-plots", "figure"), Output("sgrna-plot-ranges", "data")],
+            [
+                Input("screen-dropdown", "value"),
+                Input("threshold-input", "value"),
+                Input("clamp-slider", "value"),
+                Input("toggle-fdr-pvalue", "value"),
+                Input("sgrna-render-mode", "value"),
+                Input("sgrna-plots", "relayoutData"),
+            ],
+            State("sgrna-plot-ranges", "data"),
+        )
+        def update_sgrna_plots(
+            name, threshold, clamp_threshold, use_fdr, render, relayout_data, ranges
+        ):
+            sgrna_card = self.cache.get(name).sgrna_card
+            return sgrna_card.update_plots(
+                ctx.triggered_id,
+                threshold,
+                clamp_threshold,
+                use_fdr,
+                render,
+                relayout_data,
+                ranges,
+            )
+
+        @app.callback(
+            Output("sgrna-plots", "figure", allow_duplicate=True),
+            Input("sgrna-plots", "selectedData"),
+            [
+                State("screen-dropdown", "value"),
+                State("threshold-input", "value"),
+                State("sgrna-render-mode", "value"),
+            ],
+            prevent_initial_call=True,
+        )
+        def link_sgrna_selection(selected_data, name, threshold, render):
+            sgrna_card = self.cache.get(name).sgrna_card
+            return sgrna_card.select_points(selected_data, threshold, render)
+
+        @app.callback(
+            [
+                Output("sgrna-data-table", "data"),
+                Output("sgrna-data-table", "columns"),
+            ],
+            [Input("screen-dropdown", "value"), Input("threshold-input", "value")],
+        )
+        def update_sgrna_table(name, threshold):
+            sgrna_card = self.cache.get(name).sgrna_card
+            columns = [{"name": i, "id": i} for i in sgrna_card.sgrna_frame.columns]
+            return sgrna_card.filter_table(threshold), columns
+
+        @app.callback(
+            Output("gene-volcano-plot", "figure"),
+            [
+                Input("screen-dropdown", "value"),
+                Input("gene-threshold-input", "value"),
+                Input("sgrna-threshold-input", "value"),
+                Input("gene-clamp-slider", "value"),
+                Input("gene-toggle-fdr-pvalue", "value"),
+            ],
+        )
+        def update_gene_plot(
+            name, gene_threshold, sgrna_threshold, clamp_threshold, use_fdr
+        ):
+            gene_card = self.cache.get(name).gene_card
+            return gene_card.create_volcano_plot(
+                gene_threshold, sgrna_threshold, clamp_threshold, use_fdr
+            )
+
+        @app.callback(
+            [
+                Output("gene-drilldown-title", "children"),
+                Output("gene-drilldown-plot", "figure"),
+                Output("gene-drilldown-table", "data"),
+                Output("gene-drilldown-table", "columns"),
+            ],
+            [
+                Input("screen-dropdown", "value"),
+                Input("gene-volcano-plot", "clickData"),
+                Input("sgrna-threshold-input", "value"),
+            ],
+        )
+        def update_gene_drilldown(name, click_data, sgrna_threshold):
+            gene_card = self.cache.get(name).gene_card
+            # A click on the previous screen does not carry over
+            gene = (
+                None
+                if ctx.triggered_id == "screen-dropdown"
+                else clicked_gene(click_data)
+            )
+            title, fig, data = gene_card.create_drilldown(gene, sgrna_threshold)
+            return title, fig, data, gene_card.drilldown_columns()
+
+        @app.callback(
+            [
+                Output("gene-data-table", "data"),
+                Output("gene-data-table", "columns"),
+            ],
+            [Input("screen-dropdown", "value"), Input("gene-threshold-input", "value")],
+        )
+        def update_gene_table(name, threshold):
+            gene_card = self.cache.get(name).gene_card
+            columns = [{"name": i, "id": i} for i in gene_card.gene_frame.columns]
+            return gene_card.filter_table(threshold), columns
+
+    def run(self, debug=True, port=8050, sock=None):
+        if sock is not None:
+            serve(self.app, sock, debug=debug)
+        else:
+            self.app.run(debug=debug, port=port)
@@ -0,0 +1,115 @@
+# screenviz.results.density
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Raster resolution of a density panel (x bins, y bins), about one bin per 2 screen pixels
+DENSITY_BINS = (350, 250)
+
+# Render modes of the scatter plots ("auto" switches to density above the threshold)
+RENDER_MODES = {"auto": "Auto", "points": "Points", "density": "Density"}
+DENSITY_AUTO_THRESHOLD = 100_000
+
+DENSITY_COLORSCALE = [[0.0, "#E6E6E6"], [1.0, "#4D4D4D"]]
+
+
+def resolve_render(render: Optional[str], n_points: int) -> str:
+    if render in (None, "auto"):
+        return "density" if n_points > DENSITY_AUTO_THRESHOLD else "points"
+    assert render in RENDER_MODES, f"Render mode must be one of {list(RENDER_MODES)}"
+    return render
+
+
+def merge_ranges(ranges: Optional[Dict], relayout_data: Optional[Dict]) -> Dict:
+    """
+    Visible axis ranges after a relayout event (axis name -> [min, max]).
+
+    Relayout events only carry the axes that changed, so the ranges of the
+    other axes are kept. Autoranged axes are dropped (back to the data range).
+    """
+    ranges = dict(ranges or {})
+    for key, value in (relayout_data or {}).items():
+        axis, _, prop = key.partition(".")
+        if prop == "autorange" and value:
+            ranges.pop(axis, None)
+        elif prop == "range":
+            ranges[axis] = [value[0], value[1]]
+        elif prop in ("range[0]", "range[1]"):
+            bounds = list(ranges.get(axis, [None, None]))
+            bounds[int(prop[-2])] = value
+            ranges[axis] = bounds
+    return {
+        axis: bounds
+        for axis, bounds in ranges.items()
+        if None not in bounds and bounds[0] != bounds[1]
+    }
+
+
+def data_range(values: np.ndarray, bounds=None) -> Tuple[float, float]:
+    """
+    The visible range of an axis: the zoomed bounds if any, otherwise the finite data range.
+    """
+    if bounds is not None:
+        low, high = sorted(float(b) for b in bounds)
+        return low, high
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return 0.0, 1.0
+    low, high = float(finite.min()), float(finite.max())
+    return (low, high) if high > low else (low - 0.5, high + 0.5)
+
+
+def density_image(
+    x: np.ndarray,
+    y: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    bins: Tuple[int, int] = DENSITY_BINS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Counts of the points on a regular grid over the visible ranges.
+
+    Bins are fixed width, so the bin of a point is its integer offset from
+    the range start and all points are counted with a single `np.bincount`
+    (the same counts as `np.histogram2d`, without its per-point bin search).
+    Returns the bin centers along x and y and the (y, x) count image.
+    """
+    n_x, n_y = bins
+    x_width = (x_range[1] - x_range[0]) / n_x
+    y_width = (y_range[1] - y_range[0]) / n_y
+    visible = (
+        (x >= x_range[0]) & (x <= x_range[1]) & (y >= y_range[0]) & (y <= y_range[1])
+    )
+    x_bins = np.minimum(((x[visible] - x_range[0]) / x_width).astype(np.intp), n_x - 1)
+    y_bins = np.minimum(((y[visible] - y_range[0]) / y_width).astype(np.intp), n_y - 1)
+    counts = np.bincount(y_bins * n_x + x_bins, minlength=n_x * n_y).reshape(n_y, n_x)
+    x_centers = x_range[0] + (np.arange(n_x) + 0.5) * x_width
+    y_centers = y_range[0] + (np.arange(n_y) + 0.5) * y_width
+    return x_centers, y_centers, counts
+
+
+def density_heatmap(
+    x: np.ndarray,
+    y: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    bins: Tuple[int, int] = DENSITY_BINS,
+    name: str = "Density",
+) -> go.Heatmap:
+    """
+    A log-scaled density layer of the points, empty bins are transparent.
+    """
+    x_centers, y_centers, counts = density_image(x, y, x_range, y_range, bins)
+    z = np.where(counts > 0, np.log10(counts + 1.0), np.nan)
+    return go.Heatmap(
+        x=x_centers,
+        y=y_centers,
+        z=z,
+        text=counts,
+        name=name,
+        colorscale=DENSITY_COLORSCALE,
+        showscale=False,
+        hovertemplate="%{text} sgRNAs<extra>" + name + "</extra>",
+    )
@@ -1,10 +1,15 @@
 # screenviz.results.gene_card
 
+from typing import Callable, Optional
+
 import numpy as np
+import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from dash import dash_table, dcc, html
 from dash.dependencies import Input, Output
 from dash_daq import ToggleSwitch
+from plotly.subplots import make_subplots
 
 from .._constants import (
     DEPLETION_COLOR,
@@ -12,7 +17,14 @@ from .._constants import (
     NON_TARGETING_COLOR,
     NOT_SIGNIFICANT_COLOR,
 )
-from ._utils import load_gene_dataframe, load_sgrna_dataframe
+from ._utils import (
+    REQ_GENES,
+    REQ_SGRNA,
+    check_columns,
+    load_gene_dataframe,
+    load_sgrna_dataframe,
+)
+from .sgrna_index import SGRNAIndex
 
 
 class GeneCard:
@@ -29,24 +41,50 @@ class GeneCard:
         False: "circle",
     }
 
-    def __init__(self, gene_file: str, sgrna_file: str, amalgam_token: str = "amalgam"):
+    def __init__(
+        self,
+        gene_file: str,
+        sgrna_file: str,
+        amalgam_token: str = "amalgam",
+        full_precision: bool = False,
+        gene_frame: Optional[pd.DataFrame] = None,
+        sgrna_frame: Optional[pd.DataFrame] = None,
+        count_frame: Optional[pd.DataFrame] = None,
+        build_layout: bool = True,
+        defer: bool = False,
+    ):
         self.gene_filename = gene_file
         self.sgrna_filename = sgrna_file
         self.amalgam_token = amalgam_token
-        self.gene_frame = load_gene_dataframe(gene_file)
-        self.sgrna_frame = load_sgrna_dataframe(sgrna_file)
-        self.build_sgrna_fdr_lookup()
-        self.layout = self.create_layout()
+        self.full_precision = full_precision
+        self.build_layout = build_layout
+        if gene_frame is not None:
+            check_columns(gene_frame, REQ_GENES)
+        if sgrna_frame is not None:
+            check_columns(sgrna_frame, REQ_SGRNA)
+        self.gene_frame = gene_frame
+        self.sgrna_frame = sgrna_frame
+        self.count_frame = count_frame
+        self.layout = None
+        # Deferred cards can register their callbacks before the data is loaded
+        if not defer:
+            self.load()
 
-    def build_sgrna_fdr_lookup(self):
+    def load(self):
         """
-        Create a lookup table to easily pull out sgRNA FDRs for each gene.
+        Read the gene and sgRNA tables (unless they were given), index the sgRNAs by gene and build the layout.
         """
-        self.sgrna_fdr_lookup = dict()
-        genes = self.gene_frame["gene"].unique()
-        for gene in genes:
-            gene_sgrnas = self.sgrna_frame[self.sgrna_frame["gene"] == gene]
-            self.sgrna_fdr_lookup[gene] = gene_sgrnas["fdr"].values
+        if self.gene_frame is None:
+            self.gene_frame = load_gene_dataframe(
+                self.gene_filename, self.full_precision
+            )
+        if self.sgrna_frame is None:
+            self.sgrna_frame = load_sgrna_dataframe(
+                self.sgrna_filename, self.full_precision
+            )
+        self.sgrna_index = SGRNAIndex(self.sgrna_frame, self.count_frame)
+        # Static renderings only need the figures, skip the (table-heavy) layout
+        self.layout = self.create_layout() if self.build_layout else None
 
     def create_layout(self):
         return html.Div(
@@ -94,6 +132,8 @@ class GeneCard:
                     ]
                 ),
                 html.Br(),
+                self.create_drilldown_layout(),
+                html.Br(),
                 html.H3("Data Table, Filtered by Threshold"),
                 dash_table.DataTable(
                     id="gene-data-table",
@@ -106,7 +146,31 @@ class GeneCard:
             ]
         )
 
-    def register_callbacks(self, app):
+    def create_drilldown_layout(self):
+        return html.Div(
+            [
+                html.H3("Gene Drill-down"),
+                html.P(
+                    "Click a gene on the volcano plot to show its sgRNAs.",
+                    id="gene-drilldown-title",
+                ),
+                dcc.Graph(id="gene-drilldown-plot", figure=self.empty_figure()),
+                dash_table.DataTable(
+                    id="gene-drilldown-table",
+                    columns=self.drilldown_columns(),
+                    data=[],
+                    page_size=10,
+                    sort_action="native",
+                ),
+            ]
+        )
+
+    def register_callbacks(
+        self, app, resolve: Optional[Callable[[], "GeneCard"]] = None
+    ):
+        # Reloading dashboards swap in new cards: each callback serves the current one
+        resolve = resolve or (lambda: self)
+
         @app.callback(
             Output("gene-volcano-plot", "figure"),
             [
@@ -117,7 +181,7 @@ class GeneCard:
             ],
         )
         def update_plot(gene_threshold, sgrna_threshold, clamp_threshold, use_fdr):
-            return self.create_volcano_plot(
+            return resolve().create_volcano_plot(
                 gene_threshold, sgrna_threshold, clamp_threshold, use_fdr
             )
 
@@ -125,8 +189,25 @@ class GeneCard:
             Output("gene-data-table", "data"), [Input("gene-threshold-input", "value")]
         )
         def update_data_table(threshold):
-            filtered_df = self.gene_frame[self.gene_frame["fdr"] < threshold]
-            return filtered_df.to_dict("records")
+            return resolve().filter_table(threshold)
+
+        @app.callback(
+            [
+                Output("gene-drilldown-title", "children"),
+                Output("gene-drilldown-plot", "figure"),
+                Output("gene-drilldown-table", "data"),
+            ],
+            [
+                Input("gene-volcano-plot", "clickData"),
+                Input("sgrna-threshold-input", "value"),
+            ],
+        )
+        def update_drilldown(click_data, sgrna_threshold):
+            return resolve().create_drilldown(clicked_gene(click_data), sgrna_threshold)
+
+    def filter_table(self, threshold):
+        filtered_df = self.gene_frame[self.gene_frame["fdr"] < threshold]
+        return filtered_df.to_dict("records")
 
     def classify(self, x, lfc):
         if self.amalgam_token in x.gene:
@@ -140,13 +221,92 @@ class GeneCard:
 
     def count_significant_sgrnas(self, gene: str, sgrna_threshold: str) -> int:
         """
-        Count the number of significant sgRNAs for a given gene (lookups the FDR array in a precalculated table).
+        Count the number of significant sgRNAs for a given gene (a slice of the gene-sorted sgRNA FDRs).
+        """
+        return (
+            self.sgrna_index.fdr[self.sgrna_index.rows(gene)] < sgrna_threshold
+        ).sum()
+
+    def drilldown_columns(self):
+        index = self.sgrna_index
+        return [
+            {"name": i, "id": i}
+            for i in list(index.frame.columns) + index.sample_columns
+        ]
+
+    def empty_figure(self):
+        fig = go.Figure()
+        fig.update_layout(height=400, width=1000, template="plotly_white")
+        return fig
+
+    def create_drilldown(self, gene: Optional[str], sgrna_threshold=0.1):
+        """
+        The sgRNAs of a gene: a title, their fold changes (and counts) and their table rows.
         """
-        return (self.sgrna_fdr_lookup[gene] < sgrna_threshold).sum()
+        if gene is None:
+            return (
+                "Click a gene on the volcano plot to show its sgRNAs.",
+                self.empty_figure(),
+                [],
+            )
+        df = self.sgrna_index.query(gene)
+        if len(df) == 0:
+            return f"No sgRNAs found for {gene}.", self.empty_figure(), []
+        significant = (df["fdr"] < sgrna_threshold).sum()
+        title = f"{gene}: {len(df)} sgRNAs, {significant} with FDR < {sgrna_threshold}"
+        return (
+            title,
+            self.create_drilldown_plot(df, sgrna_threshold),
+            df.to_dict("records"),
+        )
+
+    def create_drilldown_plot(self, df: pd.DataFrame, sgrna_threshold=0.1):
+        samples = self.sgrna_index.sample_columns
+        fig = make_subplots(
+            rows=1,
+            cols=2 if samples else 1,
+            subplot_titles=["sgRNA log Fold Change", "sgRNA Counts"][
+                : 2 if samples else 1
+            ],
+        )
+        colors = np.where(
+            df["fdr"] >= sgrna_threshold,
+            NOT_SIGNIFICANT_COLOR,
+            np.where(df[self.LFC_COLUMN] > 0, ENRICHMENT_COLOR, DEPLETION_COLOR),
+        )
+        fig.add_trace(
+            go.Bar(
+                x=df["sgrna"],
+                y=df[self.LFC_COLUMN],
+                marker_color=colors,
+                customdata=df[["fdr", "base"]],
+                hovertemplate="%{x}<br>log2fc=%{y:.3f}<br>fdr=%{customdata[0]:.3g}<br>base=%{customdata[1]:.1f}<extra></extra>",
+                showlegend=False,
+            ),
+            row=1,
+            col=1,
+        )
+        if samples:
+            for name, counts in zip(df["sgrna"], df[samples].to_numpy()):
+                fig.add_trace(
+                    go.Scatter(
+                        x=samples, y=counts + 1, mode="lines+markers", name=name
+                    ),
+                    row=1,
+                    col=2,
+                )
+            fig.update_yaxes(type="log", title_text="count + 1", row=1, col=2)
+        fig.update_yaxes(title_text="log Fold Change", row=1, col=1)
+        fig.update_layout(height=400, width=1000, template="plotly_white")
+        return fig
 
     def create_volcano_plot(
         self, gene_threshold=0.1, sgrna_threshold=0.1, clamp_threshold=30, use_fdr=True
     ):
+        if not use_fdr and self.gene_frame[self.PVALUE_COLUMN].isna().all():
+            raise ValueError(
+                "The gene results report no p-values, plot their FDR instead"
+            )
         df = self.gene_frame.copy()
         df["log_pvalue"] = -np.log10(df[self.PVALUE_COLUMN])
         df["log_fdr"] = -np.log10(df["fdr"])
@@ -157,8 +317,12 @@ class GeneCard:
             lambda x: self.classify(x, self.LFC_COLUMN), axis=1
         )
         df["magnitude"] = df[self.LFC_COLUMN].abs().clip(lower=0.3)
-        df["significant_sgrnas"] = df["gene"].apply(
-            lambda x: self.count_significant_sgrnas(x, sgrna_threshold)
+        df["significant_sgrnas"] = (
+            self.sgrna_index.significant_sgrnas(sgrna_threshold)
+            .reindex(df["gene"].astype(str))
+            .fillna(0)
+            .astype(int)
+            .to_numpy()
         )
         df["Single-Significant-SGRNA"] = df.apply(
             lambda x: x["is_significant"] & (x["significant_sgrnas"] == 1), axis=1
@@ -204,3 +368,12 @@ class GeneCard:
         )
 
         return fig
+
+
+def clicked_gene(click_data) -> Optional[str]:
+    """
+    The gene of a click on the volcano plot (its hover name).
+    """
+    if not click_data or not click_data.get("points"):
+        return None
+    return click_data["points"][0].get("hovertext")
@@ -0,0 +1,172 @@
+# screenviz.results.gene_index
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..formats import GENE_COLUMNS, read_results
+from .screens import ScreenEntry, index_screens
+
+INDEX_VERSION = 1
+METADATA_FILE = "index.json"
+
+# Per-row columns of the index, stored as one .npy array each
+INDEX_COLUMNS = {
+    "screen": np.int32,
+    "log2fc": np.float32,
+    "pvalue": np.float64,
+    "fdr": np.float64,
+    "significant_sgrnas": np.int32,
+}
+
+
+def summarize_screen(entry: ScreenEntry, sgrna_threshold: float) -> pd.DataFrame:
+    """
+    Gene-level statistics of one screen along with its number of significant sgRNAs per gene.
+    """
+    genes = read_results(
+        entry.gene_file, "gene", columns=GENE_COLUMNS, full_precision=True
+    )
+    genes["gene"] = genes["gene"].astype(str)
+    sgrnas = read_results(
+        entry.sgrna_file, "sgrna", columns=["gene", "fdr"], full_precision=True
+    )
+    sgrnas["gene"] = sgrnas["gene"].astype(str)
+    significant = (
+        sgrnas.loc[sgrnas["fdr"] < sgrna_threshold, "gene"].value_counts().astype(int)
+    )
+    genes["significant_sgrnas"] = (
+        genes["gene"].map(significant).fillna(0).astype(np.int32)
+    )
+    return genes
+
+
+def build_gene_index(
+    directory: str,
+    output: str,
+    sgrna_threshold: float = 0.1,
+    threads: Optional[int] = None,
+):
+    """
+    Write an inverted gene -> screens index of every screen found in a directory.
+
+    Rows are sorted by gene and stored column-wise as `.npy` arrays, with the
+    sorted gene names and the row offset of each gene in `index.json`, so a
+    lookup is a dictionary access and a slice of memory-mapped arrays.
+    """
+    start = time.perf_counter()
+    entries = list(index_screens(directory).values())
+    assert len(entries) > 0, f"No screens found in {directory}"
+
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+        summaries = list(
+            pool.map(lambda e: summarize_screen(e, sgrna_threshold), entries)
+        )
+    for i, summary in enumerate(summaries):
+        summary["screen"] = i
+    table = pd.concat(summaries, ignore_index=True)
+
+    gene_names, codes = np.unique(
+        table["gene"].to_numpy(dtype=str), return_inverse=True
+    )
+    order = np.argsort(codes, kind="stable")
+    offsets = np.searchsorted(codes[order], np.arange(len(gene_names) + 1))
+
+    os.makedirs(output, exist_ok=True)
+    for col, dtype in INDEX_COLUMNS.items():
+        np.save(os.path.join(output, f"{col}.npy"), table[col].to_numpy(dtype)[order])
+
+    metadata = {
+        "version": INDEX_VERSION,
+        "directory": os.path.abspath(directory),
+        "sgrna_threshold": sgrna_threshold,
+        "screens": [entry.name for entry in entries],
+        "genes": gene_names.tolist(),
+        "offsets": offsets.tolist(),
+    }
+    with open(os.path.join(output, METADATA_FILE), "w") as f:
+        json.dump(metadata, f)
+
+    print(
+        f"Indexed {len(gene_names)} genes across {len(entries)} screens "
+        f"in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+
+
+class GeneIndex:
+    """
+    Read-only view of an index written by `build_gene_index`.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, METADATA_FILE), "r") as f:
+            metadata = json.load(f)
+        assert metadata["version"] == INDEX_VERSION, (
+            f"Unsupported gene index version {metadata['version']}, rebuild the index"
+        )
+        self.path = path
+        self.sgrna_threshold = metadata["sgrna_threshold"]
+        self.screens = np.array(metadata["screens"], dtype=object)
+        self.genes = metadata["genes"]
+        self.offsets = metadata["offsets"]
+        self.positions = {gene: i for i, gene in enumerate(self.genes)}
+        self.positions_lower = {gene.lower(): i for i, gene in enumerate(self.genes)}
+        self.columns = {
+            col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r")
+            for col in INDEX_COLUMNS
+        }
+
+    def find(self, gene: str) -> Optional[int]:
+        """
+        Position of a gene in the index (falls back to a case-insensitive match).
+        """
+        if gene in self.positions:
+            return self.positions[gene]
+        return self.positions_lower.get(gene.lower())
+
+    def query(self, genes: List[str]) -> pd.DataFrame:
+        """
+        Statistics of the genes in every screen they were measured in.
+        """
+        frames = []
+        # Spellings of the same gene (e.g. `GENE0 gene0`) resolve to one position
+        positions = set()
+        for gene in genes:
+            position = self.find(gene)
+            if position is None:
+                print(f"Gene not found in the index: {gene}", file=sys.stderr)
+                continue
+            if position in positions:
+                continue
+            positions.add(position)
+            rows = slice(self.offsets[position], self.offsets[position + 1])
+            data: Dict[str, np.ndarray] = {
+                col: np.asarray(values[rows]) for col, values in self.columns.items()
+            }
+            data["screen"] = self.screens[data["screen"]]
+            frames.append(pd.DataFrame({"gene": self.genes[position], **data}))
+        if len(frames) == 0:
+            return pd.DataFrame(columns=["gene", *INDEX_COLUMNS])
+        return pd.concat(frames, ignore_index=True).sort_values(["gene", "fdr"])
+
+
+def RunGeneLookup(
+    index: str,
+    genes: List[str],
+    output: Optional[str] = None,
+):
+    """
+    Print (or write) the statistics of genes across every indexed screen.
+    """
+    results = GeneIndex(index).query(genes)
+    if output is None:
+        results.to_csv(sys.stdout, sep="\t", index=False)
+    else:
+        results.to_csv(output, sep="\t", index=False)
@@ -0,0 +1,88 @@
+# screenviz.results.lookup_card
+
+import numpy as np
+import plotly.express as px
+from dash import dash_table, dcc, html
+from dash.dependencies import Input, Output
+
+from .._constants import DEPLETION_COLOR, ENRICHMENT_COLOR, NOT_SIGNIFICANT_COLOR
+from .gene_index import INDEX_COLUMNS, GeneIndex
+
+
+class GeneLookupCard:
+    COLOR_MAP = {
+        "Enriched": ENRICHMENT_COLOR,
+        "Depleted": DEPLETION_COLOR,
+        "Not significant": NOT_SIGNIFICANT_COLOR,
+    }
+
+    def __init__(self, index_path: str):
+        self.index = GeneIndex(index_path)
+        self.layout = self.create_layout()
+
+    def create_layout(self):
+        return html.Div(
+            [
+                html.H2("Gene Lookup Across Screens"),
+                html.Label("Gene(s), separated by spaces or commas:"),
+                dcc.Input(id="gene-lookup-input", type="text", debounce=True),
+                html.Label("FDR Threshold:"),
+                dcc.Input(
+                    id="gene-lookup-threshold", type="number", value=0.1, step=0.01
+                ),
+                dcc.Graph(id="gene-lookup-plot"),
+                html.H3(f"Results in {len(self.index.screens)} indexed screens"),
+                dash_table.DataTable(
+                    id="gene-lookup-table",
+                    columns=[{"name": i, "id": i} for i in ["gene", *INDEX_COLUMNS]],
+                    data=[],
+                    page_size=20,
+                    sort_action="native",
+                    filter_action="native",
+                ),
+            ]
+        )
+
+    def register_callbacks(self, app):
+        @app.callback(
+            [
+                Output("gene-lookup-plot", "figure"),
+                Output("gene-lookup-table", "data"),
+            ],
+            [
+                Input("gene-lookup-input", "value"),
+                Input("gene-lookup-threshold", "value"),
+            ],
+        )
+        def update_lookup(query, threshold):
+            genes = (query or "").replace(",", " ").split()
+            df = self.index.query(genes)
+            return self.create_plot(df, threshold), df.to_dict("records")
+
+    def create_plot(self, df, threshold=0.1):
+        df = df.copy()
+        df["log_fdr"] = -np.log10(df["fdr"].astype(float))
+        df["classification"] = np.where(
+            df["fdr"] >= threshold,
+            "Not significant",
+            np.where(df["log2fc"] > 0, "Enriched", "Depleted"),
+        )
+        fig = px.scatter(
+            df,
+            x="log2fc",
+            y="log_fdr",
+            color="classification",
+            symbol="gene",
+            hover_name="screen",
+            hover_data=["gene", "pvalue", "fdr", "significant_sgrnas"],
+            color_discrete_map=self.COLOR_MAP,
+        )
+        fig.add_hline(y=-np.log10(threshold), line_dash="dash", line_color="black")
+        fig.update_layout(
+            height=600,
+            width=1000,
+            title_text="Gene Results Across Screens",
+            xaxis_title="log Fold Change",
+            yaxis_title="-log10(FDR)",
+        )
+        return fig
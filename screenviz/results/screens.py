@@ -0,0 +1,197 @@
+# screenviz.results.screens
+
+import glob
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .._profiling import CallbackProfiler
+from ..formats import read_header, sniff_format
+from .gene_card import GeneCard
+from .sgrna_card import SGRNACard
+
+# File name suffixes of the (gene, sgRNA) results of a screen: crispr_screen and MAGeCK
+RESULT_SUFFIXES = [
+    (".gene_results.tsv", ".sgrna_results.tsv"),
+    (".gene_summary.txt", ".sgrna_summary.txt"),
+]
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+
+class ScreenEntry:
+    """
+    A pair of sgRNA / gene results files (e.g. `{prefix}.sgrna_results.tsv` / `{prefix}.gene_results.tsv`) found on disk.
+    """
+
+    def __init__(self, name: str, sgrna_file: str, gene_file: str):
+        self.name = name
+        self.sgrna_file = sgrna_file
+        self.gene_file = gene_file
+        self.size = os.path.getsize(sgrna_file) + os.path.getsize(gene_file)
+
+    @property
+    def label(self) -> str:
+        return f"{self.name} ({self.size / 1e6:.1f} MB)"
+
+
+def result_files(prefix: str):
+    """
+    The (sgRNA, gene) results files of a prefix, the first pair of suffixes found on disk.
+    """
+    for gene_suffix, sgrna_suffix in RESULT_SUFFIXES:
+        gene_file, sgrna_file = f"{prefix}{gene_suffix}", f"{prefix}{sgrna_suffix}"
+        if os.path.exists(gene_file) and os.path.exists(sgrna_file):
+            return sgrna_file, gene_file
+    gene_suffix, sgrna_suffix = RESULT_SUFFIXES[0]
+    return f"{prefix}{sgrna_suffix}", f"{prefix}{gene_suffix}"
+
+
+def index_screens(directory: str) -> Dict[str, ScreenEntry]:
+    """
+    Find every screen under a directory reading only the file headers and sizes.
+
+    Screens are named by their prefix relative to the directory. Pairs missing
+    a file or in an unrecognized format are skipped with a warning.
+    """
+    entries = dict()
+    for gene_suffix, sgrna_suffix in RESULT_SUFFIXES:
+        pattern = os.path.join(directory, "**", f"*{gene_suffix}")
+        for gene_file in sorted(glob.glob(pattern, recursive=True)):
+            prefix = gene_file[: -len(gene_suffix)]
+            sgrna_file = f"{prefix}{sgrna_suffix}"
+            name = os.path.relpath(prefix, directory)
+            if not os.path.exists(sgrna_file):
+                print(f"Skipping {name}: no matching sgRNA results", file=sys.stderr)
+                continue
+            if sniff_format(read_header(gene_file), "gene") is None:
+                print(f"Skipping {name}: unrecognized gene results", file=sys.stderr)
+                continue
+            if sniff_format(read_header(sgrna_file), "sgrna") is None:
+                print(f"Skipping {name}: unrecognized sgRNA results", file=sys.stderr)
+                continue
+            if name in entries:
+                print(f"Skipping {name}: duplicate screen prefix", file=sys.stderr)
+                continue
+            entries[name] = ScreenEntry(name, sgrna_file, gene_file)
+    return entries
+
+
+class LoadedScreen:
+    """
+    The cards (frames and derived indexes) of a loaded screen.
+    """
+
+    def __init__(
+        self,
+        entry: ScreenEntry,
+        ntc_token: str = "non-targeting",
+        amalgam_token: str = "amalgam",
+        full_precision: bool = False,
+    ):
+        self.entry = entry
+        self.sgrna_card = SGRNACard(
+            entry.sgrna_file,
+            ntc_token=ntc_token,
+            full_precision=full_precision,
+            build_layout=False,
+            name=entry.name,
+        )
+        self.gene_card = GeneCard(
+            gene_file=entry.gene_file,
+            sgrna_file=entry.sgrna_file,
+            amalgam_token=amalgam_token,
+            full_precision=full_precision,
+            sgrna_frame=self.sgrna_card.sgrna_frame,
+            build_layout=False,
+        )
+        self.nbytes = self.memory_usage()
+
+    def memory_usage(self) -> int:
+        """
+        Approximate resident size of the frames and the gene-sorted sgRNA index.
+        """
+        frames = [self.sgrna_card.sgrna_frame, self.gene_card.gene_frame]
+        nbytes = sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+        nbytes += self.gene_card.sgrna_index.nbytes
+        return nbytes
+
+
+class ScreenCache:
+    """
+    Least-recently-viewed cache of loaded screens bounded by a memory budget.
+
+    The most recently viewed screen is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(
+        self,
+        entries: Dict[str, ScreenEntry],
+        memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+        ntc_token: str = "non-targeting",
+        amalgam_token: str = "amalgam",
+        full_precision: bool = False,
+        profiler: Optional[CallbackProfiler] = None,
+    ):
+        self.entries = entries
+        self.memory_budget = int(memory_budget_mb * 1e6)
+        self.ntc_token = ntc_token
+        self.amalgam_token = amalgam_token
+        self.full_precision = full_precision
+        self.profiler = profiler
+        self.screens = OrderedDict()
+        self.loading: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(screen.nbytes for screen in self.screens.values())
+
+    def get(self, name: str) -> LoadedScreen:
+        """
+        A loaded screen, loading it on a miss.
+
+        Screens are loaded outside of the cache lock, so a slow load never
+        blocks the callbacks of other (cached) screens. Concurrent requests
+        for a screen being loaded wait for that load instead of repeating it.
+        """
+        assert name in self.entries, f"Unknown screen: {name}"
+        while True:
+            with self.lock:
+                if name in self.screens:
+                    self.screens.move_to_end(name)
+                    return self.screens[name]
+                loading = self.loading.get(name)
+                if loading is None:
+                    loading = self.loading[name] = threading.Event()
+                    break
+            # Loaded (or failed, then retried here) by another request
+            loading.wait()
+
+        try:
+            screen = LoadedScreen(
+                self.entries[name],
+                ntc_token=self.ntc_token,
+                amalgam_token=self.amalgam_token,
+                full_precision=self.full_precision,
+            )
+            if self.profiler is not None:
+                self.profiler.wrap_figure_builders(screen.sgrna_card)
+                self.profiler.wrap_figure_builders(screen.gene_card)
+            with self.lock:
+                self.screens[name] = screen
+                self.evict()
+            return screen
+        finally:
+            with self.lock:
+                del self.loading[name]
+            loading.set()
+
+    def evict(self, keep: Optional[int] = 1):
+        """
+        Drop the least recently viewed screens until the cache fits in the budget.
+        """
+        while len(self.screens) > keep and self.nbytes > self.memory_budget:
+            name, _ = self.screens.popitem(last=False)
+            print(f"Evicted screen: {name}", file=sys.stderr)
@@ -1,10 +1,13 @@
 # screenviz.results.sgrna_card
 
+from typing import Callable, Optional
+
 import numpy as np
 import pandas as pd
-import plotly.express as px
-from dash import dash_table, dcc, html
-from dash.dependencies import Input, Output
+import plotly.graph_objects as go
+from dash import Patch, ctx, dash_table, dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from dash_daq import ToggleSwitch
 from plotly.subplots import make_subplots
 
@@ -14,7 +17,14 @@ from .._constants import (
     NON_TARGETING_COLOR,
     NOT_SIGNIFICANT_COLOR,
 )
-from ._utils import load_sgrna_dataframe
+from ._utils import REQ_SGRNA, check_columns, load_sgrna_dataframe
+from .density import (
+    RENDER_MODES,
+    data_range,
+    density_heatmap,
+    merge_ranges,
+    resolve_render,
+)
 
 
 class SGRNACard:
@@ -26,11 +36,39 @@ class SGRNACard:
         "Non-targeting": NON_TARGETING_COLOR,
     }
 
-    def __init__(self, sgrna_file: str, ntc_token: str = "non-targeting"):
+    def __init__(
+        self,
+        sgrna_file: str,
+        ntc_token: str = "non-targeting",
+        full_precision: bool = False,
+        sgrna_frame: Optional[pd.DataFrame] = None,
+        build_layout: bool = True,
+        defer: bool = False,
+        name: Optional[str] = None,
+    ):
         self.filename = sgrna_file
+        # Screen shown by the card, when one figure is shared by several screens
+        self.name = name
         self.ntc_token = ntc_token
-        self.sgrna_frame = load_sgrna_dataframe(sgrna_file)
-        self.layout = self.create_layout()
+        self.full_precision = full_precision
+        self.build_layout = build_layout
+        if sgrna_frame is not None:
+            check_columns(sgrna_frame, REQ_SGRNA)
+        self.sgrna_frame = sgrna_frame
+        self.layout = None
+        # Deferred cards can register their callbacks before the data is loaded
+        if not defer:
+            self.load()
+
+    def load(self):
+        """
+        Read the sgRNA table (unless it was given), precompute the plotted values and build the layout.
+        """
+        if self.sgrna_frame is None:
+            self.sgrna_frame = load_sgrna_dataframe(self.filename, self.full_precision)
+        self.prepare_arrays()
+        # Static renderings only need the figures, skip the (table-heavy) layout
+        self.layout = self.create_layout() if self.build_layout else None
 
     def load_dataframe(self, filename):
         df = pd.read_csv(filename, sep="\t")
@@ -78,6 +116,19 @@ class SGRNACard:
                         dcc.Input(
                             id="threshold-input", type="number", value=0.1, step=0.01
                         ),
+                        html.Br(),
+                        html.Label("Render:"),
+                        dcc.RadioItems(
+                            id="sgrna-render-mode",
+                            options=[
+                                {"label": label, "value": mode}
+                                for mode, label in RENDER_MODES.items()
+                            ],
+                            value="auto",
+                            inline=True,
+                        ),
+                        # Zoomed axis ranges the density layers are rasterized over
+                        dcc.Store(id="sgrna-plot-ranges", data={}),
                     ]
                 ),
                 html.Br(),
@@ -93,65 +144,188 @@ class SGRNACard:
             ]
         )
 
-    def register_callbacks(self, app):
+    def register_callbacks(
+        self, app, resolve: Optional[Callable[[], "SGRNACard"]] = None
+    ):
+        # Reloading dashboards swap in new cards: each callback serves the current one
+        resolve = resolve or (lambda: self)
+
         @app.callback(
-            Output("sgrna-plots", "figure"),
+            [Output("sgrna-plots", "figure"), Output("sgrna-plot-ranges", "data")],
             [
                 Input("threshold-input", "value"),
                 Input("clamp-slider", "value"),
                 Input("toggle-fdr-pvalue", "value"),
+                Input("sgrna-render-mode", "value"),
+                Input("sgrna-plots", "relayoutData"),
             ],
+            State("sgrna-plot-ranges", "data"),
+        )
+        def update_plots(
+            threshold, clamp_threshold, use_fdr, render, relayout_data, ranges
+        ):
+            return resolve().update_plots(
+                ctx.triggered_id,
+                threshold,
+                clamp_threshold,
+                use_fdr,
+                render,
+                relayout_data,
+                ranges,
+            )
+
+        @app.callback(
+            Output("sgrna-plots", "figure", allow_duplicate=True),
+            Input("sgrna-plots", "selectedData"),
+            [State("threshold-input", "value"), State("sgrna-render-mode", "value")],
+            prevent_initial_call=True,
         )
-        def update_plots(threshold, clamp_threshold, use_fdr):
-            return self.create_plots(threshold, clamp_threshold, use_fdr)
+        def link_selection(selected_data, threshold, render):
+            return resolve().select_points(selected_data, threshold, render)
 
         @app.callback(
             Output("sgrna-data-table", "data"), [Input("threshold-input", "value")]
         )
         def update_data_table(threshold):
-            filtered_df = self.sgrna_frame[self.sgrna_frame["fdr"] < threshold]
-            return filtered_df.to_dict("records")
-
-    def classify(self, x, lfc):
-        if self.ntc_token in x.sgrna:
-            return "Non-targeting"
-        elif x.is_significant and x[lfc] > 0:
-            return "Enriched"
-        elif x.is_significant and x[lfc] < 0:
-            return "Depleted"
-        else:
-            return "Not significant"
-
-    def create_plots(self, threshold=0.1, clamp_threshold=30, use_fdr=True):
-        df = self.sgrna_frame.copy()
-        df["log_pvalue"] = -np.log10(df[self.PVALUE_COLUMN])
-        df["log_fdr"] = -np.log10(df["fdr"])
-        df["clamped_log_pvalue"] = df["log_pvalue"].clip(upper=clamp_threshold)
-        df["clamped_log_fdr"] = df["log_fdr"].clip(upper=clamp_threshold)
-        df["is_significant"] = df["fdr"] < threshold
-        df["classification"] = df.apply(lambda x: self.classify(x, "log2fc"), axis=1)
-        df["magnitude"] = df["log2fc"].abs().clip(lower=0.3)
+            return resolve().filter_table(threshold)
 
-        fig = make_subplots(rows=1, cols=2, subplot_titles=("Volcano Plot", "MA Plot"))
+    def update_plots(
+        self,
+        trigger,
+        threshold,
+        clamp_threshold,
+        use_fdr,
+        render,
+        relayout_data,
+        ranges,
+    ):
+        """
+        The figure and visible ranges after a change of the controls or of the zoom.
 
-        # Volcano Plot
-        y_col = "clamped_log_fdr" if use_fdr else "clamped_log_pvalue"
-        y_title = (
-            f"-log10({'FDR' if use_fdr else 'p-value'}) [clamped at {clamp_threshold}]"
+        Zooming only redraws density renderings (their raster follows the
+        visible ranges), and changing the y values resets the stored ranges.
+        """
+        if trigger == "sgrna-plots":
+            if resolve_render(render, len(self.sgrna_frame)) != "density":
+                raise PreventUpdate
+            new_ranges = merge_ranges(ranges, relayout_data)
+            if new_ranges == (ranges or {}):
+                raise PreventUpdate
+            ranges = new_ranges
+        elif trigger in ("toggle-fdr-pvalue", "clamp-slider", "screen-dropdown"):
+            ranges = {}
+        fig = self.create_plots(threshold, clamp_threshold, use_fdr, render, ranges)
+        return fig, ranges or {}
+
+    def filter_table(self, threshold):
+        filtered_df = self.sgrna_frame[self.sgrna_frame["fdr"] < threshold]
+        return filtered_df.to_dict("records")
+
+    def prepare_arrays(self):
+        """
+        Per-sgRNA values shared by every rendering of the plots, computed once at load.
+        """
+        df = self.sgrna_frame
+        self.lfc = df["log2fc"].to_numpy(dtype=np.float64)
+        self.fdr = df["fdr"].to_numpy(dtype=np.float64)
+        self.pvalue = df[self.PVALUE_COLUMN].to_numpy(dtype=np.float64)
+        self.log_pvalue = -np.log10(self.pvalue)
+        self.log_fdr = -np.log10(self.fdr)
+        self.log_base = np.log10(df["base"].to_numpy(dtype=np.float64) + 1.0)
+        self.magnitude = np.clip(np.abs(self.lfc), 0.3, None)
+        self.is_ntc = (
+            df["sgrna"].astype(str).str.contains(self.ntc_token, regex=False).to_numpy()
         )
 
-        volcano_trace = px.scatter(
-            df,
-            x="log2fc",
-            y=y_col,
-            color="classification",
-            hover_name="sgrna",
-            hover_data=["gene", "log2fc", self.PVALUE_COLUMN, "fdr"],
-            color_discrete_map=self.COLOR_MAP,
+    def classify(self, threshold):
+        """
+        Classification of every sgRNA at once.
+        """
+        is_significant = self.fdr < threshold
+        return np.select(
+            [
+                self.is_ntc,
+                is_significant & (self.lfc > 0),
+                is_significant & (self.lfc < 0),
+            ],
+            ["Non-targeting", "Enriched", "Depleted"],
+            default="Not significant",
         )
 
-        for trace in volcano_trace.data:
-            fig.add_trace(trace, row=1, col=1)
+    def class_rows(self, threshold, render="auto"):
+        """
+        Rows of the sgRNAs drawn as markers, one trace per classification (in panel order).
+
+        Density renderings draw the non-significant sgRNAs as a raster instead,
+        their entry is then `None`.
+        """
+        classification = self.classify(threshold)
+        density = resolve_render(render, len(self.sgrna_frame)) == "density"
+        rows = dict()
+        for name in self.COLOR_MAP:
+            if density and name == "Not significant":
+                rows[name] = None
+                continue
+            class_rows = np.flatnonzero(classification == name)
+            if len(class_rows) > 0:
+                rows[name] = class_rows
+        return rows
+
+    def trace_rows(self, threshold, render="auto"):
+        """
+        Rows of every trace of the figure, the volcano traces followed by the MA traces.
+        """
+        rows = list(self.class_rows(threshold, render).values())
+        return rows + rows
+
+    def select_points(self, selected_data, threshold, render="auto"):
+        """
+        Highlight the sgRNAs selected in one panel in both panels.
+
+        The selected points (trace and index in the trace) are mapped back to
+        their rows, and the selection is applied as a patch of the
+        `selectedpoints` of every trace instead of a new figure.
+        """
+        trace_rows = self.trace_rows(threshold, render)
+        selected = None
+        if selected_data and selected_data.get("points"):
+            selected = np.unique(
+                [
+                    trace_rows[p["curveNumber"]][p["pointIndex"]]
+                    for p in selected_data["points"]
+                    if "pointIndex" in p and trace_rows[p["curveNumber"]] is not None
+                ]
+            )
+        patch = Patch()
+        for i, rows in enumerate(trace_rows):
+            if rows is None:
+                continue
+            patch["data"][i]["selectedpoints"] = (
+                None
+                if selected is None
+                else np.flatnonzero(np.isin(rows, selected)).tolist()
+            )
+        return patch
+
+    def create_plots(
+        self,
+        threshold=0.1,
+        clamp_threshold=30,
+        use_fdr=True,
+        render="auto",
+        ranges=None,
+    ):
+        fig = make_subplots(rows=1, cols=2, subplot_titles=("Volcano Plot", "MA Plot"))
+
+        # Volcano Plot
+        y_values = self.log_fdr if use_fdr else self.log_pvalue
+        y_label = f"-log10({'FDR' if use_fdr else 'p-value'})"
+        y_title = f"{y_label} [clamped at {clamp_threshold}]"
+        panels = [
+            (1, self.lfc, np.minimum(y_values, clamp_threshold), "log2fc", y_label),
+            (2, self.log_base, self.lfc, "log10(base)", "log2fc"),
+        ]
+        self.add_traces(fig, panels, self.class_rows(threshold, render), ranges or {})
 
         fig.add_hline(
             y=min(-np.log10(threshold), clamp_threshold),
@@ -162,21 +336,6 @@ class SGRNACard:
             col=1,
         )
 
-        # MA Plot
-        ma_trace = px.scatter(
-            df,
-            x=np.log10(df["base"] + 1),
-            y="log2fc",
-            color="classification",
-            hover_name="sgrna",
-            hover_data=["gene", "log2fc", self.PVALUE_COLUMN, "fdr"],
-            color_discrete_map=self.COLOR_MAP,
-            size="magnitude",
-        )
-
-        for trace in ma_trace.data:
-            fig.add_trace(trace, row=1, col=2)
-
         # add a horizontal line at the zero-fold change threshold
         fig.add_hline(
             y=0,
@@ -192,11 +351,89 @@ class SGRNACard:
         fig.update_xaxes(title_text="log10(Base Mean)", row=1, col=2)
         fig.update_yaxes(title_text="log2 Fold Change", row=1, col=2)
 
+        # Keep the zoom when the figure is redrawn for the new visible range (of the same screen)
+        uirevision = f"{use_fdr}-{clamp_threshold}"
+        if self.name is not None:
+            uirevision = f"{self.name}-{uirevision}"
         fig.update_layout(
             height=600,
             width=1500,
             title_text="sgRNA Differential Abundance Analysis",
             showlegend=False,
+            uirevision=uirevision,
         )
 
         return fig
+
+    def add_traces(self, fig, panels, class_rows, ranges):
+        """
+        One marker trace per classification and panel, built from the shared arrays.
+
+        The traces of a classification hold the same rows in both panels, so
+        selections are linked through the point indices. The sgRNA names,
+        genes, p-values and FDRs are only sent once, with the volcano traces
+        (their hover), the MA traces only hover their coordinates. Classes
+        without rows (density renderings) are drawn as a density raster of
+        the visible range.
+        """
+        names = self.sgrna_frame["sgrna"].astype(str)
+        genes = self.sgrna_frame["gene"].astype(str)
+        # Marker areas scale with the fold change (as plotly express sizes them)
+        sizeref = 2.0 * self.magnitude.max() / (20**2) if len(self.lfc) else 1.0
+        background = np.ones(len(self.lfc), dtype=bool)
+        for rows in class_rows.values():
+            if rows is not None:
+                background[rows] = False
+
+        for col, x, y, x_label, y_label in panels:
+            x_axis, y_axis = ("xaxis", "yaxis") if col == 1 else ("xaxis2", "yaxis2")
+            for name, rows in class_rows.items():
+                if rows is None:
+                    fig.add_trace(
+                        density_heatmap(
+                            x[background],
+                            y[background],
+                            data_range(x, ranges.get(x_axis)),
+                            data_range(y, ranges.get(y_axis)),
+                            name=name,
+                        ),
+                        row=1,
+                        col=col,
+                    )
+                    continue
+                marker = {"color": self.COLOR_MAP[name]}
+                hover = dict(
+                    hovertemplate=f"{x_label}=%{{x:.3f}}<br>{y_label}=%{{y:.3f}}"
+                    f"<extra>{name}</extra>"
+                )
+                if col == 1:
+                    hover = dict(
+                        hovertext=(
+                            names.iloc[rows] + " (" + genes.iloc[rows] + ")"
+                        ).to_numpy(),
+                        customdata=np.column_stack(
+                            [self.pvalue[rows], self.fdr[rows]]
+                        ).astype(np.float32),
+                        hovertemplate="%{hovertext}"
+                        f"<br>{x_label}=%{{x:.3f}}<br>{y_label}=%{{y:.3f}}"
+                        "<br>p-value=%{customdata[0]:.3g}<br>FDR=%{customdata[1]:.3g}"
+                        f"<extra>{name}</extra>",
+                    )
+                else:
+                    marker.update(
+                        size=self.magnitude[rows].astype(np.float32),
+                        sizemode="area",
+                        sizeref=sizeref,
+                    )
+                fig.add_trace(
+                    go.Scattergl(
+                        x=x[rows].astype(np.float32),
+                        y=y[rows].astype(np.float32),
+                        mode="markers",
+                        marker=marker,
+                        name=name,
+                        **hover,
+                    ),
+                    row=1,
+                    col=col,
+                )
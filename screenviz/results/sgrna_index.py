@@ -0,0 +1,122 @@
+# screenviz.results.sgrna_index
+
+import sys
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .._dtypes import read_table
+
+# sgRNA columns kept in the index (the drill-down table of a gene)
+INDEX_COLUMNS = ["sgrna", "log2fc", "pvalue_twosided", "fdr", "base"]
+
+
+def load_count_dataframe(
+    filename: str, guide_column: str = "Guide", full_precision: bool = False
+) -> pd.DataFrame:
+    """
+    Load a count matrix (sgcount output) indexed by sgRNA name, one column per sample.
+
+    Repeated guide names keep their first row (with a warning).
+    """
+    df = read_table(
+        filename, string_columns=[guide_column], full_precision=full_precision
+    )
+    assert guide_column in df.columns, (
+        f"The count file must have a column named {guide_column}"
+    )
+    samples = [
+        col
+        for col in df.columns
+        if col != guide_column and pd.api.types.is_numeric_dtype(df[col])
+    ]
+    # sgRNAs are matched by name, so only the first row of a repeated guide is kept
+    duplicated = df[guide_column].duplicated()
+    if duplicated.any():
+        print(
+            f"Warning: {int(duplicated.sum())} repeated guide names in {filename}, keeping their first rows",
+            file=sys.stderr,
+        )
+        df = df[~duplicated]
+    return df.set_index(guide_column)[samples]
+
+
+class SGRNAIndex:
+    """
+    The sgRNAs of every gene as contiguous rows of a gene-sorted copy of the sgRNA table.
+
+    Rows are sorted by gene once (a stable argsort of the gene codes) and the
+    row offset of each gene is kept, so the sgRNAs of a gene are a slice of
+    the sorted columns: a lookup costs the number of guides of the gene
+    instead of a scan of the table. Counts of a count matrix, when given, are
+    aligned to the sorted rows by sgRNA name (missing guides are NaN).
+    """
+
+    def __init__(
+        self, sgrna_frame: pd.DataFrame, count_frame: Optional[pd.DataFrame] = None
+    ):
+        genes = sgrna_frame["gene"]
+        if isinstance(genes.dtype, pd.CategoricalDtype):
+            codes = genes.cat.codes.to_numpy()
+            names = genes.cat.categories
+        else:
+            codes, names = pd.factorize(genes)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        # Genes without sgRNAs (unused categories) get an empty range, missing genes (-1) none
+        self.offsets = np.searchsorted(sorted_codes, np.arange(len(names) + 1))
+        self.genes = [str(name) for name in names]
+        self.positions = {gene: i for i, gene in enumerate(self.genes)}
+        self.frame = (
+            sgrna_frame[[c for c in INDEX_COLUMNS if c in sgrna_frame.columns]]
+            .iloc[order]
+            .reset_index(drop=True)
+        )
+        self.fdr = self.frame["fdr"].to_numpy()
+
+        self.sample_columns: List[str] = []
+        self.counts = None
+        if count_frame is not None:
+            self.sample_columns = [str(col) for col in count_frame.columns]
+            self.counts = count_frame.reindex(self.frame["sgrna"]).to_numpy(
+                dtype=np.float32
+            )
+
+    @property
+    def nbytes(self) -> int:
+        nbytes = int(self.frame.memory_usage(deep=True).sum()) + self.offsets.nbytes
+        if self.counts is not None:
+            nbytes += self.counts.nbytes
+        return nbytes
+
+    def rows(self, gene: str) -> slice:
+        position = self.positions.get(gene)
+        if position is None:
+            return slice(0, 0)
+        return slice(int(self.offsets[position]), int(self.offsets[position + 1]))
+
+    def count_below(self, values: np.ndarray, threshold: float) -> pd.Series:
+        """
+        Number of sgRNAs of every gene whose (sorted) values are below a threshold.
+
+        Computed for all genes at once from the cumulative sum over the sorted rows.
+        """
+        below = np.concatenate([[0], np.cumsum(values < threshold)])
+        return pd.Series(
+            below[self.offsets[1:]] - below[self.offsets[:-1]], index=self.genes
+        )
+
+    def significant_sgrnas(self, threshold: float) -> pd.Series:
+        return self.count_below(self.fdr, threshold)
+
+    def query(self, gene: str) -> pd.DataFrame:
+        """
+        The sgRNAs of a gene with their counts across samples (if a count matrix was given).
+        """
+        rows = self.rows(gene)
+        df = self.frame.iloc[rows].reset_index(drop=True)
+        if self.counts is not None:
+            counts = pd.DataFrame(self.counts[rows], columns=self.sample_columns)
+            df = pd.concat([df, counts], axis=1)
+        return df
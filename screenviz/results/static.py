@@ -0,0 +1,52 @@
+# screenviz.results.static
+
+from typing import Optional
+
+import pandas as pd
+
+from .._output import write_figures_page
+from .gene_card import GeneCard
+from .sgrna_card import SGRNACard
+
+
+def write_static_dashboard(
+    sgrna_file: str,
+    gene_file: str,
+    output: str,
+    ntc_token: str = "non-targeting",
+    amalgam_token: str = "amalgam",
+    full_precision: bool = False,
+    sgrna_frame: Optional[pd.DataFrame] = None,
+    gene_frame: Optional[pd.DataFrame] = None,
+    plotlyjs: str = "embed",
+    precision: Optional[int] = None,
+) -> str:
+    """
+    Render the results dashboard with its default settings into a single html page.
+
+    The sgRNA and gene figures are the ones the dashboard shows on load, without
+    a running server. Preloaded frames are used instead of reading the files.
+    """
+    sgrna_card = SGRNACard(
+        sgrna_file,
+        ntc_token=ntc_token,
+        full_precision=full_precision,
+        sgrna_frame=sgrna_frame,
+        build_layout=False,
+    )
+    gene_card = GeneCard(
+        gene_file=gene_file,
+        sgrna_file=sgrna_file,
+        amalgam_token=amalgam_token,
+        full_precision=full_precision,
+        gene_frame=gene_frame,
+        sgrna_frame=sgrna_card.sgrna_frame,
+        build_layout=False,
+    )
+    return write_figures_page(
+        [sgrna_card.create_plots(), gene_card.create_volcano_plot()],
+        output,
+        title="CRISPR Screen Results Dashboard",
+        plotlyjs=plotlyjs,
+        precision=precision,
+    )
@@ -1,11 +1,16 @@
 # screenviz.sgrna
 
 import sys
+from typing import Optional
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.io as pio
 
+from ._dtypes import read_table
+from ._output import output_path, write_figure
+from .formats import read_results, resolve_format, screenviz_column
+
 pio.templates.default = "plotly_white"
 
 
@@ -28,8 +33,13 @@ class VisualizeSGRNAs:
         pval_column: str = "pvalue",
         threshold_column: str = "fdr",
         threshold: float = 0.1,
+        full_precision: bool = False,
+        dataframe: Optional[pd.DataFrame] = None,
+        format: Optional[str] = None,
     ):
         self.filename = filename
+        self.full_precision = full_precision
+        self.format = format
         self.sgrna_column = sgrna_column
         self.gene_column = gene_column
         self.fc_column = fc_column
@@ -37,10 +47,63 @@ class VisualizeSGRNAs:
         self.threshold_column = threshold_column
         self.threshold = threshold
 
-        self.df = self.load_dataframe(filename)
+        self.df = self.load_dataframe(filename, dataframe)
+
+    def resolve_format(self):
+        """
+        The format of the input file, unless it has the given columns.
+
+        The columns are then switched to the screenviz ones (the p-value and
+        threshold columns are kept if they are screenviz ones, otherwise the
+        two-sided p-value and FDR are used).
+        """
+        columns = [
+            self.sgrna_column,
+            self.gene_column,
+            self.fc_column,
+            self.pval_column,
+            self.threshold_column,
+        ]
+        result_format = resolve_format(self.filename, "sgrna", columns, self.format)
+        if result_format is not None:
+            (
+                self.sgrna_column,
+                self.gene_column,
+                self.fc_column,
+            ) = ("sgrna", "gene", "log2fc")
+            self.pval_column = screenviz_column(
+                self.pval_column, "sgrna", "pvalue_twosided"
+            )
+            self.threshold_column = screenviz_column(
+                self.threshold_column, "sgrna", "fdr"
+            )
+            result_format.check_reported([self.pval_column, self.threshold_column])
+        return result_format
 
-    def load_dataframe(self, filename: str) -> pd.DataFrame:
-        df = pd.read_csv(self.filename, sep="\t")
+    def load_dataframe(
+        self, filename: str, dataframe: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        if dataframe is not None:
+            # Shallow copy so the derived columns stay local to this plot
+            df = dataframe.copy(deep=False)
+        else:
+            # Native tool outputs (or a forced format) are mapped to the screenviz columns
+            result_format = self.resolve_format()
+            if result_format is not None:
+                df = read_results(
+                    self.filename,
+                    "sgrna",
+                    format=result_format.name,
+                    full_precision=self.full_precision,
+                )
+            else:
+                df = read_table(
+                    self.filename,
+                    categorical_columns=[self.gene_column],
+                    string_columns=[self.sgrna_column],
+                    full_precision=self.full_precision,
+                    precise_columns=[self.pval_column, self.threshold_column],
+                )
         assert (
             self.sgrna_column in df.columns
         ), f"The input file must have a column named {self.sgrna_column}"
@@ -58,8 +121,16 @@ class VisualizeSGRNAs:
         ), f"The input file must have a column named {self.threshold_column}"
         return df
 
-    def plot_volcano(self, output="volcano.html"):
-        self.df[f"log_{self.pval_column}"] = -np.log10(self.df[self.pval_column])
+    def plot_volcano(
+        self,
+        output: str = "volcano.html",
+        plotlyjs: str = "embed",
+        precision: Optional[int] = None,
+        format: str = "html",
+        rasterize: bool = True,
+    ):
+        if f"log_{self.pval_column}" not in self.df.columns:
+            self.df[f"log_{self.pval_column}"] = -np.log10(self.df[self.pval_column])
         self.df["is_significant"] = self.df[self.threshold_column] < self.threshold
         self.df["classification"] = self.df.apply(
             lambda x: classify(x, self.fc_column), axis=1
@@ -102,5 +173,13 @@ class VisualizeSGRNAs:
             title="Volcano plot of gene enrichment analysis",
         )
 
+        output = output_path(output, format)
         print(f"Saving volcano plot to: {output}", file=sys.stderr)
-        fig.write_html(output)
+        write_figure(
+            fig,
+            output,
+            plotlyjs=plotlyjs,
+            precision=precision,
+            format=format,
+            rasterize=rasterize,
+        )
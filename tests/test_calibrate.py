@@ -0,0 +1,60 @@
+# tests.test_calibrate
+
+import numpy as np
+import pytest
+
+from screenviz.calibrate import fdr_threshold
+
+
+def reference_threshold(real, null, n_real, fdr):
+    """
+    Least extreme real score whose empirical FDR, or that of a more extreme one, is at most `fdr`.
+    """
+    passing = []
+    for threshold in np.unique(real):
+        discoveries = (real >= threshold).sum()
+        false_discoveries = (null >= threshold).sum() / null.size * n_real
+        if false_discoveries / discoveries <= fdr:
+            passing.append(threshold)
+    return min(passing) if passing else None
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("fdr", [0.01, 0.1, 0.25])
+def test_fdr_threshold_matches_reference(seed, fdr):
+    rng = np.random.default_rng(seed)
+    n_real = 400
+    # A few true hits shifted away from the null, the other genes on the null
+    real = np.concatenate([rng.normal(0, 1, 300), rng.normal(3, 1, 40)])
+    null = rng.normal(0, 1, 5_000)
+    # Pseudo-genes on the other side of the volcano
+    null[rng.random(null.size) < 0.5] = -np.inf
+    assert fdr_threshold(real, null, n_real, fdr) == reference_threshold(
+        real, null, n_real, fdr
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fdr_threshold_with_ties(seed):
+    rng = np.random.default_rng(seed)
+    real = rng.integers(0, 20, 200).astype(float)
+    null = rng.integers(0, 16, 2_000).astype(float)
+    for fdr in [0.05, 0.2, 0.5]:
+        assert fdr_threshold(real, null, 250, fdr) == reference_threshold(
+            real, null, 250, fdr
+        )
+
+
+def test_fdr_threshold_unreachable():
+    real = np.array([0.1, 0.2, 0.3])
+    null = np.array([1.0, 2.0, 3.0])
+    assert fdr_threshold(real, null, 3, 0.1) is None
+    assert fdr_threshold(np.array([]), null, 3, 0.1) is None
+
+
+def test_fdr_threshold_is_monotonic_in_fdr():
+    rng = np.random.default_rng(0)
+    real = np.concatenate([rng.normal(0, 1, 500), rng.normal(4, 1, 50)])
+    null = rng.normal(0, 1, 10_000)
+    thresholds = [fdr_threshold(real, null, real.size, fdr) for fdr in [0.01, 0.1, 0.5]]
+    assert thresholds == sorted(thresholds, reverse=True)
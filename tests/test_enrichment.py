@@ -0,0 +1,129 @@
+# tests.test_enrichment
+
+from math import comb
+
+import numpy as np
+import pytest
+
+from screenviz.enrichment import enrich, load_library
+
+
+def hypergeometric_sf(overlap: int, n_universe: int, term_size: int, n_query: int):
+    """
+    P(X >= overlap) summed term by term over the hypergeometric distribution.
+    """
+    total = comb(n_universe, n_query)
+    return (
+        sum(
+            comb(term_size, k) * comb(n_universe - term_size, n_query - k)
+            for k in range(overlap, min(term_size, n_query) + 1)
+        )
+        / total
+    )
+
+
+def benjamini_hochberg(pvalues: list) -> list:
+    """
+    BH adjusted p-values: the running minimum of p * m / rank from the largest p-value down.
+    """
+    m = len(pvalues)
+    order = sorted(range(m), key=lambda i: pvalues[i])
+    adjusted = [0.0] * m
+    running = 1.0
+    for rank in range(m, 0, -1):
+        i = order[rank - 1]
+        running = min(running, pvalues[i] * m / rank)
+        adjusted[i] = running
+    return adjusted
+
+
+@pytest.fixture
+def library_file(tmp_path):
+    rng = np.random.default_rng(0)
+    genes = [f"G{i}" for i in range(300)]
+    lines = []
+    for t in range(40):
+        members = rng.choice(
+            genes[: 60 + 5 * t], size=rng.integers(3, 40), replace=False
+        )
+        lines.append("\t".join([f"term{t}", "description", *members]))
+    # Enrichr-style weights and a gene-less line
+    lines.append("term_weighted\tdescription\tG1,1.0\tG2,0.5\tG3")
+    lines.append("empty\tdescription")
+    path = tmp_path / "library.gmt"
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("use_background", [False, True])
+def test_enrich_matches_reference(library_file, use_background):
+    library = load_library(str(library_file), cache_dir=None)
+    rng = np.random.default_rng(1)
+    background = (
+        set(rng.choice(library.genes, size=200, replace=False))
+        if use_background
+        else None
+    )
+    query = set(rng.choice(library.genes[:80], size=25, replace=False))
+    # Genes outside of the library are not part of the universe
+    query |= {"NOT_IN_LIBRARY"}
+
+    result = enrich(library, {"query": query}, background, threshold=None)["query"]
+
+    universe = set(library.genes) if background is None else background
+    hits = query & universe
+    terms, pvalues = [], []
+    for t, term in enumerate(library.terms):
+        members = set(library.genes[library.incidence[:, t].indices]) & universe
+        if not members:
+            continue
+        terms.append((term, members & hits, len(members)))
+        pvalues.append(
+            hypergeometric_sf(
+                len(members & hits), len(universe), len(members), len(hits)
+            )
+        )
+    adjusted = benjamini_hochberg(pvalues)
+
+    expected = {
+        term: (pvalue, adj_pvalue, overlap, size)
+        for (term, overlap, size), pvalue, adj_pvalue in zip(terms, pvalues, adjusted)
+        if overlap
+    }
+    assert set(result["term_name"]) == set(expected)
+    for row in result.itertuples():
+        pvalue, adj_pvalue, overlap, size = expected[row.term_name]
+        assert row.pvalue == pytest.approx(pvalue, rel=1e-9, abs=1e-300)
+        assert row.adj_pvalue == pytest.approx(adj_pvalue, rel=1e-9, abs=1e-300)
+        assert set(row.overlapping_genes) == overlap
+        assert row.overlap == len(overlap)
+        assert row.term_size == size
+    assert result["pvalue"].is_monotonic_increasing
+
+
+def test_threshold_filters_adjusted_pvalues(library_file):
+    library = load_library(str(library_file), cache_dir=None)
+    query = list(library.genes[:30])
+    everything = enrich(library, {"query": query}, threshold=None)["query"]
+    significant = enrich(library, {"query": query}, threshold=0.05)["query"]
+    assert significant["term_name"].tolist() == (
+        everything.loc[everything["adj_pvalue"] < 0.05, "term_name"].tolist()
+    )
+
+
+def test_several_queries_match_single_runs(library_file):
+    library = load_library(str(library_file), cache_dir=None)
+    queries = {"up": list(library.genes[:20]), "down": list(library.genes[40:70])}
+    together = enrich(library, queries, threshold=None)
+    for name, genes in queries.items():
+        alone = enrich(library, {name: genes}, threshold=None)[name]
+        assert together[name].equals(alone)
+
+
+def test_cached_library(library_file, tmp_path):
+    parsed = load_library(str(library_file), cache_dir=None)
+    load_library(str(library_file), cache_dir=str(tmp_path / "cache"))
+    cached = load_library(str(library_file), cache_dir=str(tmp_path / "cache"))
+    assert list(cached.terms) == list(parsed.terms)
+    assert list(cached.genes) == list(parsed.genes)
+    assert (cached.incidence != parsed.incidence).nnz == 0
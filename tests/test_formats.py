@@ -0,0 +1,175 @@
+# tests.test_formats
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from screenviz.formats import (
+    GENE_COLUMNS,
+    SGRNA_COLUMNS,
+    detect_format,
+    read_header,
+    read_results,
+    resolve_format,
+    sniff_format,
+)
+
+N_ROWS = 50
+
+
+def write_table(path, columns: dict) -> str:
+    pd.DataFrame(columns).to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def mageck_gene(tmp_path, rng):
+    columns = {"id": [f"GENE{i}" for i in range(N_ROWS)], "num": 4}
+    for side in ["neg", "pos"]:
+        columns[f"{side}|score"] = rng.random(N_ROWS)
+        columns[f"{side}|p-value"] = rng.random(N_ROWS)
+        columns[f"{side}|fdr"] = rng.random(N_ROWS)
+        columns[f"{side}|rank"] = np.arange(N_ROWS)
+        columns[f"{side}|lfc"] = rng.normal(0, 1, N_ROWS)
+    columns["pos|lfc"] = columns["neg|lfc"]
+    return write_table(tmp_path / "screen.gene_summary.txt", columns)
+
+
+@pytest.fixture
+def mageck_sgrna(tmp_path, rng):
+    columns = {
+        "sgrna": [f"GENE{i // 4}_{i % 4}" for i in range(N_ROWS)],
+        "Gene": [f"GENE{i // 4}" for i in range(N_ROWS)],
+        "control_mean": rng.random(N_ROWS) * 500,
+        "treat_mean": rng.random(N_ROWS) * 500,
+        "LFC": rng.normal(0, 1, N_ROWS),
+        "score": rng.random(N_ROWS),
+        "p.low": rng.random(N_ROWS),
+        "p.high": rng.random(N_ROWS),
+        "p.twosided": rng.random(N_ROWS),
+        "FDR": rng.random(N_ROWS),
+    }
+    return write_table(tmp_path / "screen.sgrna_summary.txt", columns)
+
+
+@pytest.fixture
+def onesided_sgrna(tmp_path, rng):
+    columns = {
+        "sgrna": [f"g{i}" for i in range(N_ROWS)],
+        "gene": [f"GENE{i // 4}" for i in range(N_ROWS)],
+        "base": rng.random(N_ROWS) * 500,
+        "log2fc": rng.normal(0, 1, N_ROWS),
+        "pvalue_low": rng.random(N_ROWS),
+        "pvalue_high": rng.random(N_ROWS),
+        "fdr": rng.random(N_ROWS),
+    }
+    return write_table(tmp_path / "screen.sgrna_results.tsv", columns)
+
+
+def test_sniff_native_formats(tmp_path, rng):
+    gene = write_table(
+        tmp_path / "screen.gene_results.tsv",
+        {col: rng.random(3) for col in GENE_COLUMNS},
+    )
+    sgrna = write_table(
+        tmp_path / "screen.sgrna_results.tsv",
+        {col: rng.random(3) for col in SGRNA_COLUMNS},
+    )
+    assert sniff_format(read_header(gene), "gene").name == "crispr_screen"
+    assert sniff_format(read_header(sgrna), "sgrna").name == "crispr_screen"
+    # The columns to plot are already there: the table is used as it is
+    assert resolve_format(gene, "gene", ["log2fc", "fdr"]) is None
+
+
+@pytest.mark.parametrize(
+    "header, level, name",
+    [
+        (
+            ["id", "neg|lfc", "neg|p-value", "pos|p-value", "neg|fdr", "pos|fdr"],
+            "gene",
+            "mageck",
+        ),
+        (["Gene", "BF", "Recall", "Precision", "FDR"], "gene", "bagel"),
+        (["gene", "locfdr", "score", "FDR"], "gene", "crisphiermix"),
+        (
+            ["sgrna", "gene", "log2fc", "pvalue_low", "pvalue_high", "fdr", "base"],
+            "sgrna",
+            "crispr_screen-onesided",
+        ),
+        (["gene", "log2fc", "fdr"], "gene", None),
+        (["sgrna", "Gene", "LFC", "p.twosided", "FDR"], "sgrna", None),
+    ],
+)
+def test_sniff_format(header, level, name):
+    result_format = sniff_format(header, level)
+    assert (result_format.name if result_format else None) == name
+
+
+def test_mageck_gene_columns(mageck_gene):
+    raw = pd.read_csv(mageck_gene, sep="\t")
+    df = read_results(mageck_gene, "gene")
+    depleted = raw["neg|lfc"] < 0
+    assert df["gene"].astype(str).tolist() == raw["id"].tolist()
+    np.testing.assert_allclose(df["log2fc"], raw["neg|lfc"], rtol=1e-6)
+    expected_pvalue = np.where(depleted, raw["neg|p-value"], raw["pos|p-value"])
+    expected_fdr = np.where(depleted, raw["neg|fdr"], raw["pos|fdr"])
+    # Statistics compared against thresholds keep their full precision
+    assert df["pvalue"].dtype == np.float64
+    np.testing.assert_array_equal(df["pvalue"], expected_pvalue)
+    np.testing.assert_array_equal(df["fdr"], expected_fdr)
+
+
+def test_mageck_sgrna_columns(mageck_sgrna):
+    raw = pd.read_csv(mageck_sgrna, sep="\t")
+    df = read_results(mageck_sgrna, "sgrna", columns=SGRNA_COLUMNS)
+    assert df.columns.tolist() == SGRNA_COLUMNS
+    assert df["sgrna"].tolist() == raw["sgrna"].tolist()
+    np.testing.assert_array_equal(df["pvalue_twosided"], raw["p.twosided"])
+    np.testing.assert_allclose(
+        df["base"], (raw["control_mean"] + raw["treat_mean"]) / 2, rtol=1e-6
+    )
+
+
+def test_onesided_sgrna_columns(onesided_sgrna):
+    raw = pd.read_csv(onesided_sgrna, sep="\t")
+    df = read_results(onesided_sgrna, "sgrna")
+    expected = np.minimum(2 * np.minimum(raw["pvalue_low"], raw["pvalue_high"]), 1)
+    np.testing.assert_array_equal(df["pvalue_twosided"], expected)
+
+
+def test_selected_columns_only_parse_their_sources(mageck_gene):
+    df = read_results(mageck_gene, "gene", columns=["gene", "fdr"])
+    assert df.columns.tolist() == ["gene", "fdr"]
+
+
+def test_unreported_columns(tmp_path, rng):
+    bagel = write_table(
+        tmp_path / "screen.pr",
+        {
+            "Gene": [f"GENE{i}" for i in range(N_ROWS)],
+            "BF": rng.normal(0, 5, N_ROWS),
+            "Recall": rng.random(N_ROWS),
+            "Precision": rng.random(N_ROWS),
+            "FDR": rng.random(N_ROWS),
+        },
+    )
+    df = read_results(bagel, "gene")
+    assert df["pvalue"].isna().all()
+    result_format = detect_format(bagel, "gene")
+    result_format.check_reported(["log2fc", "fdr"])
+    with pytest.raises(AssertionError, match="report no pvalue"):
+        result_format.check_reported(["pvalue"])
+
+
+def test_named_and_unknown_formats(tmp_path, mageck_gene):
+    assert detect_format(mageck_gene, "gene", "mageck").name == "mageck"
+    with pytest.raises(ValueError, match="Unknown gene results format"):
+        detect_format(mageck_gene, "gene", "not-a-format")
+    other = write_table(tmp_path / "other.tsv", {"a": [1], "b": [2]})
+    with pytest.raises(AssertionError, match="Unrecognized gene results format"):
+        detect_format(other, "gene")
@@ -0,0 +1,90 @@
+# tests.test_metrics
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from screenviz.qc.histograms import compute_log_histograms
+from screenviz.qc.metrics import HISTOGRAM_SIZE, SampleMetrics, compute_metrics
+
+
+def reference_metrics(counts: np.ndarray, genes: np.ndarray) -> dict:
+    """
+    The metrics of one sample from its sorted counts.
+    """
+    values = np.sort(counts).astype(np.float64)
+    n = len(values)
+    total = values.sum()
+    ranks = np.arange(1, n + 1)
+    gini = ((2 * ranks - n - 1) * values).sum() / (n * total)
+    p10 = values[max(int(np.ceil(0.1 * n)), 1) - 1]
+    p90 = values[max(int(np.ceil(0.9 * n)), 1) - 1]
+    zeros = pd.Series(counts == 0).groupby(genes).sum()
+    guides = pd.Series(genes).value_counts()[zeros.index]
+    return {
+        "total_reads": int(total),
+        "zero_fraction": (counts == 0).mean(),
+        "gini_index": gini,
+        "skew_ratio": p90 / p10 if p10 > 0 else np.inf,
+        "zero_guides_per_gene": zeros.mean(),
+        "dropout_genes": int(((zeros == guides) & (zeros > 0)).sum()),
+    }
+
+
+@pytest.fixture
+def counts():
+    rng = np.random.default_rng(0)
+    n_guides = 3_000
+    genes = np.array([f"gene{i}" for i in rng.integers(0, 600, n_guides)])
+    samples = {
+        "poisson": rng.poisson(50, n_guides),
+        # Counts above the dense histogram go to the sparse tail
+        "skewed": rng.negative_binomial(1, 0.0005, n_guides),
+        "dropouts": rng.poisson(2, n_guides) * rng.integers(0, 2, n_guides),
+    }
+    assert samples["skewed"].max() >= HISTOGRAM_SIZE
+    return pd.DataFrame({"Guide": np.arange(n_guides), "Gene": genes, **samples})
+
+
+def test_metrics_match_reference(counts):
+    sample_columns = ["poisson", "skewed", "dropouts"]
+    metrics = compute_metrics(counts, sample_columns, "Gene").set_index("sample")
+    for sample in sample_columns:
+        expected = reference_metrics(
+            counts[sample].to_numpy(), counts["Gene"].to_numpy()
+        )
+        for metric, value in expected.items():
+            assert metrics.loc[sample, metric] == pytest.approx(value), (sample, metric)
+
+
+def test_chunked_updates(counts):
+    sample_columns = ["poisson", "skewed", "dropouts"]
+    whole = compute_metrics(counts, sample_columns, "Gene")
+    chunked = compute_metrics(counts, sample_columns, "Gene", chunksize=257)
+    pd.testing.assert_frame_equal(whole, chunked)
+
+
+def test_metrics_of_a_subset_of_samples(counts):
+    # Samples are independent, so reloads can recompute only the changed ones
+    whole = compute_metrics(counts, ["poisson", "skewed", "dropouts"], "Gene")
+    subset = compute_metrics(counts, ["skewed"], "Gene")
+    pd.testing.assert_frame_equal(
+        whole[whole["sample"] == "skewed"].reset_index(drop=True), subset
+    )
+
+
+def test_log_histograms_match_binned_counts(counts):
+    sample_columns = ["poisson", "skewed", "dropouts"]
+    metrics = SampleMetrics(sample_columns)
+    metrics.update(counts[sample_columns].to_numpy(), counts["Gene"])
+    df_log = np.log10(counts[sample_columns].astype(np.float64) + 1)
+    expected = compute_log_histograms(df_log, sample_columns)
+    histograms = metrics.log_histograms()
+    np.testing.assert_allclose(histograms.edges, expected.edges)
+    np.testing.assert_array_equal(histograms.counts, expected.counts)
+
+
+def test_rejects_fractional_counts():
+    metrics = SampleMetrics(["a"])
+    with pytest.raises(AssertionError):
+        metrics.update(np.array([[0.5], [1.0]]), pd.Series(["g", "g"]))
@@ -0,0 +1,110 @@
+# tests.test_selection_index
+
+import numpy as np
+import pytest
+
+from screenviz.qc.normalization import SELECTION_INDEX_CACHE_SIZE, NormalizedCounts
+from screenviz.qc.selection_index import SelectionIndex, points_in_polygon
+from screenviz.qc.utils import load_data
+
+
+def inside_polygon(px: float, py: float, poly_x, poly_y) -> bool:
+    """
+    Point-in-polygon by ray casting, one point at a time.
+    """
+    inside = False
+    n = len(poly_x)
+    for k in range(n):
+        xi, yi = poly_x[k], poly_y[k]
+        xj, yj = poly_x[(k + 1) % n], poly_y[(k + 1) % n]
+        if (yi > py) != (yj > py) and px < (xj - xi) * (py - yi) / (yj - yi) + xi:
+            inside = not inside
+    return inside
+
+
+def star_polygon(rng: np.random.Generator, n_vertices: int = 9):
+    """
+    A random non-convex (star-shaped) polygon around the middle of the unit square.
+    """
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n_vertices))
+    radii = rng.uniform(0.1, 0.5, n_vertices)
+    return 0.5 + radii * np.cos(angles), 0.5 + radii * np.sin(angles)
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 1, 2_000), rng.uniform(0, 1, 2_000)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_points_in_polygon(points, seed):
+    x, y = points
+    poly_x, poly_y = star_polygon(np.random.default_rng(seed))
+    expected = [inside_polygon(a, b, poly_x, poly_y) for a, b in zip(x, y)]
+    assert points_in_polygon(x, y, poly_x, poly_y).tolist() == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_query_lasso(points, seed):
+    x, y = points
+    poly_x, poly_y = star_polygon(np.random.default_rng(seed))
+    expected = [
+        i for i, (a, b) in enumerate(zip(x, y)) if inside_polygon(a, b, poly_x, poly_y)
+    ]
+    index = SelectionIndex(x, y)
+    selected = {"lassoPoints": {"x": poly_x.tolist(), "y": poly_y.tolist()}}
+    assert index.query(selected).tolist() == expected
+
+
+def test_query_range(points):
+    x, y = points
+    index = SelectionIndex(x, y)
+    # Reversed bounds, as plotly reports boxes dragged right to left
+    selected = {"range": {"x": [0.7, 0.2], "y": [0.1, 0.6]}}
+    expected = np.flatnonzero((x >= 0.2) & (x <= 0.7) & (y >= 0.1) & (y <= 0.6))
+    assert index.query(selected).tolist() == expected.tolist()
+
+
+def test_query_ties():
+    # Repeated x values (e.g. zero counts) on the edges of the box
+    x = np.array([0.0, 1.0, 0.0, 2.0, 1.0, 0.0])
+    y = np.array([0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+    index = SelectionIndex(x, y)
+    selected = {"range": {"x": [0.0, 1.0], "y": [0.0, 4.0]}}
+    assert index.query(selected).tolist() == [0, 1, 2, 4]
+
+
+def test_query_without_selection(points):
+    index = SelectionIndex(*points)
+    assert index.query(None) is None
+    assert index.query({"points": []}) is None
+
+
+def test_selection_index_cache(tmp_path):
+    rng = np.random.default_rng(1)
+    samples = [f"s{i}" for i in range(4)]
+    lines = ["\t".join(["Guide", "Gene", *samples])]
+    for i in range(200):
+        counts = rng.poisson(100, len(samples))
+        lines.append("\t".join([f"g{i}", f"gene{i // 4}", *map(str, counts)]))
+    counts_file = tmp_path / "counts.tsv"
+    counts_file.write_text("\n".join(lines) + "\n")
+
+    _, df_normal, df_log, sample_columns, _ = load_data(
+        str(counts_file), "Guide", "Gene"
+    )
+    normalized_counts = NormalizedCounts(df_normal, df_log, sample_columns)
+    first = normalized_counts.selection_index("s0", "s1", True, "cpm")
+    assert normalized_counts.selection_index("s0", "s1", True, "cpm") is first
+
+    _, df_log_cpm = normalized_counts.get("cpm")
+    x, y = df_log_cpm["s0"].to_numpy(), df_log_cpm["s1"].to_numpy()
+    selected = {"range": {"x": [1.5, 4.0], "y": [1.5, 4.0]}}
+    expected = np.flatnonzero((x >= 1.5) & (x <= 4.0) & (y >= 1.5) & (y <= 4.0))
+    assert first.query(selected).tolist() == expected.tolist()
+
+    for x_col in samples:
+        for y_col in samples:
+            normalized_counts.selection_index(x_col, y_col, False)
+    assert len(normalized_counts.selection_indices) == SELECTION_INDEX_CACHE_SIZE